@@ -0,0 +1,324 @@
+"""
+HTTP JSON API on top of NewsDB, for serving many users at once instead of one per CLI process.
+
+Endpoints:
+    POST /login                      {"username": ..., "password": ...} -> {"token": ...}
+    POST /logout
+    GET  /articles                   ?sort=date|title|author &category=NAME &tag=ID, or to combine filters
+                                     ?tags=1,2 &tag_match=any|all &categories=a,b &category_match=any|all
+                                     &after=YYYY-MM-DD &before=YYYY-MM-DD
+    GET  /articles/<id>              Supports ETag/If-None-Match and Last-Modified/If-Modified-Since
+    GET  /articles/<id>/comments     ?page_size=N &cursor=C (oldest first)
+                                     -> {"comments": [...], "total": ..., "next_cursor": C of the next page or null}
+    POST /articles/<id>/comments     {"content": ...}
+    POST /articles/<id>/views
+    GET  /trending                   ?k=N -> [{"article": {...}, "score": ...}], highest score first
+    GET  /recommended                ?k=N -> [{"article": {...}, "score": ...}] for the logged in user
+    GET  /reports/<name>             ?year=YYYY for admin reports
+    GET  /health                     Circuit breaker state and counts of database calls, retries and trips
+
+Requests other than login send the session token as `Authorization: Bearer <token>`. Calls fail with 503 while the
+database circuit breaker is open (see src/resilience.py).
+
+Usage:
+    python3 src/api_server.py --port 8000               (Oracle, using the .env settings)
+    python3 src/api_server.py --sqlite news.sqlite3     (SQLite stand-in)
+"""
+
+import argparse
+import datetime as dt
+import email.utils
+import hashlib
+import json
+import os
+import re
+import sys
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from oracledb.exceptions import DatabaseError
+
+from article_query import ArticleQuery
+from batch import to_json
+from db import Article
+from db_pool import NewsDBPool
+from events import EventBus
+from generate_report import ReportGenerator
+from recent_views import RecentViews
+from resilience import CircuitOpenError
+
+
+class APIError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def article_etag(article: Article) -> str:
+    """Strong ETag for an article, derived from everything that is returned for it."""
+    digest = hashlib.sha256(json.dumps(to_json(article), sort_keys=True).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def article_last_modified(article: Article) -> str:
+    # Articles that were never updated were last modified when they were published
+    modified = article.updatedAt or article.publishDate
+    if not isinstance(modified, dt.datetime):
+        modified = dt.datetime.combine(modified, dt.time())
+    return email.utils.format_datetime(modified.replace(tzinfo=dt.timezone.utc), usegmt=True)
+
+
+class NewsAPIHandler(BaseHTTPRequestHandler):
+
+    # (method, path pattern, handler method name)
+    routes = [
+        ('POST', re.compile(r'^/login$'), 'login'),
+        ('POST', re.compile(r'^/logout$'), 'logout'),
+        ('GET', re.compile(r'^/articles$'), 'list_articles'),
+        ('GET', re.compile(r'^/articles/(\d+)$'), 'get_article'),
+        ('GET', re.compile(r'^/articles/(\d+)/comments$'), 'get_comments'),
+        ('POST', re.compile(r'^/articles/(\d+)/comments$'), 'add_comment'),
+        ('POST', re.compile(r'^/articles/(\d+)/views$'), 'add_view'),
+        ('GET', re.compile(r'^/trending$'), 'get_trending'),
+        ('GET', re.compile(r'^/recommended$'), 'get_recommended'),
+        ('GET', re.compile(r'^/reports/(\w+)$'), 'get_report'),
+        ('GET', re.compile(r'^/health$'), 'get_health'),
+    ]
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are written separately
+    quiet = True
+
+    @property
+    def pool(self) -> NewsDBPool:
+        return self.server.pool
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method: str):
+        try:
+            url = urlsplit(self.path)
+            self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            # Always consume the body so the next request on a kept-alive connection starts cleanly
+            self.body = self.read_body()
+            # Reads are routed for the user of this request only, once current_user has found them
+            self.pool.reads.set_user(None)
+            for route_method, pattern, name in self.routes:
+                match = pattern.match(url.path)
+                if match and route_method == method:
+                    with self.pool.acquire() as db:
+                        getattr(self, name)(db, *match.groups())
+                    return
+            raise APIError(HTTPStatus.NOT_FOUND, f"No route for {method} {url.path}")
+        except APIError as e:
+            self.send_json({'error': str(e)}, e.status)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+        except CircuitOpenError as e:
+            self.send_json({'error': str(e)}, HTTPStatus.SERVICE_UNAVAILABLE)
+        except DatabaseError as e:
+            status = HTTPStatus.NOT_FOUND if 'not found' in str(e).lower() else HTTPStatus.INTERNAL_SERVER_ERROR
+            self.send_json({'error': str(e)}, status)
+        except Exception:
+            print(f"{method} {self.path} failed", file=sys.stderr)
+            traceback.print_exc()
+            self.send_json({'error': "Internal server error"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    ######### HELPERS #########
+
+    def send_json(self, body, status=HTTPStatus.OK, headers: dict = None):
+        payload = json.dumps(to_json(body)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_not_modified(self, headers: dict):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def read_body(self) -> bytes:
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # Where the body ends is unknown, so the connection can't be reused
+            self.close_connection = True
+            raise APIError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        return self.rfile.read(length) if length else b''
+
+    def read_json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, "Request body must be JSON")
+
+    def session_token(self):
+        auth = self.headers.get('Authorization', '')
+        return auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+
+    def current_user(self, admin=False):
+        """Get the user for the request's session token, without touching the Users table."""
+        user = self.pool.sessions.get(self.session_token())
+        if user is None:
+            raise APIError(HTTPStatus.UNAUTHORIZED, "Login required")
+        if admin and not user.is_admin:
+            raise APIError(HTTPStatus.FORBIDDEN, "Admin required")
+        self.pool.reads.set_user(user.userID)
+        return user
+
+    ######### ENDPOINTS #########
+
+    def login(self, db):
+        body = self.read_json()
+        token = db.users.login(str(body.get('username', '')), str(body.get('password', '')))
+        if token is None:
+            raise APIError(HTTPStatus.UNAUTHORIZED, "Invalid username or password")
+        self.send_json({'token': token})
+
+    def logout(self, db):
+        db.users.logout(self.session_token())
+        self.send_json({})
+
+    def list_articles(self, db):
+        self.current_user()
+        sort_by = self.query.get('sort', 'date')
+        if sort_by not in db.articles.sort_options:
+            raise ValueError(f"sort must be one of {', '.join(db.articles.sort_options)}")
+        if any(key in self.query for key in ('tags', 'categories', 'after', 'before')):
+            articles = db.articles.search(ArticleQuery.from_params(self.query))
+        elif 'category' in self.query:
+            articles = db.articles.get_by_category(self.query['category'], sort_by)
+        elif 'tag' in self.query:
+            articles = db.articles.get_by_tag(int(self.query['tag']), sort_by)
+        else:
+            articles = db.articles.get_all(sort_by)
+        self.send_json(articles)
+
+    def get_article(self, db, articleID):
+        self.current_user()
+        article = db.articles.get(int(articleID))
+        headers = {'ETag': article_etag(article),
+                   'Last-Modified': article_last_modified(article),
+                   'Cache-Control': 'private, no-cache'}
+
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_none_match is not None:
+            if headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+                return self.send_not_modified(headers)
+        elif if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+                if email.utils.parsedate_to_datetime(headers['Last-Modified']) <= since:
+                    return self.send_not_modified(headers)
+            except (TypeError, ValueError):
+                pass  # ignore invalid dates, as required by RFC 9110
+
+        self.send_json(article, headers=headers)
+
+    def get_comments(self, db, articleID):
+        self.current_user()
+        page = db.articles.get_comment_page(int(articleID), self.query.get('cursor'), int(self.query.get('page_size', 20)))
+        self.send_json({'comments': page.comments, 'total': page.total, 'next_cursor': page.next_cursor})
+
+    def add_comment(self, db, articleID):
+        user = self.current_user()
+        content = self.read_json().get('content')
+        if not content or not str(content).strip():
+            raise ValueError("content cannot be empty")
+        commentID = db.articles.add_comment(int(articleID), user.userID, str(content))
+        self.send_json({'commentID': commentID}, HTTPStatus.CREATED)
+
+    def add_view(self, db, articleID):
+        user = self.current_user()
+        db.articles.add_view(int(articleID), user.userID)
+        self.send_json({}, HTTPStatus.CREATED)
+
+    def get_trending(self, db):
+        self.current_user()
+        trending = db.articles.get_trending(int(self.query.get('k', 10)))
+        self.send_json([{'article': article, 'score': score} for article, score in trending])
+
+    def get_recommended(self, db):
+        user = self.current_user()
+        recommended = db.articles.get_recommended(user.userID, int(self.query.get('k', 10)))
+        self.send_json([{'article': article, 'score': score} for article, score in recommended])
+
+    def get_report(self, db, name):
+        self.current_user(admin=name in ReportGenerator.admin_reports)
+        rows = ReportGenerator(db).report_rows(name, self.query.get('year'))
+        header = rows[0]
+        self.send_json([dict(zip(header, row)) for row in rows[1:]])
+
+    def get_health(self, db):
+        self.send_json(self.pool.resilience.stats())
+
+
+class NewsAPIServer(ThreadingHTTPServer):
+    """Threaded HTTP server. Each request borrows a NewsDB from the pool."""
+
+    daemon_threads = True
+
+    def __init__(self, address, pool: NewsDBPool):
+        self.pool = pool
+        super().__init__(address, NewsAPIHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the news database as a JSON API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pool-size', type=int, default=8, help='Number of database connections.')
+    parser.add_argument('--sqlite', metavar='PATH', help='Use a SQLite database file instead of Oracle.')
+    parser.add_argument('--sqlite-replica', metavar='PATH', help='Read articles, comments and reports from this SQLite file.')
+    parser.add_argument('--verbose', action='store_true', help='Log every request.')
+    parser.add_argument('--event-log', metavar='PATH', help='Append change events to this JSON Lines file.')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()  # load environment from .env file
+    recent_views = RecentViews(window=float(os.getenv('VIEW_DEDUP_WINDOW', 1800)))
+    if args.sqlite:
+        import sqlite_db
+        replica_connect = (lambda: sqlite_db.connect(args.sqlite_replica)) if args.sqlite_replica else None
+        pool = NewsDBPool(lambda: sqlite_db.connect(args.sqlite), size=args.pool_size, events=EventBus(args.event_log),
+                          replica_connect=replica_connect, recent_views=recent_views)
+    else:
+        from db_pool import init_oracle_mode, oracle_connector
+
+        init_oracle_mode()
+        replica_connect = oracle_connector('DB_REPLICA') if os.getenv('DB_REPLICA_HOST') else None
+        pool = NewsDBPool(oracle_connector(), size=args.pool_size, events=EventBus(args.event_log or os.getenv('EVENT_LOG')),
+                          replica_connect=replica_connect, recent_views=recent_views)
+
+    NewsAPIHandler.quiet = not args.verbose
+    server = NewsAPIServer((args.host, args.port), pool)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Got keyboard interrupt. Quitting...")
+    finally:
+        server.server_close()
+        pool.close()
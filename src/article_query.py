@@ -0,0 +1,140 @@
+"""
+Query builder for filtering articles by several tags and categories at once, and by publish date.
+
+Every filter becomes a semi-join on ArticleTags in a single statement (served by the ArticleTags(tagID, articleID)
+index), rather than one query per tag.
+"""
+
+import datetime as dt
+from typing import Dict, Iterable, List, Tuple, Union
+
+
+class ArticleQuery:
+
+    # sort option -> column. Sort columns can't be bind variables, so only these are put into the SQL.
+    sort_columns = {'date': 'A.publishDate', 'title': 'A.title', 'author': 'A.author'}
+    match_options = ['any', 'all']
+
+    def __init__(self, tags: Iterable[int] = (), tag_match='any', categories: Iterable[str] = (), category_match='any',
+                 published_after: Union[dt.date, None] = None, published_before: Union[dt.date, None] = None,
+                 sort_by='date'):
+        """Initialize a new ArticleQuery. Filters that are left empty match every article.
+
+        Args:
+            tags (Iterable[int], optional): Tag IDs to filter on.
+            tag_match (str, optional): 'any' for articles with at least one of the tags, 'all' for articles with every tag.
+            categories (Iterable[str], optional): Category names to filter on (case insensitive).
+            category_match (str, optional): 'any' or 'all', as for tags.
+            published_after (date, optional): Only articles published on or after this date.
+            published_before (date, optional): Only articles published before this date.
+            sort_by (str, optional): date, title or author. Defaults to date.
+        """
+        if tag_match not in self.match_options or category_match not in self.match_options:
+            raise ValueError(f"match must be one of {', '.join(self.match_options)}")
+        if sort_by not in self.sort_columns:
+            raise ValueError(f"sort_by must be one of {', '.join(self.sort_columns)}")
+
+        self.tags: List[int] = sorted({int(tag) for tag in tags})
+        self.tag_match = tag_match
+        self.categories: List[str] = sorted({category.strip().lower() for category in categories if category.strip()})
+        self.category_match = category_match
+        self.published_after = published_after
+        self.published_before = published_before
+        self.sort_by = sort_by
+
+    @classmethod
+    def from_params(cls, params: Dict) -> 'ArticleQuery':
+        """Build a query from loosely typed parameters, e.g. a URL query string or a batch command.
+
+        Recognized keys: tags, tag_match, categories, category_match, after, before (YYYY-MM-DD), sort.
+        List values may be given as lists or as comma separated strings.
+        """
+        def as_list(value):
+            if value is None:
+                return []
+            if isinstance(value, str):
+                return [item for item in value.split(',') if item.strip()]
+            if isinstance(value, (list, tuple)):
+                return list(value)
+            return [value]
+
+        def as_date(value):
+            if value is None or isinstance(value, dt.date):
+                return value
+            return dt.datetime.strptime(str(value).strip(), '%Y-%m-%d')
+
+        return cls(tags=as_list(params.get('tags')),
+                   tag_match=params.get('tag_match', 'any'),
+                   categories=[str(category) for category in as_list(params.get('categories'))],
+                   category_match=params.get('category_match', 'any'),
+                   published_after=as_date(params.get('after')),
+                   published_before=as_date(params.get('before')),
+                   sort_by=params.get('sort', 'date'))
+
+    def describe(self) -> str:
+        """Short human readable summary of the filters, for headings."""
+        parts = []
+        if self.tags:
+            parts.append(f"with {self.tag_match} of tags {', '.join(map(str, self.tags))}")
+        if self.categories:
+            parts.append(f"in {self.category_match} of categories {', '.join(self.categories)}")
+        if self.published_after:
+            parts.append(f"published from {self.published_after:%Y-%m-%d}")
+        if self.published_before:
+            parts.append(f"published before {self.published_before:%Y-%m-%d}")
+        return ' '.join(parts)
+
+    def sql(self) -> Tuple[str, Dict]:
+        """Build the statement.
+
+        Returns:
+            tuple: The SQL text and its bind variables.
+        """
+        conditions = []
+        binds = {}
+
+        if self.tags:
+            names = []
+            for i, tag in enumerate(self.tags):
+                binds[f'tag{i}'] = tag
+                names.append(f':tag{i}')
+            in_list = ', '.join(names)
+            if self.tag_match == 'any':
+                conditions.append(f"""EXISTS (SELECT 1 FROM ArticleTags AT
+                                              WHERE AT.articleID = A.articleID AND AT.tagID IN ({in_list}))""")
+            else:
+                binds['tag_count'] = len(self.tags)
+                conditions.append(f"""A.articleID IN (SELECT AT.articleID FROM ArticleTags AT
+                                                      WHERE AT.tagID IN ({in_list})
+                                                      GROUP BY AT.articleID
+                                                      HAVING COUNT(DISTINCT AT.tagID) = :tag_count)""")
+
+        if self.categories:
+            names = []
+            for i, category in enumerate(self.categories):
+                binds[f'cat{i}'] = category
+                names.append(f':cat{i}')
+            in_list = ', '.join(names)
+            if self.category_match == 'any':
+                conditions.append(f"""EXISTS (SELECT 1 FROM ArticleTags AT join Tags T on AT.tagID = T.tagID
+                                              WHERE AT.articleID = A.articleID AND lower(T.catName) IN ({in_list}))""")
+            else:
+                binds['cat_count'] = len(self.categories)
+                conditions.append(f"""A.articleID IN (SELECT AT.articleID FROM ArticleTags AT join Tags T on AT.tagID = T.tagID
+                                                      WHERE lower(T.catName) IN ({in_list})
+                                                      GROUP BY AT.articleID
+                                                      HAVING COUNT(DISTINCT lower(T.catName)) = :cat_count)""")
+
+        if self.published_after is not None:
+            binds['published_after'] = self.published_after
+            conditions.append("A.publishDate >= :published_after")
+        if self.published_before is not None:
+            binds['published_before'] = self.published_before
+            conditions.append("A.publishDate < :published_before")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""SELECT A.articleID, A.title, A.author, A.publishDate, to_char(A.content)
+                  FROM Articles A
+                  {where}
+                  ORDER BY {self.sort_columns[self.sort_by]} ASC, A.articleID ASC"""
+        return sql, binds
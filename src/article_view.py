@@ -1,52 +1,195 @@
 """
 Helper module for presenting articles to the user in a nice format.
 
+Lists of articles and comments are shown one screen at a time. Items are pulled from a streaming source as pages
+are needed, and the page after the one on screen is fetched and rendered in the background, so the first screen
+appears without waiting for the whole list.
+
 @author: Ethan Posner
 @date: 2023-04-10
 """
 
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Union
+
 from rich.console import Console
 
+from article_query import ArticleQuery
 from db import NewsDB
 
 
+class PagedSource:
+    """Pulls items from an iterator a page at a time and keeps rendered pages for going back.
+
+    Each fetch pulls one item past the end of the page, so whether there is a next page is known without
+    waiting for it.
+    """
+
+    def __init__(self, items: Iterator, page_size: int, render: Callable[[object], str] = str):
+        self.items = items
+        self.page_size = page_size
+        self.render = render
+        self.pages: List[str] = []
+        self.counts: List[int] = []
+        self.exhausted = False
+        self._ahead: List[str] = []
+        self._lock = threading.Lock()
+
+    def page(self, number: int) -> Union[str, None]:
+        """Get the rendered text of a page, fetching it if needed.
+
+        Args:
+            number (int): Page number, starting at 0.
+
+        Returns:
+            str: The rendered page, or None if there is no such page.
+        """
+        if number < len(self.pages):
+            return self.pages[number]  # pages are only appended, so no need to wait for a fetch in progress
+        with self._lock:
+            while len(self.pages) <= number and not self.exhausted:
+                chunk, self._ahead = self._ahead, []
+                for item in self.items:
+                    text = self.render(item)
+                    if len(chunk) == self.page_size:
+                        self._ahead = [text]
+                        break
+                    chunk.append(text)
+                if chunk:
+                    self.counts.append(len(chunk))
+                    self.pages.append(''.join(chunk))
+                # Set after the page is added, so has_next never sees it missing
+                self.exhausted = not self._ahead
+            return self.pages[number] if number < len(self.pages) else None
+
+    def has_next(self, number: int) -> bool:
+        """Whether there is a page after page `number`, which must have been fetched already."""
+        return number + 1 < len(self.pages) or not self.exhausted
+
+    def has_page(self, number: int) -> bool:
+        return self.page(number) is not None
+
+    def close(self):
+        """Stop the underlying iterator, releasing its cursor."""
+        with self._lock:
+            close = getattr(self.items, 'close', None)
+            if close is not None:
+                close()
+            self.exhausted = True
+
+
 class ArticleViewer:
 
+    # Items shown on one screen
+    page_size = 10
+
     def __init__(self, db: NewsDB):
         self.db = db
         self.console = Console()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch')
 
     def print_article(self, article_id):
         article = self.db.articles.get(article_id)
         with self.console.pager():
             self.console.print(article.pretty_print())
 
+    def page_through(self, source: PagedSource, title: str) -> int:
+        """Show a source one page at a time with next/previous navigation.
+
+        Args:
+            source (PagedSource): The items to show.
+            title (str): Printed above every page.
+
+        Returns:
+            int: The number of pages that were loaded.
+        """
+        number = 0
+        prefetch: Union[Future, None] = None
+        try:
+            while True:
+                text = source.page(number)
+                if text is None:
+                    break
+                has_next = source.has_next(number)
+                if has_next:
+                    # Fetch and render the following page while the user reads this one
+                    prefetch = self._prefetcher.submit(source.page, number + 1)
+
+                first = number * source.page_size + 1
+                last = first + source.counts[number] - 1
+                self.console.print(f"{title} (page {number + 1}, items {first}-{last})")
+                self.console.print(text)
+
+                options = (["n (next)"] if has_next else []) + (["p (previous)"] if number > 0 else []) + ["q (back)"]
+                if len(options) == 1:
+                    break
+                choice = self.console.input(f"{' '.join(options)}: ").strip().lower()
+                if choice == 'n' and has_next:
+                    number += 1
+                elif choice == 'p' and number > 0:
+                    number -= 1
+                elif choice == 'q':
+                    break
+        finally:
+            if prefetch is not None:
+                prefetch.result()
+            source.close()
+        return len(source.pages)
+
     def print_articles(self, sort_by='date', catName=None, tagID=None):
         assert sort_by in self.db.articles.sort_options
         info = ""
         if catName is not None and tagID is not None:
-            raise ValueError("Feature not yet implemented")
+            tag = self.db.tags.get(tagID)
+            query = ArticleQuery(tags=[tagID], categories=[catName], sort_by=sort_by)
+            articles = self.db.articles.iter_search(query, batch_size=self.page_size + 1)
+            info = f" in category '{catName}' with tag '{tag.tagName}'"
         elif catName is not None:
-            articles = self.db.articles.get_by_category(catName)
+            articles = self.db.articles.iter_by_category(catName, sort_by, batch_size=self.page_size + 1)
             info = f" in category '{catName}'"
         elif tagID is not None:
             tag = self.db.tags.get(tagID)
-            articles = self.db.articles.get_by_tag(tagID)
+            articles = self.db.articles.iter_by_tag(tagID, sort_by, batch_size=self.page_size + 1)
             info = f" with tag '{tag.tagName}'"
         else:
-            articles = self.db.articles.get_all(sort_by)
+            articles = self.db.articles.iter_all(sort_by, batch_size=self.page_size + 1)
 
-        if len(articles) > 0:
-            with self.console.pager():
-                self.console.print(f"Got {len(articles)} Article(s){info} (sorted By {sort_by}):")
-                for article in articles:
-                    self.console.print(article)
-        else:
+        source = PagedSource(articles, self.page_size)
+        if not self.page_through(source, f"Articles{info} (sorted by {sort_by})"):
+            self.console.print(f"No Articles Found{info}")
+
+    def print_search(self, query: ArticleQuery):
+        """Show the articles matching a query, a page at a time."""
+        info = f" {query.describe()}" if query.describe() else ""
+        articles = self.db.articles.iter_search(query, batch_size=self.page_size + 1)
+        source = PagedSource(articles, self.page_size)
+        if not self.page_through(source, f"Articles{info} (sorted by {query.sort_by})"):
             self.console.print(f"No Articles Found{info}")
 
+    def print_trending(self, k=10):
+        """Show the articles with the highest trending scores."""
+        trending = self.db.articles.get_trending(k)
+        if not trending:
+            self.console.print("No trending articles yet")
+            return
+        self.console.print(f"Trending articles (top {k})")
+        for rank, (article, score) in enumerate(trending, start=1):
+            self.console.print(f"{rank:>3}. [{score:8.2f}] {article.title} by {article.author} (ID {article.articleID})")
+
+    def print_recommended(self, userID, k=10):
+        """Show the articles recommended for a user, or the trending ones if there are none yet."""
+        recommended = self.db.articles.get_recommended(userID, k)
+        if not recommended:
+            self.console.print("No recommendations yet. View a few articles first.")
+            self.print_trending(k)
+            return
+        self.console.print(f"Recommended for you (top {k})")
+        for rank, (article, score) in enumerate(recommended, start=1):
+            self.console.print(f"{rank:>3}. [{score:6.3f}] {article.title} by {article.author} (ID {article.articleID})")
+
     def print_comments(self, article_id):
-        comments = self.db.articles.get_comments(article_id)
-        with self.console.pager():
-            self.console.print(f"Comments for article {article_id}:")
-            for comment in comments:
-                self.console.print(comment)
+        comments = self.db.articles.iter_comments(article_id, batch_size=self.page_size + 1)
+        source = PagedSource(comments, self.page_size)
+        if not self.page_through(source, f"Comments for article {article_id}"):
+            self.console.print(f"No comments for article {article_id}")
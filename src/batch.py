@@ -0,0 +1,230 @@
+"""
+Non-interactive batch mode. Runs a script of commands against one NewsDB session and writes one JSON result per
+command, so operations can be automated without driving the interactive prompt.
+
+Each input line is either a plain command with arguments, e.g.
+
+    login bob 123
+    comment 2 "Great article"
+    search tags=1,2 tag_match=all after=2022-01-01
+    report articles 2022
+    export articles csv articles_2022.csv 2022
+
+or a JSON object, e.g.
+
+    {"cmd": "comment", "articleID": 2, "content": "Great article"}
+
+Blank lines and lines starting with '#' are ignored. Writes are committed in groups of `commit_every`.
+"""
+
+import datetime as dt
+import json
+import shlex
+import sys
+from typing import Iterable, TextIO
+
+from oracledb.exceptions import DatabaseError
+
+from article_query import ArticleQuery
+from db import NewsDB
+from generate_report import ReportGenerator
+
+
+class BatchError(Exception):
+    """Raised for a command that cannot be run, e.g. bad arguments or missing permissions."""
+
+
+def to_json(value):
+    """Convert results (articles, comments, dates, ...) into something json.dumps accepts."""
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if hasattr(value, '__dict__'):
+        return {k: to_json(v) for k, v in vars(value).items() if k != 'password'}
+    if hasattr(value, 'read'):  # LOB
+        return value.read()
+    return value
+
+
+class BatchRunner:
+
+    # command -> names of its positional arguments
+    commands = {
+        'login': ['username', 'password'],
+        'logout': [],
+        'article': ['articleID'],
+        'articles': ['sort_by'],
+        'category': ['catName'],
+        'tag': ['tagID'],
+        'search': [],
+        'comments': ['articleID', 'page_size', 'cursor'],
+        'view': ['articleID'],
+        'comment': ['articleID', 'content'],
+        'trending': ['k'],
+        'recommended': ['k'],
+        'report': ['name', 'year'],
+        'export': ['name', 'format', 'path', 'year'],
+        'commit': [],
+    }
+
+    # commands that need a logged in user
+    user_commands = {'article', 'articles', 'category', 'tag', 'search', 'comments', 'view', 'comment', 'trending', 'recommended'}
+
+    def __init__(self, db: NewsDB, out: TextIO = sys.stdout, commit_every: int = 100):
+        """Initialize a new BatchRunner.
+
+        Args:
+            db (NewsDB): The database to run commands against.
+            out (TextIO, optional): Where JSON results are written. Defaults to stdout.
+            commit_every (int, optional): Number of writes grouped into one commit. Defaults to 100.
+        """
+        self.db = db
+        self.out = out
+        self.commit_every = commit_every
+        self.report_generator = ReportGenerator(db)
+
+        self.session_token = None
+        self.current_user = None
+        self.pending_writes = 0
+
+    def parse(self, line: str) -> dict:
+        """Parse one script line into a dict with a 'cmd' key and the command's arguments."""
+        line = line.strip()
+        if line.startswith('{'):
+            command = json.loads(line)
+            if 'args' in command:  # {"cmd": ..., "args": {...}} is accepted as well
+                command.update(command.pop('args'))
+        else:
+            tokens = shlex.split(line)
+            command = {'cmd': tokens[0]}
+            positional = []
+            for token in tokens[1:]:
+                key, sep, value = token.partition('=')
+                if sep and key.isidentifier():
+                    command[key] = value
+                else:
+                    positional.append(token)
+            names = self.commands.get(command['cmd'], [])
+            if len(positional) > len(names):
+                raise BatchError(f"Too many arguments for '{command['cmd']}'")
+            command.update(zip(names, positional))
+
+        if command.get('cmd') not in self.commands:
+            raise BatchError(f"Unknown command '{command.get('cmd')}'")
+        return command
+
+    def execute(self, command: dict):
+        """Run a parsed command and return its result."""
+        cmd = command['cmd']
+        if cmd in self.user_commands and self.current_user is None:
+            raise BatchError(f"'{cmd}' requires a logged in user")
+
+        articles = self.db.articles
+
+        if cmd == 'login':
+            token = self.db.users.login(command['username'], command['password'])
+            if token is None:
+                raise BatchError("Invalid username or password")
+            self.session_token = token
+            self.current_user = self.db.sessions.get(token)
+            self.db.router.reads.set_user(self.current_user.userID)
+            return {'userID': self.current_user.userID, 'is_admin': self.current_user.is_admin}
+        elif cmd == 'logout':
+            self.db.users.logout(self.session_token)
+            self.session_token = None
+            self.current_user = None
+            self.db.router.reads.set_user(None)
+            return None
+        elif cmd == 'article':
+            return articles.get(int(command['articleID']))
+        elif cmd == 'articles':
+            return articles.get_all(command.get('sort_by', 'date'))
+        elif cmd == 'category':
+            return articles.get_by_category(command['catName'])
+        elif cmd == 'tag':
+            return articles.get_by_tag(int(command['tagID']))
+        elif cmd == 'search':
+            return articles.search(ArticleQuery.from_params(command))
+        elif cmd == 'comments':
+            page = articles.get_comment_page(int(command['articleID']), command.get('cursor'), int(command.get('page_size', 20)))
+            return {'comments': page.comments, 'total': page.total, 'next_cursor': page.next_cursor}
+        elif cmd == 'view':
+            articles.add_view(int(command['articleID']), self.current_user.userID, commit=False)
+            self.wrote()
+            return None
+        elif cmd == 'comment':
+            commentID = articles.add_comment(int(command['articleID']), self.current_user.userID, command['content'], commit=False)
+            self.wrote()
+            return {'commentID': commentID}
+        elif cmd == 'trending':
+            return [{'article': article, 'score': score} for article, score in articles.get_trending(int(command.get('k', 10)))]
+        elif cmd == 'recommended':
+            recommended = articles.get_recommended(self.current_user.userID, int(command.get('k', 10)))
+            return [{'article': article, 'score': score} for article, score in recommended]
+        elif cmd == 'report':
+            name = command['name']
+            if name in ReportGenerator.admin_reports and (self.current_user is None or not self.current_user.is_admin):
+                raise BatchError(f"Report '{name}' requires an admin")
+            elif self.current_user is None:
+                raise BatchError("'report' requires a logged in user")
+            rows = self.report_generator.report_rows(name, command.get('year'))
+            header = rows[0]
+            return [dict(zip(header, row)) for row in rows[1:]]
+        elif cmd == 'export':
+            name = command['name']
+            if name in ReportGenerator.admin_reports and (self.current_user is None or not self.current_user.is_admin):
+                raise BatchError(f"Report '{name}' requires an admin")
+            elif self.current_user is None:
+                raise BatchError("'export' requires a logged in user")
+            rows = self.report_generator.export(name, command['format'], command['path'], command.get('year'))
+            return {'rows': rows, 'path': command['path']}
+        elif cmd == 'commit':
+            self.commit()
+            return None
+
+    def wrote(self):
+        """Count a pending write and commit once a full group is waiting."""
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.pending_writes:
+            self.db.commit()
+            self.pending_writes = 0
+
+    def emit(self, result: dict):
+        self.out.write(json.dumps(result) + '\n')
+
+    def run(self, lines: Iterable[str]) -> dict:
+        """Run every command in a script.
+
+        Args:
+            lines (Iterable[str]): The script lines, e.g. an open file.
+
+        Returns:
+            dict: Summary with the number of commands that succeeded and failed.
+        """
+        succeeded = failed = 0
+        try:
+            for line_no, line in enumerate(lines, start=1):
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                try:
+                    command = self.parse(line)
+                    result = self.execute(command)
+                    self.emit({'line': line_no, 'cmd': command['cmd'], 'ok': True, 'result': to_json(result)})
+                    succeeded += 1
+                except (BatchError, DatabaseError, ValueError, KeyError, AssertionError) as e:
+                    error = f"missing argument {e}" if isinstance(e, KeyError) else str(e) or type(e).__name__
+                    self.emit({'line': line_no, 'ok': False, 'error': error})
+                    failed += 1
+        finally:
+            self.commit()
+
+        summary = {'succeeded': succeeded, 'failed': failed}
+        self.emit({'summary': summary})
+        return summary
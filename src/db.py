@@ -20,14 +20,34 @@ here
 """
 
 
-from typing import List, Union
+import hashlib
+import hmac
+import secrets
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 
 import oracledb
-from oracledb.exceptions import DatabaseError
-
-from queries import (ADD_COMMENT, ADD_VIEW, ARTICLE_COMMENTS, ARTICLE_TAGS,
-                     ARTICLES_SORTED, ARTICLES_BY_CATEGORY,
-                     ARTICLES_BY_TAG, CATEGORY_EXISTS, CHECK_USER_EXISTS, CREATE_USER, DELETE_USER, GET_USER, HIGHEST_COMMENT_ID, SINGLE_ARTICLE, SINGLE_CATEGORY, SINGLE_TAG, TAG_EXISTS, VALIDATE_USER, VERIFY_DB)
+from oracledb.exceptions import DatabaseError, IntegrityError
+
+from article_query import ArticleQuery
+from events import (ArticleDeleted, ArticlePublished, ArticleTagsChanged, ArticleUpdated, ArticleViewed, CommentAdded,
+                    EventBus, PasswordChanged, PendingEvents, UserCreated, UserDeleted)
+from hyperloglog import ViewSketches
+from passwords import DUMMY_HASH, hash_password, is_hashed, needs_rehash, verify_password
+from queries import (ADD_COMMENT, ADD_VIEW, COUNT_REPEAT_VIEW, ARTICLE_COMMENTS, ARTICLE_COMMENTS_PAGE, ARTICLE_TAGS,
+                     ARTICLE_COMMENTS_FIRST_PAGE, ARTICLES_SORTED, CURRENT_SCHEMA_VERSION, ARTICLES_BY_CATEGORY,
+                     ARTICLES_BY_TAG, CATEGORY_EXISTS, CHECK_USER_EXISTS, CREATE_USER, DELETE_USER, GET_USER, HIGHEST_COMMENT_ID, SINGLE_ARTICLE, SINGLE_CATEGORY, SINGLE_TAG, TAG_EXISTS,
+                     COMMENT_COUNT, INCREMENT_COMMENT_COUNT, INSERT_COMMENT_COUNT, UPDATE_PASSWORD, VALIDATE_USER, VERIFY_DB,
+                     DELETE_ARTICLE, DELETE_ARTICLE_REFERENCES, DELETE_ARTICLE_TAGS, INSERT_ARTICLE, INSERT_ARTICLE_TAG,
+                     NEXT_ARTICLE_ID, UPDATE_ARTICLE, ARTICLES_BY_IDS, ARTICLES_TAGS_BY_IDS)
+import recommendations
+from recent_views import RecentViews
+from resilience import Resilience
+from routing import ConnectionRouter, ReadYourWrites
+from sessions import SessionStore
+from summary_cache import SummaryCache
+from trending import TrendingScores
 
 
 class User:
@@ -46,23 +66,59 @@ class User:
 class UserTable:
     """A class for interacting with the Users table in the database.
     """
-    def __init__(self, conn):
+
+    # Number of usernames kept in the credential cache
+    credential_cache_size = 1024
+
+    def __init__(self, conn, sessions: SessionStore = None, pending: PendingEvents = None):
         """Initialize a new UserTable object.
 
         Args:
             conn (oracledb.connection.Connection): The connection to the oracle database.
+            sessions (SessionStore, optional): Where login sessions are kept. A private in-memory store is used if not given.
+            pending (PendingEvents, optional): Where change events are staged until commit. If not given, events go to
+                a private bus that only revokes the sessions of deleted users.
         """
         self.conn: oracledb.connection.Connection = conn
+        self.sessions = sessions if sessions is not None else SessionStore()
+        if pending is None:
+            pending = PendingEvents(EventBus())
+            self.sessions.subscribe(pending.bus)
+        self.pending = pending
+
+        # username -> (userID, stored hash, keyed digest of the password that was verified against it).
+        # Lets repeated logins skip the slow key derivation without keeping plaintext passwords in memory.
+        self._credentials: OrderedDict = OrderedDict()
+        self._cache_key = secrets.token_bytes(32)
 
-    def create(self, user: User):
-        """Create a new user in the database.
+    def create(self, user: User, password_is_hash: bool = False) -> int:
+        """Create a new user in the database. The password is hashed before it is stored.
 
         Args:
             user (User): The user to create.
+            password_is_hash (bool, optional): Whether user.password is already a stored hash, e.g. when copying
+                users between databases. Otherwise it is the plaintext password, however it looks. Defaults to False.
+
+        Raises:
+            ValueError: If password_is_hash is True and user.password is not a hash.
+
+        Returns:
+            int: The new user's ID.
         """
+        if password_is_hash:
+            if not is_hashed(user.password):
+                raise ValueError("Password is not a stored hash")
+            password = user.password
+        else:
+            password = hash_password(user.password)
         with self.conn.cursor() as cursor:
-            cursor.execute(CREATE_USER, username=user.username, password=user.password, registerDate=user.registerDate)
+            cursor.execute(CREATE_USER, username=user.username, password=password, registerDate=user.registerDate)
+            cursor.execute(VALIDATE_USER, username=user.username)
+            userID = cursor.fetchone()[0]
+        self.pending.add(UserCreated(userID, user.username))
         self.conn.commit()
+        self.pending.committed()
+        return userID
 
     def delete(self, userID: int):
         """Delete a user from the database.
@@ -72,7 +128,30 @@ class UserTable:
         """
         with self.conn.cursor() as cursor:
             cursor.execute(DELETE_USER, userID=userID)
+        self.pending.add(UserDeleted(int(userID)))
         self.conn.commit()
+        self._forget(userID)
+        self.pending.committed()
+
+    def set_password(self, userID: int, password: str):
+        """Hash and store a new password for a user.
+
+        Args:
+            userID (int): The ID of the user.
+            password (str): The new plaintext password.
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute(UPDATE_PASSWORD, userID=userID, password=hash_password(password))
+        self.pending.add(PasswordChanged(int(userID)))
+        self.conn.commit()
+        self._forget(userID)
+        self.pending.committed()
+
+    def _forget(self, userID: int):
+        """Drop any cached credentials for a user."""
+        for username, entry in list(self._credentials.items()):
+            if int(entry[0]) == int(userID):
+                del self._credentials[username]
 
     def exists(self, userID: int) -> bool:
         """Check if a user exists in the database.
@@ -109,6 +188,9 @@ class UserTable:
     def validate(self, username: str, password: str) -> Union[int, None]:
         """
         Give a username and password, return the user's ID if the user exists. Otherwise return None.
+
+        The user is fetched with a single lookup on the unique username index and the password is checked in Python.
+        Legacy plaintext passwords are upgraded to a hash on the first successful login.
         
         Args:
             username (str): The username to check
@@ -118,27 +200,70 @@ class UserTable:
         """
 
         with self.conn.cursor() as cursor:
-            cursor.execute(VALIDATE_USER, username=username, password=password)
-            result = cursor.fetchone()
+            cursor.execute(VALIDATE_USER, username=username)
+            row = cursor.fetchone()
+
+        if row is None:
+            verify_password(password, DUMMY_HASH)
+            return None
 
-            if result and result[0] == 1:
-                return result[1]
-            elif result is None or (result and result[0] == 0):
-                return None
-            elif result is not None:
-                raise DatabaseError(f"Unexpected result from validate_user. There should only be one row returned. Got {result[0]} instead.")
+        userID, stored = row
+        digest = hmac.new(self._cache_key, password.encode(), hashlib.sha256).digest()
 
-            raise DatabaseError("Unexpected result from validate_user. There should only be one row returned.")
+        cached = self._credentials.get(username)
+        if cached is not None and cached[1] == stored and hmac.compare_digest(cached[2], digest):
+            self._credentials.move_to_end(username)
+            return userID
+
+        if not verify_password(password, stored):
+            return None
+
+        if needs_rehash(stored):
+            stored = hash_password(password)
+            with self.conn.cursor() as cursor:
+                cursor.execute(UPDATE_PASSWORD, userID=userID, password=stored)
+            self.conn.commit()
+            self.pending.committed()  # anything else staged on this connection was committed with it
+
+        self._credentials[username] = (userID, stored, digest)
+        if len(self._credentials) > self.credential_cache_size:
+            self._credentials.popitem(last=False)
+        return userID
+
+    def login(self, username: str, password: str) -> Union[str, None]:
+        """Validate a username and password and start a session for the user.
+
+        Args:
+            username (str): The username to check
+            password (str): The password to check
+
+        Returns:
+            str: A session token if the credentials are valid, otherwise None
+        """
+        userID = self.validate(username, password)
+        if userID is None:
+            return None
+        return self.sessions.issue(self.get(userID))
+
+    def logout(self, token: str):
+        """End a session started with login.
+
+        Args:
+            token (str): The session token.
+        """
+        self.sessions.revoke(token)
 
 
 class Article:
-    def __init__(self, articleID, title, author, publishDate, content, tags: List[str]):
+    def __init__(self, articleID, title, author, publishDate, content, tags: List[str], updatedAt=None):
         self.articleID = articleID
         self.title = title
         self.author = author
         self.publishDate = publishDate
         self.content = content
         self.tags = tags
+        # When the article was last changed by ArticleTable.update, or None. Only read for single articles.
+        self.updatedAt = updatedAt
 
     def __str__(self):
         return f"""
@@ -179,117 +304,506 @@ class Comment:
     __repr__ = __str__
 
 
+class CommentPage:
+    """One page of an article's comments, in date order, along with the total number of comments.
+
+    Pages are found by a cursor holding the date and ID of the last comment before them, rather than by page number,
+    so a deep page costs no more than the first.
+    """
+
+    def __init__(self, articleID: int, comments: List[Comment], total: int, page_size: int, has_next: bool):
+        self.articleID = articleID
+        self.comments = comments
+        self.total = total
+        self.page_size = page_size
+        self.has_next = has_next
+
+    @property
+    def next_cursor(self) -> Union[str, None]:
+        """The cursor of the page after this one, or None if this is the last page."""
+        if not self.has_next:
+            return None
+        last = self.comments[-1]
+        return f"{last.commentDate.isoformat()}_{last.commentID}"
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Get the date and ID of the comment a cursor points after.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        commentDate, sep, commentID = str(cursor).rpartition('_')
+        try:
+            return datetime.fromisoformat(commentDate), int(commentID)
+        except ValueError:
+            raise ValueError(f"Invalid comment cursor '{cursor}'")
+
+
 class ArticleTable:
 
     sort_options = ['date', 'title', 'author']
 
-    def __init__(self, conn):
+    # Attempts at picking a free comment ID when sessions add comments concurrently
+    comment_id_retries = 5
+
+    # Articles kept from recent reads, served by get while the database is unavailable
+    article_cache_size = 256
+
+    # Characters written per round trip when streaming long content into a CLOB on Oracle
+    clob_chunk_size = 1 << 20
+
+    # IDs bound in one IN list by get_many. Oracle allows at most 1000 expressions in a list.
+    in_list_size = 1000
+
+    def __init__(self, conn, trending: TrendingScores = None, pending: PendingEvents = None, router: ConnectionRouter = None,
+                 recent_views: RecentViews = None, sketches: ViewSketches = None, resilience: Resilience = None):
         self.conn = conn
+        self.trending = trending
+        self.recent_views = recent_views if recent_views is not None else RecentViews()
+        self.sketches = sketches
+        self.pending = pending if pending is not None else PendingEvents(EventBus())
+        # Reads below go through the router, to a replica if there is one. Writes always use self.conn.
+        self.router = router if router is not None else ConnectionRouter(conn)
+        self.resilience = resilience if resilience is not None else Resilience()
+        self._recent_articles: OrderedDict[int, Article] = OrderedDict()
+
+    def _read(self, call, kind='read', fallback=None):
+        """Make an idempotent read through the Resilience policy, on the connection the router picks. `call` is
+        given that connection, so the query runs where the call timeout was set."""
+        conn = self.router.reader()
+        return self.resilience.run(conn, lambda: call(conn), kind, fallback=fallback)
+
+    def _write(self, call):
+        """Make a write through the Resilience policy. Writes are never retried."""
+        return self.resilience.run(self.conn, call, 'write', idempotent=False)
 
     def get(self, articleID):
-        with self.conn.cursor() as cursor:
+        return self._read(lambda conn: self._get(conn, articleID),
+                          fallback=lambda: self._recent_articles.get(int(articleID)))
+
+    def _get(self, conn, articleID):
+        with conn.cursor() as cursor:
             cursor.execute(SINGLE_ARTICLE, articleID=articleID)
             row = cursor.fetchone()
             if row is None:
                 raise DatabaseError("Article not found")
             articleID = row[0]
             cursor.execute(ARTICLE_TAGS, articleID=articleID)
-            tags = [row[0] for row in cursor.fetchall()]
-            return Article(*row, tags=tags)
+            tags = [tag_row[0] for tag_row in cursor.fetchall()]
+            article = Article(*row[:5], tags=tags, updatedAt=row[5])
+        return self._remember(article)
+
+    def _remember(self, article: Article) -> Article:
+        """Keep an article in the cache served while the database is unavailable."""
+        articleID = int(article.articleID)
+        self._recent_articles[articleID] = article
+        self._recent_articles.move_to_end(articleID)
+        if len(self._recent_articles) > self.article_cache_size:
+            self._recent_articles.popitem(last=False)
+        return article
+
+    def get_many(self, articleIDs: Iterable[int]) -> Dict[int, Article]:
+        """Get several articles in two queries, rather than two per article.
 
-    def get_all(self, sort_by='date') -> List[Article]:
+        Args:
+            articleIDs (Iterable[int]): The IDs of the articles.
+
+        Returns:
+            Dict[int, Article]: The articles that exist, by ID.
+        """
+        articleIDs = list(dict.fromkeys(int(articleID) for articleID in articleIDs))
+
+        def cached():
+            if all(articleID in self._recent_articles for articleID in articleIDs):
+                return {articleID: self._recent_articles[articleID] for articleID in articleIDs}
+            return None
+        return self._read(lambda conn: self._get_many(conn, articleIDs), fallback=cached)
+
+    def _get_many(self, conn, articleIDs: List[int]) -> Dict[int, Article]:
+        rows, tags = [], {}
+        with conn.cursor() as cursor:
+            for start in range(0, len(articleIDs), self.in_list_size):
+                chunk = articleIDs[start:start + self.in_list_size]
+                binds = {f"id{i}": articleID for i, articleID in enumerate(chunk)}
+                in_list = ', '.join(f":{name}" for name in binds)
+                cursor.execute(ARTICLES_BY_IDS.format(in_list=in_list), **binds)
+                rows.extend(cursor.fetchall())
+                cursor.execute(ARTICLES_TAGS_BY_IDS.format(in_list=in_list), **binds)
+                for articleID, tagName in cursor.fetchall():
+                    tags.setdefault(int(articleID), []).append(tagName)
+        return {int(row[0]): self._remember(Article(*row[:5], tags=tags.get(int(row[0]), []), updatedAt=row[5]))
+                for row in rows}
+
+    def _sort_column(self, sort_by: str) -> str:
         assert sort_by in self.sort_options
+        return {'date': 'publishDate', 'title': 'title', 'author': 'author'}[sort_by]
+
+    def _iter_articles(self, query: str, batch_size: int, conn=None, **binds) -> Iterator[Article]:
+        """Run an article query and yield Articles as rows arrive, fetching `batch_size` rows per round trip. Reads
+        from `conn`, or the connection the router picks."""
+        conn = conn if conn is not None else self.router.reader()
+        with conn.cursor() as cursor, conn.cursor() as tag_cursor:
+            cursor.arraysize = batch_size
+            cursor.execute(query, **binds)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    tag_cursor.execute(ARTICLE_TAGS, articleID=row[0])
+                    tags = [tag_row[0] for tag_row in tag_cursor.fetchall()]
+                    yield Article(*row, tags=tags)
+
+    def iter_all(self, sort_by='date', batch_size=50, conn=None) -> Iterator[Article]:
+        """Stream every article. See get_all."""
+        return self._iter_articles(ARTICLES_SORTED, batch_size, conn, sort_by=self._sort_column(sort_by))
+
+    def iter_by_category(self, catName: str, sort_by='date', batch_size=50, conn=None) -> Iterator[Article]:
+        """Stream the articles in a category. See get_by_category."""
+        return self._iter_articles(ARTICLES_BY_CATEGORY, batch_size, conn, catName=catName,
+                                   sort_by=self._sort_column(sort_by))
+
+    def iter_by_tag(self, tagID: int, sort_by='date', batch_size=50, conn=None) -> Iterator[Article]:
+        """Stream the articles with a tag. See get_by_tag."""
+        return self._iter_articles(ARTICLES_BY_TAG, batch_size, conn, tagID=tagID, sort_by=self._sort_column(sort_by))
+
+    def iter_search(self, query: ArticleQuery, batch_size=50, conn=None) -> Iterator[Article]:
+        """Stream the articles matching a query. See search."""
+        sql, binds = query.sql()
+        return self._iter_articles(sql, batch_size, conn, **binds)
+
+    def search(self, query: ArticleQuery) -> List[Article]:
+        """Get the articles matching any combination of tags, categories and publish dates.
 
-        articles = []
+        Args:
+            query (ArticleQuery): The filters to apply.
 
-        if sort_by == 'date':
-            sort_by = 'publishDate'
-        elif sort_by == 'title':
-            sort_by = 'title'
-        elif sort_by == 'author':
-            sort_by = 'author'
+        Returns:
+            List[Article]: The matching articles, sorted as the query asks.
+        """
+        return self._read(lambda conn: list(self.iter_search(query, conn=conn)))
 
-        with self.conn.cursor() as cursor:
-            cursor.execute(ARTICLES_SORTED, sort_by=sort_by)
-            rows = cursor.fetchall()
-            for row in rows:
-                articleID = row[0]
-                cursor.execute(ARTICLE_TAGS, articleID=articleID)
-                tags = [row[0] for row in cursor.fetchall()]
-                articles.append(Article(*row, tags=tags))
-                
-        return articles
+    def get_all(self, sort_by='date') -> List[Article]:
+        return self._read(lambda conn: list(self.iter_all(sort_by, conn=conn)))
     
     def get_by_category(self, catName: str, sort_by='date') -> List[Article]:
-        
-        assert sort_by in self.sort_options
-
-        articles = []
-
-        if sort_by == 'date':
-            sort_by = 'publishDate'
-        elif sort_by == 'title':
-            sort_by = 'title'
-        elif sort_by == 'author':
-            sort_by = 'author'
-        
-        with self.conn.cursor() as cursor:
-            cursor.execute(ARTICLES_BY_CATEGORY, catName=catName, sort_by=sort_by)
-            rows = cursor.fetchall()
-            for row in rows:
-                articleID = row[0]
-                cursor.execute(ARTICLE_TAGS, articleID=articleID)
-                tags = [row[0] for row in cursor.fetchall()]
-                articles.append(Article(*row, tags=tags))
-
-        return articles
+        return self._read(lambda conn: list(self.iter_by_category(catName, sort_by, conn=conn)))
     
     def get_by_tag(self, tagID: int, sort_by='date') -> List[Article]:
-
-        assert sort_by in self.sort_options
-
-        articles = []
-
-        if sort_by == 'date':
-            sort_by = 'publishDate'
-        elif sort_by == 'title':
-            sort_by = 'title'
-        elif sort_by == 'author':
-            sort_by = 'author'
-        
-        with self.conn.cursor() as cursor:
-            cursor.execute(ARTICLES_BY_TAG, tagID=tagID, sort_by=sort_by)
-            rows = cursor.fetchall()
-            for row in rows:
-                articleID = row[0]
-                cursor.execute(ARTICLE_TAGS, articleID=articleID)
-                tags = [row[0] for row in cursor.fetchall()]
-                articles.append(Article(*row, tags=tags))
-        
-        return articles
+        return self._read(lambda conn: list(self.iter_by_tag(tagID, sort_by, conn=conn)))
 
     def get_tags(self, articleID: int):
-        with self.conn.cursor() as cursor:
-            cursor.execute(ARTICLE_TAGS, articleID=articleID)
-            return [row[0] for row in cursor.fetchall()]
+        def read(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(ARTICLE_TAGS, articleID=articleID)
+                return [row[0] for row in cursor.fetchall()]
+        return self._read(read)
         
     def get_comments(self, articleID: int) -> List[Comment]:
-        with self.conn.cursor() as cursor:
+        def read(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(ARTICLE_COMMENTS, articleID=articleID)
+                return [Comment(*row) for row in cursor.fetchall()]
+        return self._read(read)
+
+    def get_comment_page(self, articleID: int, cursor: str = None, page_size: int = 20) -> CommentPage:
+        """Get one page of comments on an article, oldest first.
+
+        Args:
+            articleID (int): The ID of the article.
+            cursor (str, optional): The next_cursor of the previous page. Defaults to the first page.
+            page_size (int, optional): Comments per page. Defaults to 20.
+
+        Returns:
+            CommentPage: The comments on the page and the total number of comments.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        after = CommentPage.parse_cursor(cursor) if cursor else None
+
+        def read(conn):
+            with conn.cursor() as db_cursor:
+                db_cursor.execute(COMMENT_COUNT, articleID=articleID)
+                row = db_cursor.fetchone()
+                total = int(row[0]) if row is not None else 0
+
+                # One row past the page tells whether there is a next page
+                if after is None:
+                    db_cursor.execute(ARTICLE_COMMENTS_FIRST_PAGE, articleID=articleID, page_size=page_size + 1)
+                else:
+                    db_cursor.execute(ARTICLE_COMMENTS_PAGE, articleID=articleID, afterDate=after[0], afterID=after[1],
+                                      page_size=page_size + 1)
+                comments = [Comment(*row) for row in db_cursor.fetchall()]
+            return CommentPage(articleID, comments[:page_size], total, page_size, len(comments) > page_size)
+        return self._read(read)
+
+    def iter_comments(self, articleID: int, batch_size=50) -> Iterator[Comment]:
+        """Stream the comments on an article, fetching `batch_size` rows per round trip."""
+        with self.router.reader().cursor() as cursor:
+            cursor.arraysize = batch_size
             cursor.execute(ARTICLE_COMMENTS, articleID=articleID)
-            return [Comment(*row) for row in cursor.fetchall()]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield Comment(*row)
 
-    def add_view(self, articleID: int, userID: int):
-        with self.conn.cursor() as cursor:
-            cursor.execute(ADD_VIEW, articleID=articleID, userID=userID)
-            self.conn.commit()
+    def add_view(self, articleID: int, userID: int, commit=True):
+        """Record that a user viewed an article.
+
+        Repeated views of the same article by the same user within the RecentViews window are counted in the row of
+        the first one (or dropped, if the window does not count repeats) instead of adding a row each time.
+
+        Args:
+            articleID (int): The ID of the article that was viewed.
+            userID (int): The ID of the user that viewed it.
+            commit (bool, optional): Commit immediately. Batch callers pass False and commit a group at once with
+                NewsDB.commit. Defaults to True.
+        """
+        viewed_at, new_row = self.recent_views.row_for(articleID, userID)
+        if not new_row and not self.recent_views.count_repeats:
+            return
+
+        def write(new_row=new_row):
+            with self.conn.cursor() as cursor:
+                if not new_row:
+                    cursor.execute(COUNT_REPEAT_VIEW, articleID=articleID, userID=userID, viewedAt=viewed_at)
+                    # The first row may be gone, e.g. archived
+                    new_row = cursor.rowcount == 0
+                if new_row:
+                    cursor.execute(ADD_VIEW, articleID=articleID, userID=userID, viewedAt=viewed_at)
+                    # Repeats can't be counted in a row that was rolled back
+                    self.pending.on_rollback(lambda: self.recent_views.forget(articleID, userID))
+            self.pending.add(ArticleViewed(int(articleID), int(userID)))
+            if commit:
+                self.conn.commit()
+                self.pending.committed()
+        try:
+            self._write(write)
+        except Exception:
+            # Whether the row was written is unknown, so the next view starts a new one
+            self.recent_views.forget(articleID, userID)
+            raise
+        if commit and self.sketches is not None:
+            self.sketches.flush_if_due(self.conn)
             
-    def add_comment(self, articleID: int, userID: int, content: str):
-        with self.conn.cursor() as cursor:
-            cursor.execute(HIGHEST_COMMENT_ID)
-            commentID = int(cursor.fetchone()[0]) + 1
+    def add_comment(self, articleID: int, userID: int, content: str, commit=True) -> int:
+        """Add a comment to an article.
 
-            cursor.execute(ADD_COMMENT, commentID=commentID, articleID=articleID, userID=userID, content=content)
-            self.conn.commit()
+        Args:
+            articleID (int): The ID of the article to comment on.
+            userID (int): The ID of the user commenting.
+            content (str): The comment text.
+            commit (bool, optional): Commit immediately. Batch callers pass False and commit a group at once with
+                NewsDB.commit. Defaults to True.
+
+        Returns:
+            int: The ID of the new comment.
+        """
+        def write():
+            with self.conn.cursor() as cursor:
+                # Another session can take the same ID between the two statements, so retry a few times
+                for attempt in range(self.comment_id_retries):
+                    cursor.execute(HIGHEST_COMMENT_ID)
+                    commentID = int(cursor.fetchone()[0]) + 1
+                    try:
+                        cursor.execute(ADD_COMMENT, commentID=commentID, articleID=articleID, userID=userID, content=content)
+                        break
+                    except IntegrityError as e:
+                        if 'unique' not in str(e).lower() or attempt == self.comment_id_retries - 1:
+                            raise
+
+                cursor.execute(INCREMENT_COMMENT_COUNT, articleID=articleID)
+                if cursor.rowcount == 0:
+                    cursor.execute(INSERT_COMMENT_COUNT, articleID=articleID)
+            self.pending.add(CommentAdded(commentID, int(articleID), int(userID)))
+            self.router.wrote(userID)
+            if commit:
+                self.conn.commit()
+                self.pending.committed()
+            return commentID
+        return self._write(write)
+
+    def get_recommended(self, userID: int, k: int = 10) -> List[Tuple[Article, float]]:
+        """Get articles recommended for a user, from the neighbors computed by src/recommendations.py.
+
+        Args:
+            userID (int): The user.
+            k (int, optional): Number of articles. Defaults to 10.
+
+        Returns:
+            List[Tuple[Article, float]]: Articles with their scores, best first.
+        """
+        recommended = self._read(lambda conn: recommendations.recommend(conn, userID, k))
+        return self._with_articles(recommended)
+
+    def _with_articles(self, scored: List[Tuple[int, float]]) -> List[Tuple[Article, float]]:
+        """Replace the article IDs of (articleID, score) pairs with the articles, keeping their order. Articles
+        deleted in the meantime are left out."""
+        articles = self.get_many(articleID for articleID, _ in scored)
+        return [(articles[int(articleID)], score) for articleID, score in scored if int(articleID) in articles]
+
+    def get_trending(self, k: int = 10) -> List[Tuple[Article, float]]:
+        """Get the articles with the highest trending scores.
+
+        Args:
+            k (int, optional): Number of articles. Defaults to 10.
+
+        Returns:
+            List[Tuple[Article, float]]: Articles with their current scores, highest first.
+        """
+        if self.trending is None:
+            return []
+        self._read(self.trending.ensure_warm)
+        return self._with_articles(self.trending.top(k))
+
+    ######### PUBLISHING #########
+
+    def _content(self, content: str):
+        """Bind value for an article's content. On Oracle, content too long for one round trip is streamed into a
+        temporary CLOB in `clob_chunk_size` pieces."""
+        if getattr(self.conn, 'engine', 'oracle') == 'sqlite' or content is None or len(content) <= self.clob_chunk_size:
+            return content
+        lob = self.conn.createlob(oracledb.DB_TYPE_CLOB)
+        for offset in range(0, len(content), self.clob_chunk_size):
+            lob.write(content[offset:offset + self.clob_chunk_size], offset + 1)
+        return lob
+
+    def _article_binds(self, article: Article, articleID: int, content) -> dict:
+        return {'articleID': articleID, 'title': article.title, 'author': article.author,
+                'publishDate': article.publishDate, 'content': content}
+
+    def _insert_tags(self, cursor, tags: List[Tuple[int, Iterable[int]]]):
+        """Add the tags of any number of articles in one executemany. Repeated tag IDs are added once."""
+        rows = [{'articleID': articleID, 'tagID': int(tagID)}
+                for articleID, tagIDs in tags for tagID in dict.fromkeys(int(tagID) for tagID in tagIDs)]
+        if rows:
+            cursor.executemany(INSERT_ARTICLE_TAG, rows)
+
+    def create(self, article: Article, tagIDs: Iterable[int] = (), commit=True) -> int:
+        """Add an article and its tags.
+
+        Args:
+            article (Article): The article. Its articleID is ignored, and a missing publishDate means now.
+            tagIDs (Iterable[int], optional): IDs of the article's tags. Defaults to none.
+            commit (bool, optional): Commit immediately. Defaults to True.
+
+        Returns:
+            int: The ID of the new article.
+        """
+        return self.publish_many([(article, tagIDs)], commit)[0]
+
+    def publish_many(self, articles: Iterable[Tuple[Article, Iterable[int]]], commit=True) -> List[int]:
+        """Add many articles and their tags, e.g. for an import, in four round trips whatever their number: the
+        next free ID, one executemany for the articles and one for their tags, and the commit.
+
+        IDs follow the highest one in use, so imports should not run concurrently with each other. Use commit=False
+        to publish several batches in one transaction.
+
+        Args:
+            articles (Iterable[Tuple[Article, Iterable[int]]]): Each article with the IDs of its tags.
+            commit (bool, optional): Commit immediately. Defaults to True.
+
+        Returns:
+            List[int]: The IDs of the new articles, in order.
+        """
+        articles = [(article, list(tagIDs)) for article, tagIDs in articles]
+        if not articles:
+            return []
+
+        def write():
+            with self.conn.cursor() as cursor:
+                cursor.execute(NEXT_ARTICLE_ID)
+                first = int(cursor.fetchone()[0])
+                ids = list(range(first, first + len(articles)))
+                # Content is bound as a CLOB, so long content is not limited to a VARCHAR2
+                cursor.setinputsizes(content=oracledb.DB_TYPE_CLOB)
+                now = datetime.now()
+                rows = [self._article_binds(article, articleID, self._content(article.content))
+                        for articleID, (article, _) in zip(ids, articles)]
+                for row in rows:
+                    row['publishDate'] = row['publishDate'] or now
+                cursor.executemany(INSERT_ARTICLE, rows)
+                self._insert_tags(cursor, [(articleID, tagIDs) for articleID, (_, tagIDs) in zip(ids, articles)])
+            for articleID in ids:
+                self.pending.add(ArticlePublished(articleID))
+                self.pending.add(ArticleTagsChanged(articleID))
+            if commit:
+                self.conn.commit()
+                self.pending.committed()
+            return ids
+        return self._write(write)
+
+    def update(self, article: Article, tagIDs: Iterable[int] = None, commit=True):
+        """Replace the title, author, publish date and content of an article, and optionally its tags. Its updatedAt
+        is set to now.
+
+        Args:
+            article (Article): The article, with the ID of the one to replace. A missing publishDate keeps the
+                stored one.
+            tagIDs (Iterable[int], optional): IDs of the article's new tags. Its tags are kept if not given.
+            commit (bool, optional): Commit immediately. Defaults to True.
+
+        Raises:
+            DatabaseError: If the article does not exist.
+        """
+        articleID = int(article.articleID)
+
+        def write():
+            with self.conn.cursor() as cursor:
+                # Typed, so that a null publishDate compares as a date in NVL
+                cursor.setinputsizes(publishDate=oracledb.DB_TYPE_DATE, content=oracledb.DB_TYPE_CLOB)
+                cursor.execute(UPDATE_ARTICLE, updatedAt=datetime.now(),
+                               **self._article_binds(article, articleID, self._content(article.content)))
+                if cursor.rowcount == 0:
+                    raise DatabaseError("Article not found")
+                if tagIDs is not None:
+                    cursor.execute(DELETE_ARTICLE_TAGS, articleID=articleID)
+                    self._insert_tags(cursor, [(articleID, tagIDs)])
+            self.pending.add(ArticleUpdated(articleID))
+            if tagIDs is not None:
+                self.pending.add(ArticleTagsChanged(articleID))
+            if commit:
+                self.conn.commit()
+                self.pending.committed()
+        self._write(write)
+
+    def delete(self, articleID: int, commit=True):
+        """Delete an article with its tags, comments, views and recommendations.
+
+        Args:
+            articleID (int): The ID of the article.
+            commit (bool, optional): Commit immediately. Defaults to True.
+
+        Raises:
+            DatabaseError: If the article does not exist.
+        """
+        articleID = int(articleID)
+
+        def write():
+            with self.conn.cursor() as cursor:
+                for statement in DELETE_ARTICLE_REFERENCES:
+                    cursor.execute(statement, articleID=articleID)
+                cursor.execute(DELETE_ARTICLE, articleID=articleID)
+                if cursor.rowcount == 0:
+                    raise DatabaseError("Article not found")
+            self.pending.add(ArticleDeleted(articleID))
+            self.pending.add(ArticleTagsChanged(articleID))
+            if commit:
+                self.conn.commit()
+                self.pending.committed()
+        self._write(write)
+
+    def subscribe(self, bus: EventBus):
+        """Drop cached copies of articles as they are changed, by this or any other NewsDB sharing the bus."""
+        bus.subscribe(ArticleUpdated, self._article_changed)
+        bus.subscribe(ArticleDeleted, self._article_changed)
+        bus.subscribe(ArticleTagsChanged, self._article_changed)
+
+    def _article_changed(self, event):
+        self._recent_articles.pop(int(event.articleID), None)
 
 
 class TagTable:
@@ -360,15 +874,82 @@ class Category:
 
 
 class NewsDB:
-    def __init__(self, conn):
+    def __init__(self, conn, sessions: SessionStore = None, trending: TrendingScores = None, events: EventBus = None,
+                 replica=None, reads: ReadYourWrites = None, recent_views: RecentViews = None,
+                 summaries: SummaryCache = None, sketches: ViewSketches = None, resilience: Resilience = None):
+        """Initialize a new NewsDB.
+
+        Args:
+            conn: The database connection.
+            sessions (SessionStore, optional): Where login sessions are kept. Defaults to a new in-memory store.
+            trending (TrendingScores, optional): Trending scores. Defaults to new, empty scores.
+            events (EventBus, optional): Where committed changes are published. Defaults to a new bus without a log.
+            replica (optional): Connection to a read replica, for article, comment and report reads.
+            reads (ReadYourWrites, optional): Tracks which users wrote recently and must read from `conn`. Shared by
+                every NewsDB in a pool. Defaults to a private tracker.
+            recent_views (RecentViews, optional): Dedup window for repeated views. Shared by every NewsDB in a pool.
+                Defaults to a private window with the default settings.
+            summaries (SummaryCache, optional): Cached tag and category summaries. Shared by every NewsDB in a pool.
+                Defaults to a private cache.
+            sketches (ViewSketches, optional): Unique viewer sketches that committed views are added to. Shared by
+                every NewsDB in a pool. Defaults to private sketches.
+            resilience (Resilience, optional): Timeouts, retries and the circuit breaker for database calls. Shared by
+                every NewsDB in a pool, so one breaker covers the whole process. Defaults to a private policy.
+        """
         self.conn: oracledb.connection.Connection = conn
-        self.users = UserTable(self.conn)
-        self.articles = ArticleTable(self.conn)
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.trending = trending if trending is not None else TrendingScores()
+        self.events = events if events is not None else EventBus()
+        self.sessions.subscribe(self.events)
+        self.trending.subscribe(self.events)
+        self.summaries = summaries if summaries is not None else SummaryCache()
+        self.summaries.subscribe(self.events)
+        self.sketches = sketches if sketches is not None else ViewSketches()
+        self.sketches.subscribe(self.events)
+        self.pending = PendingEvents(self.events)
+        self.router = ConnectionRouter(conn, replica, reads)
+        self.resilience = resilience if resilience is not None else Resilience()
+        self.users = UserTable(self.conn, self.sessions, self.pending)
+        self.recent_views = recent_views if recent_views is not None else RecentViews()
+        self.articles = ArticleTable(self.conn, self.trending, self.pending, self.router, self.recent_views,
+                                     self.sketches, self.resilience)
+        self.articles.subscribe(self.events)
         self.tags = TagTable(self.conn)
         self.categories = CategoryTable(self.conn)
 
-    def verify(self):
-        """Verify that the database is set up correctly. All tables should have been initialized.
+    def commit(self):
+        """Commit the connection and publish the changes made since the last commit."""
+        self.conn.commit()
+        self.pending.committed()
+        self.sketches.flush_if_due(self.conn)
+
+    def rollback(self):
+        """Roll back the connection and drop the events of the changes that were undone."""
+        self.conn.rollback()
+        self.pending.rolled_back()
+
+    def verify(self, full=False):
+        """Verify that the database is set up correctly.
+
+        The schema version recorded by db_util's migrations is checked with a single row lookup, rather than probing
+        every table at each startup.
+
+        Args:
+            full (bool, optional): Also check that every table exists and holds its seed rows. Defaults to False.
+
+        Raises:
+            DatabaseError: If the database was never set up, or its schema is older than this code.
         """
+        from db_util import SCHEMA_VERSION
+
         with self.conn.cursor() as cursor:
-            cursor.execute(VERIFY_DB)
+            try:
+                cursor.execute(CURRENT_SCHEMA_VERSION)
+            except DatabaseError as e:
+                raise DatabaseError(f"Schema version not found ({e}). Create the database with `python3 src/db_util.py --create`")
+            version = cursor.fetchone()[0] or 0
+            if version < SCHEMA_VERSION:
+                raise DatabaseError(f"Database schema is at version {version} but version {SCHEMA_VERSION} is needed. "
+                                    "Upgrade it with `python3 src/db_util.py --migrate`")
+            if full:
+                cursor.execute(VERIFY_DB)
@@ -0,0 +1,144 @@
+"""
+A fixed size pool of NewsDB instances, each with its own connection, for serving concurrent requests.
+"""
+
+import os
+import queue
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import oracledb
+from oracledb.exceptions import DatabaseError
+
+from db import NewsDB
+from events import EventBus
+from hyperloglog import ViewSketches
+from recent_views import RecentViews
+from resilience import Resilience
+from routing import ReadYourWrites
+from sessions import SessionStore
+from summary_cache import SummaryCache
+from trending import TrendingScores
+
+
+def init_oracle_mode() -> str:
+    """Pick the oracledb driver mode before the first connection is opened.
+
+    Thin mode (the default) needs no Oracle client libraries and connects without loading them. Thick mode is only
+    used when ORACLE_THICK_MODE=true or ORACLE_CLIENT_LIB_DIR is set, for features that need the client libraries.
+
+    Returns:
+        str: 'thick' or 'thin'.
+    """
+    lib_dir = os.getenv('ORACLE_CLIENT_LIB_DIR')
+    if lib_dir or os.getenv('ORACLE_THICK_MODE', 'false').lower() == 'true':
+        oracledb.init_oracle_client(lib_dir=lib_dir)
+        return 'thick'
+    return 'thin'
+
+
+def oracle_connector(prefix='DB') -> Callable[[], 'oracledb.Connection']:
+    """Get a function that opens a new connection using the DB_* settings from the environment.
+
+    With prefix='DB_REPLICA', DB_REPLICA_HOST and DB_REPLICA_PORT are used instead of DB_HOST and DB_PORT, with the
+    same user and password.
+    """
+    def connect():
+        return oracledb.connect(user=os.getenv('DB_USER'),
+                                password=os.getenv('DB_PASS'),
+                                port=os.getenv(f'{prefix}_PORT') or os.getenv('DB_PORT'),
+                                host=os.getenv(f'{prefix}_HOST'),
+                                service_name='XE')
+    return connect
+
+
+class NewsDBPool:
+    """Hands out NewsDB instances to one thread at a time. All instances share one session store, trending scores and event bus."""
+
+    def __init__(self, connect: Callable[[], 'oracledb.Connection'], size: int = 4, sessions: SessionStore = None,
+                 trending: TrendingScores = None, events: EventBus = None,
+                 replica_connect: Callable[[], 'oracledb.Connection'] = None, reads: ReadYourWrites = None,
+                 recent_views: RecentViews = None, summaries: SummaryCache = None, sketches: ViewSketches = None,
+                 resilience: Resilience = None):
+        """Initialize a new NewsDBPool. Connections are opened lazily, up to `size`.
+
+        Args:
+            connect (Callable): Opens a new database connection.
+            size (int, optional): Maximum number of connections. Defaults to 4.
+            sessions (SessionStore, optional): Session store shared by every NewsDB. A new one is created if not given.
+            trending (TrendingScores, optional): Trending scores shared by every NewsDB. A new one is created if not given.
+            events (EventBus, optional): Event bus shared by every NewsDB. A new one is created if not given.
+            replica_connect (Callable, optional): Opens a connection to a read replica. Each NewsDB gets one alongside
+                its primary connection, and reads articles, comments and reports from it.
+            reads (ReadYourWrites, optional): Read-your-writes tracking shared by every NewsDB. A new one is created if not given.
+            recent_views (RecentViews, optional): View dedup window shared by every NewsDB. A new one is created if not given.
+            summaries (SummaryCache, optional): Cached summaries shared by every NewsDB. A new one is created if not given.
+            sketches (ViewSketches, optional): Unique viewer sketches shared by every NewsDB. Created if not given.
+            resilience (Resilience, optional): Timeouts, retries and the circuit breaker shared by every NewsDB.
+                Created if not given.
+        """
+        self.connect = connect
+        self.size = size
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.trending = trending if trending is not None else TrendingScores()
+        self.events = events if events is not None else EventBus()
+        self.replica_connect = replica_connect
+        self.reads = reads if reads is not None else ReadYourWrites()
+        self.recent_views = recent_views if recent_views is not None else RecentViews()
+        self.summaries = summaries if summaries is not None else SummaryCache()
+        self.sketches = sketches if sketches is not None else ViewSketches()
+        self.resilience = resilience if resilience is not None else Resilience()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _get(self, timeout: float) -> NewsDB:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                replica = self.replica_connect() if self.replica_connect is not None else None
+                db = NewsDB(self.connect(), self.sessions, self.trending, self.events, replica, self.reads,
+                            self.recent_views, self.summaries, self.sketches,
+                            self.resilience)
+                self._all.append(db)
+                return db
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise DatabaseError(f"Timed out waiting for a connection from the pool (size {self.size})")
+
+    @contextmanager
+    def acquire(self, timeout: float = 30) -> Iterator[NewsDB]:
+        """Borrow a NewsDB for the duration of a with block.
+
+        Anything left uncommitted when the block raises is rolled back before the connection is reused.
+        """
+        db = self._get(timeout)
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            self._idle.put(db)
+
+    def close(self):
+        """Store the views not yet added to the unique viewer sketches, then close every connection in the pool."""
+        if len(self.sketches) and self._all:
+            try:
+                self.sketches.flush(self._all[0].conn)
+            except DatabaseError:
+                traceback.print_exc()
+        with self._lock:
+            for db in self._all:
+                db.router.close()
+                db.conn.close()
+            self._all.clear()
+        self._idle = queue.LifoQueue()
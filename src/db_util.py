@@ -5,74 +5,588 @@ Helper script for initializing and destroying database content.
 @date: 2023-04-10
 """
 
+import datetime as dt
+import functools
+import gzip
+import hashlib
+import json
 import os
+import re
+import time
+from collections import Counter
 from pathlib import Path
 import argparse
+from typing import Callable, List, Set, Tuple, Union
 
 # Third party imports
 from dotenv import load_dotenv
 import oracledb
 
+# Local imports
+from hyperloglog import backfill as backfill_sketches, rollup_months
+from passwords import hash_password, is_hashed
+from queries import ALL_USER_PASSWORDS, UPDATE_PASSWORD
 
-def execute_script(script_name: str, cursor: 'Cursor', output=True) -> str:
-    content = ""
-    with open(Path(__file__).parent.parent / script_name, 'r') as f:
-        for line in f.readlines():
-            if not line.startswith('--'):  # skip lines starting with '--'
-                if '--' in line:  # if line contains '--', remove everything after it
-                    line = line[:line.index('--')]
-                content += "\n" + line
 
-    for statement in content.split(';'):
-        statement = statement.strip()
-        if statement and not statement.isspace():
+# Errors a script step may hit when it is run against a database that already has what it creates, or that never had
+# what it drops. Every other error stops the script.
+TOLERATED_ERRORS = ('ORA-00955', 'ORA-00942', 'ORA-01418', 'ORA-02289', 'already exists', 'no such table',
+                    'no such view', 'no such index')
+
+_INSERT_VALUES = re.compile(r"^insert\s+into\s+.*?\bvalues\s*\(", re.IGNORECASE | re.DOTALL)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.:])\d+(?:\.\d+)?(?![\w.])")
+
+
+def split_statements(text: str) -> List[str]:
+    """Split a SQL script into its statements in a single pass, dropping comments.
+
+    Semicolons and comment markers inside quoted strings or identifiers are left alone, so a literal such as
+    'a; b -- c' is kept whole.
+
+    Raises:
+        oracledb.DatabaseError: If a quote or block comment is never closed.
+    """
+    statements, parts = [], []
+    i = start = 0
+    while i < len(text):
+        c = text[i]
+        if c in '\'"':
+            end = text.find(c, i + 1)
+            while end != -1 and text.startswith(c, end + 1):  # a doubled quote escapes itself
+                end = text.find(c, end + 2)
+            if end == -1:
+                raise oracledb.DatabaseError(f"Unterminated quote in `{text[i:i + 40]}...`")
+            i = end + 1
+        elif text.startswith('--', i):
+            parts.append(text[start:i])
+            end = text.find('\n', i)
+            i = start = len(text) if end == -1 else end
+        elif text.startswith('/*', i):
+            parts.append(text[start:i] + ' ')
+            end = text.find('*/', i + 2)
+            if end == -1:
+                raise oracledb.DatabaseError(f"Unterminated comment in `{text[i:i + 40]}...`")
+            i = start = end + 2
+        elif c == ';':
+            parts.append(text[start:i])
+            statements.append(''.join(parts).strip())
+            parts = []
+            i = start = i + 1
+        else:
+            i += 1
+    parts.append(text[start:])
+    statements.append(''.join(parts).strip())
+    return [statement for statement in statements if statement]
+
+
+def bind_literals(statement: str) -> Tuple[str, Union[dict, None]]:
+    """Turn the literals in an INSERT's VALUES list into named binds, so INSERTs of the same shape share one statement.
+
+    Returns:
+        tuple: The statement with literals replaced by binds, and the bind values. Statements other than
+            INSERT ... VALUES are returned unchanged, with None for the binds.
+    """
+    match = _INSERT_VALUES.match(statement)
+    if not match:
+        return statement, None
+
+    binds = {}
+
+    def to_bind(literal_match) -> str:
+        literal = literal_match.group()
+        name = f"v{len(binds) + 1}"
+        if literal.startswith("'"):
+            binds[name] = literal[1:-1].replace("''", "'")
+        else:
+            binds[name] = float(literal) if '.' in literal else int(literal)
+        return ':' + name
+
+    template = statement[:match.end()] + _LITERAL.sub(to_bind, statement[match.end():])
+    # No quoted strings are left, so whitespace can be normalized without changing the statement
+    return ' '.join(template.split()), binds
+
+
+class ScriptStep:
+    """One unit of work in a SQL script: a single statement, or a run of INSERTs of the same shape executed as one
+    array bind."""
+
+    def __init__(self, statement: str, rows: List[dict] = None):
+        self.statement = statement
+        self.rows = rows
+        self.kind = statement.split(None, 1)[0].lower()
+        # One per row for grouped INSERTs, so rows added to a group later don't re-run the ones already applied
+        self.checksums: List[str] = []
+
+    @property
+    def is_dml(self) -> bool:
+        return self.kind in ('insert', 'update', 'delete', 'merge')
+
+    def __str__(self):
+        summary = ' '.join(self.statement.split())
+        summary = summary if len(summary) <= 60 else summary[:57] + '...'
+        return f"{summary} ({len(self.rows)} rows)" if self.rows else summary
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_script(path: Path, mtime: float) -> Tuple[ScriptStep, ...]:
+    steps: List[ScriptStep] = []
+    for statement in split_statements(path.read_text()):
+        template, binds = bind_literals(statement)
+        if binds is None:
+            steps.append(ScriptStep(statement))
+        elif steps and steps[-1].rows is not None and steps[-1].statement == template:
+            steps[-1].rows.append(binds)
+        else:
+            steps.append(ScriptStep(template, [binds]))
+
+    # Identical statements or rows are told apart by how many times they have appeared before
+    seen = Counter()
+    for step in steps:
+        for row in step.rows or [None]:
+            content = json.dumps([step.statement, row], sort_keys=True)
+            seen[content] += 1
+            step.checksums.append(hashlib.sha256(f"{content}#{seen[content]}".encode()).hexdigest())
+    return tuple(steps)
+
+
+def load_script(script_name: str) -> Tuple[ScriptStep, ...]:
+    """Parse a SQL script from the project root into steps. Parsed scripts are cached until the file changes."""
+    path = Path(__file__).parent.parent / script_name
+    return _parse_script(path, path.stat().st_mtime)
+
+
+def applied_steps(db_conn: 'Connection', script_name: str) -> Set[str]:
+    """Get the checksums of a script's steps that have been applied, creating the tracking table if needed."""
+    with db_conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT checksum FROM ScriptSteps WHERE script = :script", script=str(script_name))
+            return {row[0] for row in cursor.fetchall()}
+        except oracledb.DatabaseError:
+            cursor.execute("""create table ScriptSteps (
+                                  script varchar(255),
+                                  checksum varchar(64),
+                                  appliedAt timestamp,
+                                  primary key (script, checksum)
+                              )""")
+            db_conn.commit()
+            return set()
+
+
+def run_script(db_conn: 'Connection', script_name: str, output=True, track=True) -> List[dict]:
+    """Run a SQL script from the project root, e.g. create_data.txt.
+
+    Runs of INSERTs of the same shape are executed with one array bind, and consecutive DML steps are committed
+    together. DDL steps that find their object already there (or, when dropping, already gone) are let through;
+    any other error rolls back the current transaction and stops the script.
+
+    Args:
+        db_conn (Connection): The database connection.
+        script_name (str): Script file name, relative to the project root.
+        output (bool, optional): Print each step and how long it took. Defaults to True.
+        track (bool, optional): Record applied statements and inserted rows in ScriptSteps by checksum and skip the
+            ones already recorded, so running the script again only applies what is new or has changed.
+            Defaults to True.
+
+    Raises:
+        oracledb.DatabaseError: If a step fails with an error that isn't tolerated.
+
+    Returns:
+        List[dict]: For each step, its number, statement summary, rows inserted, status ('applied', 'tolerated' or
+            'skipped') and the seconds it took.
+    """
+    steps = load_script(script_name)
+    done = applied_steps(db_conn, script_name) if track else set()
+    results = []
+    with db_conn.cursor() as cursor:
+        for number, step in enumerate(steps, 1):
+            start = time.perf_counter()
+            pending = [i for i, checksum in enumerate(step.checksums) if checksum not in done]
+            if not pending:
+                status = 'skipped'
+            else:
+                try:
+                    if step.rows:
+                        cursor.executemany(step.statement, [step.rows[i] for i in pending])
+                    else:
+                        cursor.execute(step.statement)
+                    status = 'applied'
+                except oracledb.DatabaseError as e:
+                    if not any(error in str(e) for error in TOLERATED_ERRORS):
+                        db_conn.rollback()
+                        raise oracledb.DatabaseError(f"{script_name} step {number} failed on `{step}`: {e}") from e
+                    status = 'tolerated'
+                if track:
+                    cursor.executemany("INSERT INTO ScriptSteps (script, checksum, appliedAt) VALUES (:script, :checksum, CURRENT_TIMESTAMP)",
+                                       [{'script': str(script_name), 'checksum': step.checksums[i]} for i in pending])
+                # DML steps share a transaction until the next DDL step or the end of the script
+                if not step.is_dml or number == len(steps) or not steps[number].is_dml:
+                    db_conn.commit()
+
+            results.append({'step': number, 'statement': str(step), 'rows': len(pending) if step.rows else 0,
+                            'status': status, 'seconds': time.perf_counter() - start})
             if output:
-                print(statement)
-            try:
-                cursor.execute(statement)
-                if output:
-                    print('Success!')
-            except oracledb.DatabaseError as e:
+                print(f"{status:9} {results[-1]['seconds'] * 1000:8.2f}ms  {step}")
+
+    if output:
+        applied = sum(result['status'] != 'skipped' for result in results)
+        print(f"{script_name}: {applied} of {len(steps)} step(s) run in {sum(r['seconds'] for r in results):.3f}s")
+    return results
+
+
+def engine_of(db_conn: 'Connection') -> str:
+    """Name of the database engine behind a connection: 'oracle', or 'sqlite' for the stand-in."""
+    return getattr(db_conn, 'engine', 'oracle')
+
+
+class Migration:
+    """A numbered schema change. Migrations are applied in order and each one is applied only once.
+
+    Migrations limited to some engines are recorded without running anything on the others, so every database
+    ends up at the same version. `after` is called with the connection once the statements have run, for data
+    that has to be computed in Python.
+    """
+
+    def __init__(self, version: int, description: str, statements: List[str], engines=('oracle', 'sqlite'),
+                 after: Callable[['Connection'], None] = None):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.engines = engines
+        self.after = after
+
+
+MIGRATIONS = [
+    Migration(1, "Unique index on Users(username) for login lookups", [
+        "create unique index Users_username_idx on Users(username)",
+    ]),
+    Migration(2, "Comments(articleID, commentDate) index and maintained per-article comment counts", [
+        "create index Comments_article_date_idx on Comments(articleID, commentDate)",
+        """create table ArticleCommentCounts (
+               articleID integer primary key references Articles,
+               commentCount integer default 0 not null
+           )""",
+        """insert into ArticleCommentCounts (articleID, commentCount)
+           select A.articleID, count(C.commentID)
+           from Articles A left join Comments C on C.articleID = A.articleID
+           group by A.articleID""",
+    ]),
+    Migration(3, "ArticleTags(tagID, articleID) index for filtering by tag", [
+        "create index ArticleTags_tag_article_idx on ArticleTags(tagID, articleID)",
+    ]),
+    # A unique index rather than a primary key constraint, since SQLite can't add constraints to existing tables.
+    # ArticleTags(tagID) lookups are served by the index from migration 3.
+    Migration(4, "Composite key on ArticleTags and time ordered ArticleViews indexes", [
+        """delete from ArticleTags
+           where rowid not in (select min(rowid) from ArticleTags group by articleID, tagID)""",
+        "create unique index ArticleTags_pk on ArticleTags(articleID, tagID)",
+        "create index ArticleViews_article_time_idx on ArticleViews(articleID, viewedAt)",
+        "create index ArticleViews_user_time_idx on ArticleViews(userID, viewedAt)",
+    ]),
+    # Monthly partitions so that inserts and year reports only touch recent data and old months can be archived.
+    # The SQLite stand-in has no partitioning and relies on the viewedAt indexes instead.
+    Migration(5, "Partition ArticleViews by month", [
+        """alter table ArticleViews modify
+           partition by range (viewedAt) interval (numtoyminterval(1, 'MONTH'))
+           (partition ArticleViews_p0 values less than (timestamp '2000-01-01 00:00:00'))
+           online update indexes (ArticleViews_article_time_idx local, ArticleViews_user_time_idx local)""",
+    ], engines=('oracle',)),
+    Migration(6, "Monthly rollups of archived views and the ArticleViewHistory view", [
+        """create table ArticleViewRollups (
+               articleID integer references Articles,
+               userID integer references Users,
+               viewMonth timestamp,
+               viewCount integer
+           )""",
+        "create index ArticleViewRollups_month_idx on ArticleViewRollups(viewMonth, articleID)",
+        """create view ArticleViewHistory as
+           select articleID, userID, viewedAt, 1 as viewCount from ArticleViews
+           union all
+           select articleID, userID, viewMonth as viewedAt, viewCount from ArticleViewRollups""",
+    ]),
+    # Filled by src/recommendations.py
+    Migration(7, "ArticleNeighbors table for recommendations", [
+        """create table ArticleNeighbors (
+               articleID integer references Articles,
+               neighborID integer references Articles,
+               score number,
+               computedAt timestamp,
+               constraint ArticleNeighbors_pk primary key (articleID, neighborID)
+           )""",
+    ]),
+    # Repeated views are coalesced into one row with a count (see src/recent_views.py). Existing identical rows are
+    # merged the same way.
+    Migration(8, "viewCount on ArticleViews", [
+        "alter table ArticleViews add viewCount integer default 1 not null",
+        """update ArticleViews
+           set viewCount = (select count(*) from ArticleViews D
+                            where D.articleID = ArticleViews.articleID and D.viewedAt = ArticleViews.viewedAt
+                              and D.userID = ArticleViews.userID)
+           where rowid in (select min(rowid) from ArticleViews group by articleID, userID, viewedAt having count(*) > 1)""",
+        """delete from ArticleViews
+           where rowid not in (select min(rowid) from ArticleViews group by articleID, userID, viewedAt)""",
+        "drop view ArticleViewHistory",
+        """create view ArticleViewHistory as
+           select articleID, userID, viewedAt, viewCount from ArticleViews
+           union all
+           select articleID, userID, viewMonth as viewedAt, viewCount from ArticleViewRollups""",
+    ]),
+    Migration(9, "ArticleViewSketches for unique viewer counts", [
+        """create table ArticleViewSketches (
+               articleID integer references Articles,
+               viewDay date,
+               sketch blob,
+               primary key (articleID, viewDay)
+           )""",
+        "create index ArticleViewSketches_day on ArticleViewSketches(viewDay)",
+    ], after=lambda db_conn: backfill_sketches(db_conn, months=False)),
+    # Deleting an article (ArticleTable.delete) removes its rollups and the neighbor rows pointing at it
+    Migration(10, "Indexes on ArticleViewRollups(articleID) and ArticleNeighbors(neighborID)", [
+        "create index ArticleViewRollups_article_idx on ArticleViewRollups(articleID)",
+        "create index ArticleNeighbors_neighbor_idx on ArticleNeighbors(neighborID)",
+    ]),
+    # Trending scores are seeded from the last couple of days of views and comments (TrendingScores.warm_start)
+    Migration(11, "Indexes on ArticleViews(viewedAt) and Comments(commentDate)", [
+        "create index ArticleViews_time_idx on ArticleViews(viewedAt) local",
+        "create index Comments_date_idx on Comments(commentDate)",
+    ]),
+    # Yearly unique viewer counts merge month sketches instead of up to 365 day sketches per article
+    Migration(12, "ArticleViewMonthSketches for unique viewer counts", [
+        """create table ArticleViewMonthSketches (
+               articleID integer references Articles,
+               viewMonth date,
+               sketch blob,
+               primary key (articleID, viewMonth)
+           )""",
+        "create index ArticleViewMonthSketches_month on ArticleViewMonthSketches(viewMonth)",
+    ], after=rollup_months),
+    # Recommendations leave out articles the user viewed, including archived views
+    Migration(13, "Index on ArticleViewRollups(userID)", [
+        "create index ArticleViewRollups_user_idx on ArticleViewRollups(userID, articleID)",
+    ]),
+    # Set by ArticleTable.update, for the API's Last-Modified header. Null until an article is first updated.
+    Migration(14, "updatedAt on Articles", [
+        "alter table Articles add updatedAt timestamp",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def applied_migrations(db_conn: 'Connection') -> List[int]:
+    """Get the versions of the migrations that have been applied, creating the tracking table if needed."""
+    with db_conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT version FROM SchemaMigrations ORDER BY version")
+            return [int(row[0]) for row in cursor.fetchall()]
+        except oracledb.DatabaseError:
+            cursor.execute("""create table SchemaMigrations (
+                                  version integer primary key,
+                                  description varchar(255),
+                                  appliedAt timestamp
+                              )""")
+            return []
+
+
+def migrate(db_conn: 'Connection', output=True) -> List[int]:
+    """Apply every migration that hasn't been applied yet, in order.
+
+    Each migration is recorded in SchemaMigrations once all of its statements succeed. Note that Oracle commits
+    DDL implicitly, so a migration that fails halfway is not rolled back and has to be finished by hand.
+
+    Raises:
+        oracledb.DatabaseError: If a statement fails. Later migrations are not attempted.
+
+    Returns:
+        List[int]: The versions that were applied.
+    """
+    done = set(applied_migrations(db_conn))
+    applied = []
+    with db_conn.cursor() as cursor:
+        for migration in MIGRATIONS:
+            if migration.version in done:
+                continue
+            if output:
+                print(f"Applying migration {migration.version}: {migration.description}")
+            statements = migration.statements if engine_of(db_conn) in migration.engines else []
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except oracledb.DatabaseError as e:
+                    db_conn.rollback()
+                    raise oracledb.DatabaseError(f"Migration {migration.version} failed on `{statement.strip()}`: {e}") from e
+            if statements and migration.after is not None:
+                try:
+                    migration.after(db_conn)
+                except oracledb.DatabaseError as e:
+                    db_conn.rollback()
+                    raise oracledb.DatabaseError(f"Migration {migration.version} failed: {e}") from e
+            cursor.execute("INSERT INTO SchemaMigrations (version, description, appliedAt) VALUES (:version, :description, CURRENT_TIMESTAMP)",
+                           version=migration.version, description=migration.description)
+            db_conn.commit()
+            applied.append(migration.version)
+
+    if output and not applied:
+        print(f"Schema is up to date (version {SCHEMA_VERSION})")
+    return applied
+
+
+def add_months(month: dt.datetime, months: int) -> dt.datetime:
+    """First day of the month `months` after (or before, if negative) the month of a date."""
+    index = month.year * 12 + month.month - 1 + months
+    return dt.datetime(index // 12, index % 12 + 1, 1)
+
+
+def archive_views(db_conn: 'Connection', retain_months: int = 13, archive_dir='archive', now: dt.datetime = None,
+                  batch_size: int = 5000, output=True) -> List[dict]:
+    """Archive view events older than the retention period.
+
+    Each expired month is handled in turn:
+        1. its rows are streamed to a compressed JSON Lines file, article_views_YYYY-MM.jsonl.gz in `archive_dir`
+        2. they are folded into per article, per user counts in ArticleViewRollups, so reports still include them
+        3. they are deleted from ArticleViews (on Oracle this only touches that month's partition)
+    Steps 2 and 3 are committed together. If a run is interrupted between writing the file and committing, the
+    month is archived again on the next run into a new file part, and the earlier part should be discarded.
+
+    Args:
+        db_conn (Connection): The database connection.
+        retain_months (int, optional): Number of months to keep in ArticleViews, including the current one. Defaults to 13.
+        archive_dir (str | Path, optional): Where archive files are written. Defaults to 'archive'.
+        now (datetime, optional): The current time. Defaults to datetime.now().
+
+    Returns:
+        List[dict]: One entry per archived month with the month, number of rows and archive file.
+    """
+    cutoff = add_months(now or dt.datetime.now(), -(retain_months - 1))
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    archived = []
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT MIN(viewedAt) FROM ArticleViews WHERE viewedAt < :cutoff", cutoff=cutoff)
+        oldest = cursor.fetchone()[0]
+        if isinstance(oldest, str):
+            oldest = dt.datetime.fromisoformat(oldest)
+        month = add_months(oldest, 0) if oldest is not None else cutoff
+
+        while month < cutoff:
+            end = add_months(month, 1)
+            path = archive_dir / f"article_views_{month:%Y-%m}.jsonl.gz"
+            part = 1
+            while path.exists():
+                path = archive_dir / f"article_views_{month:%Y-%m}.{part}.jsonl.gz"
+                part += 1
+
+            count = 0
+            cursor.arraysize = batch_size
+            cursor.execute("""SELECT articleID, userID, viewedAt, viewCount FROM ArticleViews
+                              WHERE viewedAt >= :month_start and viewedAt < :month_end""", month_start=month, month_end=end)
+            tmp_path = path.with_suffix('.tmp')
+            with gzip.open(tmp_path, 'wt') as f:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    f.writelines(json.dumps({'articleID': articleID, 'userID': userID, 'viewedAt': str(viewedAt),
+                                             'viewCount': viewCount}) + '\n'
+                                 for articleID, userID, viewedAt, viewCount in rows)
+                    count += len(rows)
+
+            if count == 0:
+                tmp_path.unlink()
+            else:
+                os.replace(tmp_path, path)
+                cursor.execute("""INSERT INTO ArticleViewRollups (articleID, userID, viewMonth, viewCount)
+                                  SELECT articleID, userID, :month_start, SUM(viewCount) FROM ArticleViews
+                                  WHERE viewedAt >= :month_start and viewedAt < :month_end
+                                  GROUP BY articleID, userID""", month_start=month, month_end=end)
+                cursor.execute("DELETE FROM ArticleViews WHERE viewedAt >= :month_start and viewedAt < :month_end",
+                               month_start=month, month_end=end)
+                db_conn.commit()
+                archived.append({'month': f"{month:%Y-%m}", 'rows': count, 'file': str(path)})
                 if output:
-                    print('*' * 80)
-                    print('*' * 80)
-                    print(f'Error: {e}')
-                    print('Skipping to next statement...')
-                    print('*' * 80)
-                    print('*' * 80)
+                    print(f"Archived {count} view(s) from {month:%Y-%m} to {path}")
+            month = end
+
+    if output and not archived:
+        print(f"No views older than {cutoff:%Y-%m} to archive")
+    return archived
 
 
 def create_data(db_conn: 'Connection', output=True) -> None:
-    with db_conn.cursor() as cursor:
-        execute_script('create_data.txt', cursor, output=output)
-    db_conn.commit()
+    run_script(db_conn, 'create_data.txt', output=output)
+    migrate(db_conn, output=output)
 
 
 def drop_data(db_conn: 'Connection', output=True) -> None:
+    run_script(db_conn, 'drop_tables.txt', output=output, track=False)
+
+
+def hash_passwords(db_conn: 'Connection', output=True) -> int:
+    """Migrate an existing database to hashed passwords.
+
+    Replaces every plaintext value in Users.password with a salted hash. Rows that are already
+    hashed are left alone, so this is safe to run more than once.
+
+    Returns:
+        int: The number of passwords that were hashed.
+    """
     with db_conn.cursor() as cursor:
-        execute_script('drop_tables.txt', cursor, output=output)
+        cursor.execute(ALL_USER_PASSWORDS)
+        updates = [{'userID': userID, 'password': hash_password(password)}
+                   for userID, password in cursor.fetchall()
+                   if password is not None and not is_hashed(password)]
+        if updates:
+            cursor.executemany(UPDATE_PASSWORD, updates)
     db_conn.commit()
 
+    if output:
+        print(f'Hashed {len(updates)} password(s)')
+    return len(updates)
+
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Run create_data.txt or drop_tables.txt script.')
     parser.add_argument('--create', help='Run create_data.txt script.', action='store_true')
     parser.add_argument('--drop', help='Run drop_tables.txt script.', action='store_true')
+    parser.add_argument('--migrate', help='Apply schema migrations that have not been applied yet.', action='store_true')
+    parser.add_argument('--status', help='List schema migrations and whether they have been applied.', action='store_true')
+    parser.add_argument('--hash-passwords', help='Replace plaintext passwords with salted hashes.', action='store_true')
+    parser.add_argument('--archive-views', help='Archive and roll up view events older than --retain-months.', action='store_true')
+    parser.add_argument('--retain-months', type=int, default=13, help='Months of raw view events to keep. Defaults to 13.')
+    parser.add_argument('--archive-dir', default='archive', help='Directory for archived view events. Defaults to ./archive.')
+    parser.add_argument('--sqlite', metavar='PATH', help='Use a SQLite stand-in database file instead of Oracle.')
     args = parser.parse_args()
 
 
-    load_dotenv()  # load environment from .env file
-    oracledb.init_oracle_client()
-    with oracledb.connect(user=os.getenv('DB_USER'),
-                        password=os.getenv('DB_PASS'),
-                        port=os.getenv('DB_PORT'),
-                        host=os.getenv('DB_HOST'),
-                        service_name='XE') as db_conn:
+    if args.sqlite:
+        import sqlite_db
+        connection = sqlite_db.connect(args.sqlite)
+    else:
+        from db_pool import init_oracle_mode
+
+        load_dotenv()  # load environment from .env file
+        init_oracle_mode()
+        connection = oracledb.connect(user=os.getenv('DB_USER'),
+                                      password=os.getenv('DB_PASS'),
+                                      port=os.getenv('DB_PORT'),
+                                      host=os.getenv('DB_HOST'),
+                                      service_name='XE')
+    with connection as db_conn:
         
         if args.create:
             create_data(db_conn)
         elif args.drop:
             drop_data(db_conn)
+        elif args.migrate:
+            migrate(db_conn)
+        elif args.status:
+            done = set(applied_migrations(db_conn))
+            for migration in MIGRATIONS:
+                print(f"{'applied' if migration.version in done else 'pending':8} {migration.version:3} {migration.description}")
+        elif args.hash_passwords:
+            hash_passwords(db_conn)
+        elif args.archive_views:
+            archive_views(db_conn, args.retain_months, args.archive_dir)
         else:
-            raise ValueError("Invalid arguments. Must specify --create or --drop")
+            raise ValueError("Invalid arguments. Must specify --create, --drop, --migrate, --status, --hash-passwords or --archive-views")
@@ -0,0 +1,234 @@
+"""
+Change events for data derived from the database (caches, rollups, trending scores).
+
+Tables stage an event for every write and publish it once the write is committed, so subscribers never see changes
+that were rolled back. Subscribers in the same process are called directly. Events can also be appended to a local
+JSON Lines log, which other processes read from a byte offset and tail for new events.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple, Type, Union
+
+
+class Event:
+    """Base class for change events. Subclasses list their data in `fields`."""
+
+    fields: Tuple[str, ...] = ()
+
+    def __init__(self, *args, at: float = None, offset: int = None, **kwargs):
+        values = dict(zip(self.fields, args), **kwargs)
+        for field in self.fields:
+            setattr(self, field, values[field])
+        self.at = time.time() if at is None else at
+        self.offset = offset  # position in the event log, once read from it
+
+    @property
+    def kind(self) -> str:
+        return type(self).__name__
+
+    def to_json(self) -> dict:
+        return {'kind': self.kind, 'at': self.at, **{field: getattr(self, field) for field in self.fields}}
+
+    @staticmethod
+    def from_json(data: dict, offset: int = None) -> 'Event':
+        data = dict(data)
+        cls = EVENT_TYPES[data.pop('kind')]
+        return cls(offset=offset, **data)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_json() == other.to_json()
+
+    def __repr__(self):
+        values = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.fields)
+        return f"{self.kind}({values})"
+
+
+class ArticleViewed(Event):
+    fields = ('articleID', 'userID')
+
+
+class CommentAdded(Event):
+    fields = ('commentID', 'articleID', 'userID')
+
+
+class UserCreated(Event):
+    fields = ('userID', 'username')
+
+
+class UserDeleted(Event):
+    fields = ('userID',)
+
+
+class PasswordChanged(Event):
+    fields = ('userID',)
+
+
+class ArticleTagsChanged(Event):
+    fields = ('articleID',)
+
+
+class ArticlePublished(Event):
+    fields = ('articleID',)
+
+
+class ArticleUpdated(Event):
+    fields = ('articleID',)
+
+
+class ArticleDeleted(Event):
+    fields = ('articleID',)
+
+
+EVENT_TYPES: Dict[str, Type[Event]] = {cls.__name__: cls for cls in Event.__subclasses__()}
+
+
+class EventBus:
+    """Delivers committed events to subscribers and, optionally, to an append-only log file."""
+
+    def __init__(self, log_path: Union[str, Path, None] = None):
+        """Initialize a new EventBus.
+
+        Args:
+            log_path (str | Path, optional): JSON Lines file that every event is appended to. Not written if not given.
+        """
+        self.log_path = Path(log_path) if log_path else None
+        self._subscribers: Dict[Type[Event], List[Callable[[Event], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: Type[Event], callback: Callable[[Event], None]):
+        """Call `callback` with every published event of `event_type` (or a subclass of it).
+
+        Subscribing the same callback again has no effect, so objects shared by several NewsDBs can subscribe from each.
+        """
+        with self._lock:
+            if callback not in self._subscribers[event_type]:
+                self._subscribers[event_type].append(callback)
+
+    def publish(self, events: List[Event]):
+        """Publish committed events: append them to the log in one write, then call the subscribers.
+
+        A failing subscriber is reported on stderr and does not stop the others, since the change is already committed.
+        """
+        if not events:
+            return
+        if self.log_path is not None:
+            data = ''.join(json.dumps(event.to_json()) + '\n' for event in events).encode()
+            with self._lock:
+                # One O_APPEND write per group keeps lines from concurrent writers whole
+                fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+
+        for event in events:
+            for event_type, callbacks in list(self._subscribers.items()):
+                if isinstance(event, event_type):
+                    for callback in callbacks:
+                        try:
+                            callback(event)
+                        except Exception:
+                            print(f"Event subscriber failed on {event!r}", file=sys.stderr)
+                            traceback.print_exc()
+
+
+class PendingEvents:
+    """Events staged on one connection, published when it commits and dropped when it rolls back.
+
+    Callers can also register undo callbacks, which are run if the connection rolls back, to drop in-memory state
+    that assumed the changes would be committed.
+    """
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._events: List[Event] = []
+        self._undo: List[Callable[[], None]] = []
+
+    def add(self, event: Event):
+        self._events.append(event)
+
+    def on_rollback(self, undo: Callable[[], None]):
+        self._undo.append(undo)
+
+    def committed(self):
+        events, self._events = self._events, []
+        self._undo = []
+        self.bus.publish(events)
+
+    def rolled_back(self):
+        self._events = []
+        undo, self._undo = self._undo, []
+        for callback in undo:
+            callback()
+
+
+class EventLog:
+    """Reads an event log written by EventBus. Offsets are byte positions, so a consumer can resume where it stopped."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def read(self, offset: int = 0, limit: int = None) -> Tuple[List[Event], int]:
+        """Read complete events from an offset.
+
+        Args:
+            offset (int, optional): Byte offset to start from. Defaults to the start of the log.
+            limit (int, optional): Maximum number of events. Defaults to all of them.
+
+        Returns:
+            tuple: The events and the offset to continue from.
+        """
+        events = []
+        if not self.path.exists():
+            return events, offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while limit is None or len(events) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # end of the log, or a line that is still being written
+                events.append(Event.from_json(json.loads(line), offset=offset))
+                offset += len(line)
+        return events, offset
+
+    def tail(self, offset: int = 0, poll_interval: float = 1.0, stop: threading.Event = None) -> Iterator[Event]:
+        """Yield events from an offset, waiting for new ones as they are appended.
+
+        Args:
+            offset (int, optional): Byte offset to start from. Defaults to the start of the log.
+            poll_interval (float, optional): Seconds between checks for new events. Defaults to 1.
+            stop (threading.Event, optional): Stops tailing once set.
+        """
+        while stop is None or not stop.is_set():
+            events, offset = self.read(offset)
+            yield from events
+            if not events:
+                if stop is not None:
+                    stop.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print events from an event log as JSON Lines.')
+    parser.add_argument('log', help='The event log file.')
+    parser.add_argument('--offset', type=int, default=0, help='Byte offset to start from.')
+    parser.add_argument('--follow', action='store_true', help='Keep waiting for new events.')
+    args = parser.parse_args()
+
+    log = EventLog(args.log)
+    try:
+        events = log.tail(args.offset) if args.follow else log.read(args.offset)[0]
+        for event in events:
+            print(json.dumps({'offset': event.offset, **event.to_json()}), flush=True)
+    except KeyboardInterrupt:
+        pass
@@ -1,5 +1,6 @@
 """
-Generate reports of the most viewed articles, most popular tags, most popular categories, and most active users for a given year.
+Generate reports of the most viewed articles, most popular tags, most popular categories, most active users and user
+retention for a given year.
 
 @author: Ethan Posner
 @date: 2023-04-10
@@ -7,17 +8,49 @@ Generate reports of the most viewed articles, most popular tags, most popular ca
 
 import re
 import datetime as dt
+from array import array
 
 from oracledb import DatabaseError
 from rich.table import Table
 from rich.console import Console
+from rich.segment import Segments
 
 from db import NewsDB, UserTable, User, ArticleTable, Article
-from queries import ARTICLE_VIEW_REPORT, CATEGORY_REPORT, CATEGORY_VIEW_REPORT, TAG_REPORT, TAG_VIEW_REPORT, USER_ACTIVITY_REPORT
+from hyperloglog import unique_viewers
+from queries import (ARTICLE_VIEW_REPORT, CATEGORY_REPORT, CATEGORY_VIEW_REPORT, TAG_REPORT, TAG_VIEW_REPORT,
+                     USER_ACTIVITY_REPORT, USER_MONTH_ACTIVITY)
+from report_export import export_query, export_rows
 
 
 class ReportGenerator:
 
+    # report name -> (query, whether the report takes a year)
+    reports = {
+        'articles': (ARTICLE_VIEW_REPORT, True),
+        'tags': (TAG_VIEW_REPORT, True),
+        'categories': (CATEGORY_VIEW_REPORT, True),
+        'users': (USER_ACTIVITY_REPORT, True),
+        'cohorts': (USER_MONTH_ACTIVITY, True),
+        'tag_summary': (TAG_REPORT, False),
+        'category_summary': (CATEGORY_REPORT, False),
+    }
+
+    # reports only admins may run
+    admin_reports = {'articles', 'tags', 'categories', 'users', 'cohorts'}
+
+    # reports whose query returns raw rows that a method turns into the report rows
+    computed_reports = {'cohorts': 'cohort_rows'}
+
+    # months after registering shown by the cohort report
+    retention_months = 12
+
+    # reports that only change with tags and article tags, cached in the NewsDB's SummaryCache
+    summary_reports = {'tag_summary', 'category_summary'}
+
+    # admin reports given a Unique Viewers column from the view sketches: report name -> (key in
+    # hyperloglog.unique_viewers, how to read that key from the report's first column)
+    unique_viewer_reports = {'articles': ('articles', int), 'tags': ('tags', int), 'categories': ('categories', str)}
+
     def __init__(self, db: NewsDB):
         self.db: NewsDB = db
         self.console = Console()
@@ -30,7 +63,7 @@ class ReportGenerator:
             print("Invalid year")
             return False
         
-    def table_view(self, rows):
+    def build_table(self, rows) -> Table:
         # Create a new table
         table: Table = Table(show_header=True, header_style="bold magenta")
 
@@ -43,72 +76,188 @@ class ReportGenerator:
         for row in data:
             table.add_row(*row)
 
-        self.console.print(table)
+        return table
+
+    def table_view(self, rows):
+        self.console.print(self.build_table(rows))
+
+    def summary_view(self, name: str, title: str):
+        """Print a summary report, then show it again in the pager with a title.
+
+        The table is rendered once per data version and console width, and the rendered lines are reused until the
+        summary's data changes.
+        """
+        key = ('rendered', name, self.console.width, self.console.color_system)
+        rendered = self.db.summaries.get(
+            key, lambda: Segments(list(self.console.render(self.build_table(self.report_rows(name))))))
+
+        # print with pager and keep contents on screen after printing
+        self.console.print(rendered)
+        with self.console.pager():
+            self.console.print(title)
+            self.console.print(rendered)
         
+    def fetch_rows(self, query: str, fallback=None, **binds) -> list:
+        """Run a report query and return its rows. The first row holds the column headers.
+
+        Args:
+            query (str): The report query.
+            fallback (Callable, optional): Returns cached rows to serve while the database is unavailable.
+
+        Raises:
+            DatabaseError: If the query returned no rows.
+        """
+        reader = self.db.router.reader()
+
+        def read():
+            with reader.cursor() as cursor:
+                cursor.execute(query, **binds)
+                rows = cursor.fetchall()
+                if len(rows) == 0:
+                    raise DatabaseError("No rows were returned")
+                return rows
+        return self.db.resilience.run(reader, read, 'report', fallback=fallback)
+
+    def report_query(self, name: str, year=None):
+        """Look up a report by name.
+
+        Args:
+            name (str): One of the keys of `reports`.
+            year (str, optional): The year to report on. Required for admin reports.
+
+        Returns:
+            tuple: The report query and its bind variables.
+        """
+        if name not in self.reports:
+            raise ValueError(f"Unknown report '{name}'. Expected one of {', '.join(self.reports)}")
+        query, needs_year = self.reports[name]
+        if not needs_year:
+            return query, {}
+        if year is None:
+            raise ValueError(f"Report '{name}' needs a year")
+        year = str(year).strip()
+        if not year.isdigit():
+            raise ValueError(f"Invalid year '{year}'")
+        return query, {'year': year,
+                       'year_start': dt.datetime(int(year), 1, 1),
+                       'year_end': dt.datetime(int(year) + 1, 1, 1)}
+
+    def report_rows(self, name: str, year=None) -> list:
+        """Get the rows of a report by name, without rendering them.
+
+        Returns:
+            list: The report rows. The first row holds the column headers.
+        """
+        query, binds = self.report_query(name, year)
+        if name in self.summary_reports:
+            key = ('rows', name)
+            return self.db.summaries.get(key, lambda: self.fetch_rows(
+                query, fallback=lambda: self.db.summaries.stale(key), **binds))
+        rows = self.fetch_rows(query, **binds)
+        if name in self.computed_reports:
+            return getattr(self, self.computed_reports[name])(rows)
+        if name in self.unique_viewer_reports:
+            rows = self.add_unique_viewers(name, rows, year)
+        return rows
+
+    def add_unique_viewers(self, name: str, rows: list, year: str) -> list:
+        """Append estimated unique viewers over the year to each row of a report, including views not yet stored."""
+        kind, read_key = self.unique_viewer_reports[name]
+        reader = self.db.router.reader()
+        counts = self.db.resilience.run(reader, lambda: unique_viewers(reader, year, self.db.sketches.pending()),
+                                        'report')[kind]
+        header, data = rows[0], rows[1:]
+        return [tuple(header) + ('Unique Viewers',)] + [
+            tuple(row) + (str(counts.get(read_key(row[0]), 0)),) for row in data]
+
+    def cohort_rows(self, activity: list, today: dt.date = None) -> list:
+        """Group users by the month they registered and find the share of each group active in each month since.
+
+        Args:
+            activity (list): (userID, registered month, active month, views, comments) rows from USER_MONTH_ACTIVITY,
+                with months as 'YYYY-MM'.
+            today (date, optional): Months after this one are left blank. Defaults to today.
+
+        Returns:
+            list: One row per cohort, after a header row: the cohort, its size, its views and comments, and the
+                percentage of its users active 0 to `retention_months` months after registering.
+        """
+        today = today or dt.date.today()
+        month_number = lambda month: int(month[:4]) * 12 + int(month[5:7]) - 1
+        current = today.year * 12 + today.month - 1
+        months = self.retention_months + 1
+
+        # cohort -> [users, views, comments] and active users per month since registering
+        totals = {}
+        active = {}
+        users, active_users = set(), set()
+        for userID, cohort, month, views, comments in activity:
+            if cohort not in totals:
+                totals[cohort] = array('q', [0, 0, 0])
+                active[cohort] = array('q', [0] * months)
+            if userID not in users:
+                users.add(userID)
+                totals[cohort][0] += 1
+            if month is None:
+                continue
+            totals[cohort][1] += int(views)
+            totals[cohort][2] += int(comments)
+            offset = month_number(month) - month_number(cohort)
+            if 0 <= offset < months and (userID, offset) not in active_users:
+                active_users.add((userID, offset))
+                active[cohort][offset] += 1
+
+        rows = [('Cohort', 'Users', 'Views', 'Comments') + tuple(f'M{offset}' for offset in range(months))]
+        for cohort in sorted(totals):
+            size, views, comments = totals[cohort]
+            elapsed = current - month_number(cohort)
+            rows.append((cohort, str(size), str(views), str(comments)) + tuple(
+                f'{round(100 * count / size)}%' if offset <= elapsed else ''
+                for offset, count in enumerate(active[cohort])))
+        return rows
+
+    def export(self, name: str, fmt: str, path, year=None) -> int:
+        """Stream a report into a file instead of rendering it. Reports with columns computed in Python, such as
+        Unique Viewers, are written from report_rows so the file has the same columns as the rendered report.
+
+        Args:
+            name (str): One of the keys of `reports`.
+            fmt (str): csv, jsonl, parquet or arrow.
+            path (str | Path): The file to write.
+            year (str, optional): The year to report on. Required for admin reports.
+
+        Returns:
+            int: The number of rows written.
+        """
+        if name in self.computed_reports or name in self.unique_viewer_reports:
+            return export_rows(self.report_rows(name, year), fmt, path)
+        query, binds = self.report_query(name, year)
+        reader = self.db.router.reader()
+        # Not retried, since the file may be partly written
+        return self.db.resilience.run(reader, lambda: export_query(reader, query, fmt, path, **binds), 'report',
+                                      idempotent=False)
+
     ######### ADMIN REPORTS #########
 
     def most_viewed_articles(self, year: str):
-
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(ARTICLE_VIEW_REPORT, year=str(year).strip())
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
-            # tabulate using rich
-            self.table_view(rows)
+        self.table_view(self.report_rows('articles', year))
         
     def most_popular_tags(self, year):
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(TAG_VIEW_REPORT, year=str(year).strip())
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
-            # tabulate using rich
-            self.table_view(rows)
+        self.table_view(self.report_rows('tags', year))
     
     def most_popular_categories(self, year):
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(CATEGORY_VIEW_REPORT, year=str(year).strip())
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
-            # tabulate using rich
-            self.table_view(rows)
+        self.table_view(self.report_rows('categories', year))
     
     def most_active_users(self, year):
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(USER_ACTIVITY_REPORT, year=str(year).strip())
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
-            # tabulate using rich
-            self.table_view(rows)
+        self.table_view(self.report_rows('users', year))
+
+    def user_retention(self, year):
+        self.table_view(self.report_rows('cohorts', year))
             
     ######### USER REPORTS #########
     
     def tag_details(self):
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(TAG_REPORT)
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
+        self.summary_view('tag_summary', "Summary of Article Tags:")
 
-        # print with pager and keep contents on screen after printing
-        self.table_view(rows)
-        with self.console.pager():
-            self.console.print(f"Summary of Article Tags:")
-            # tabulate using rich
-            self.table_view(rows)
-            
     def category_details(self):
-        with self.db.conn.cursor() as cursor:
-            cursor.execute(CATEGORY_REPORT)
-            rows = cursor.fetchall()
-            if len(rows) == 0:
-                raise DatabaseError("No rows were returned")
-
-        self.table_view(rows)
-        with self.console.pager():
-            self.console.print(f"Summary of Article Categories:")
-            # tabulate using rich
-            self.table_view(rows)
+        self.summary_view('category_summary', "Summary of Article Categories:")
@@ -0,0 +1,440 @@
+"""
+Approximate unique viewer counts from HyperLogLog sketches.
+
+Counting unique viewers with COUNT(DISTINCT userID) means reading every view in the range. Instead, a small sketch of
+the users that viewed each article is kept per day in ArticleViewSketches. Sketches merge losslessly (the merge of
+two sketches is the sketch of the union of their users), so the unique viewers of an article, tag or category over
+any range of days come from merging that range's sketches, without touching ArticleViews. The day sketches are also
+merged into one per month in ArticleViewMonthSketches as they are stored, so a yearly count merges at most 12
+sketches per article.
+
+Error: with precision p (m = 2**p registers), counts have a relative standard error of about 1.04 / sqrt(m), i.e.
+1.6% at the default p = 12, and are within 3 standard errors (4.9%) almost always. Counts below 2.5 * m use linear
+counting, which is close to exact for the small counts typical of one article on one day. Merging never adds error
+beyond that of a sketch built from the union directly.
+
+Views are added to sketches in memory as they are committed, and the changed sketches are merged into the table
+every `flush_every` views or `flush_interval` seconds. Existing views are loaded with:
+    python3 src/hyperloglog.py --backfill
+"""
+
+import argparse
+import datetime as dt
+import functools
+import hashlib
+import math
+import struct
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from oracledb.exceptions import DatabaseError, IntegrityError
+
+from events import ArticleDeleted, ArticleViewed, EventBus
+from queries import (ALL_DAY_SKETCHES, ALL_VIEW_DAYS, ARTICLE_TAG_CATEGORIES, INSERT_MONTH_SKETCH, INSERT_SKETCH,
+                     SELECT_MONTH_SKETCH_FOR_UPDATE, SELECT_SKETCH_FOR_UPDATE, UPDATE_MONTH_SKETCH, UPDATE_SKETCH,
+                     YEAR_VIEW_SKETCHES)
+
+PRECISION = 12
+
+_DENSE, _SPARSE = 0, 1
+
+
+@functools.lru_cache(maxsize=None)
+def _high_bits(size: int) -> int:
+    """An integer with the top bit of each of `size` bytes set."""
+    return int.from_bytes(b'\x80' * size, 'big')
+
+
+class HyperLogLog:
+    """A mergeable sketch of a set, from which the number of distinct items can be estimated."""
+
+    def __init__(self, precision: int = PRECISION):
+        """Initialize an empty sketch.
+
+        Args:
+            precision (int, optional): Uses 2**precision one-byte registers, between 4 and 16. Defaults to PRECISION.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"precision must be between 4 and 16, not {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item) -> 'HyperLogLog':
+        x = int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+        return self
+
+    def update(self, items: Iterable) -> 'HyperLogLog':
+        for item in items:
+            self.add(item)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Add every item of another sketch of the same precision to this one.
+
+        Takes the register-wise maximum on the registers as two big integers, one byte per register, rather than one
+        register at a time. Ranks are at most 61, so the top bit of every byte is free: setting it in each byte of
+        this sketch and subtracting the other leaves it set exactly where this register is the larger, without
+        borrowing across bytes. That bit, spread over its byte, selects which register to keep.
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"Can't merge sketches of precision {other.precision} and {self.precision}")
+        size = len(self.registers)
+        high = _high_bits(size)
+        mine, theirs = int.from_bytes(self.registers, 'big'), int.from_bytes(other.registers, 'big')
+        keep = ((((mine | high) - theirs) & high) >> 7) * 0xFF
+        self.registers = bytearray(((mine & keep) | (theirs & ~keep)).to_bytes(size, 'big'))
+        return self
+
+    def copy(self) -> 'HyperLogLog':
+        sketch = HyperLogLog(self.precision)
+        sketch.registers = bytearray(self.registers)
+        return sketch
+
+    @classmethod
+    def union(cls, sketches: Iterable['HyperLogLog'], precision: int = PRECISION) -> 'HyperLogLog':
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def count(self) -> int:
+        """Estimate the number of distinct items added."""
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __eq__(self, other):
+        return isinstance(other, HyperLogLog) and self.registers == other.registers
+
+    def to_bytes(self) -> bytes:
+        """Serialize the sketch. Sketches with few set registers are stored as (index, value) pairs."""
+        used = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        if len(used) * 3 < len(self.registers):
+            return bytes([_SPARSE, self.precision]) + b''.join(struct.pack('>HB', *pair) for pair in used)
+        return bytes([_DENSE, self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        encoding, precision = data[0], data[1]
+        sketch = cls(precision)
+        if encoding == _DENSE:
+            sketch.registers = bytearray(data[2:])
+        else:
+            for index, rank in struct.iter_unpack('>HB', data[2:]):
+                sketch.registers[index] = rank
+        return sketch
+
+
+def _read(value) -> bytes:
+    """BLOB columns come back from Oracle as LOB objects."""
+    return bytes(value.read() if hasattr(value, 'read') else value)
+
+
+def by_month(sketches: Dict[Tuple[int, dt.date], HyperLogLog]) -> Dict[Tuple[int, dt.date], HyperLogLog]:
+    """Merge (article, day) sketches into (article, first day of the month) ones."""
+    months: Dict[Tuple[int, dt.date], HyperLogLog] = {}
+    for (articleID, day), sketch in sketches.items():
+        key = (articleID, day.replace(day=1))
+        if key in months:
+            months[key].merge(sketch)
+        else:
+            months[key] = sketch.copy()
+    return months
+
+
+def _merge_stored(cursor, queries: Tuple[str, str, str], binds: dict, sketch: HyperLogLog):
+    """Merge a sketch into the stored row for `binds`, inserting it if there is none."""
+    select, insert, update = queries
+    cursor.execute(select, **binds)
+    row = cursor.fetchone()
+    if row is None:
+        try:
+            cursor.execute(insert, sketch=sketch.to_bytes(), **binds)
+            return
+        except IntegrityError:
+            # Inserted by someone else since the select
+            cursor.execute(select, **binds)
+            row = cursor.fetchone()
+    merged = HyperLogLog.from_bytes(_read(row[0])).merge(sketch)
+    cursor.execute(update, sketch=merged.to_bytes(), **binds)
+
+
+_DAY_QUERIES = (SELECT_SKETCH_FOR_UPDATE, INSERT_SKETCH, UPDATE_SKETCH)
+_MONTH_QUERIES = (SELECT_MONTH_SKETCH_FOR_UPDATE, INSERT_MONTH_SKETCH, UPDATE_MONTH_SKETCH)
+
+
+def store_sketches(conn, sketches: Dict[Tuple[int, dt.date], HyperLogLog], months: bool = True):
+    """Merge sketches into the stored ones for the same (article, day), and into those of their month, in one
+    transaction.
+
+    Rows are locked while they are merged, so concurrent writers don't lose each other's viewers. Since merging is
+    idempotent, storing the same views twice does no harm.
+
+    Args:
+        conn: The database connection.
+        sketches (dict): Sketches by (articleID, day).
+        months (bool, optional): Whether to update the month sketches too. Only False before they exist (schema
+            migration 9). Defaults to True.
+    """
+    with conn.cursor() as cursor:
+        for (articleID, day), sketch in sorted(sketches.items()):
+            binds = {'articleID': articleID, 'viewDay': dt.datetime.combine(day, dt.time())}
+            _merge_stored(cursor, _DAY_QUERIES, binds, sketch)
+        if months:
+            for (articleID, month), sketch in sorted(by_month(sketches).items()):
+                binds = {'articleID': articleID, 'viewMonth': dt.datetime.combine(month, dt.time())}
+                _merge_stored(cursor, _MONTH_QUERIES, binds, sketch)
+    conn.commit()
+
+
+def rollup_months(conn) -> int:
+    """Build the month sketches from the stored day sketches (schema migration 12). Safe to run again.
+
+    Returns:
+        int: The number of (article, month) sketches stored.
+    """
+    days: Dict[Tuple[int, dt.date], HyperLogLog] = {}
+    with conn.cursor() as cursor:
+        cursor.execute(ALL_DAY_SKETCHES)
+        for articleID, viewDay, data in cursor:
+            if isinstance(viewDay, str):
+                viewDay = dt.datetime.fromisoformat(viewDay)
+            days[(int(articleID), viewDay.date())] = HyperLogLog.from_bytes(_read(data))
+    months = by_month(days)
+    with conn.cursor() as cursor:
+        for (articleID, month), sketch in sorted(months.items()):
+            binds = {'articleID': articleID, 'viewMonth': dt.datetime.combine(month, dt.time())}
+            _merge_stored(cursor, _MONTH_QUERIES, binds, sketch)
+    conn.commit()
+    return len(months)
+
+
+class ViewSketches:
+    """Adds committed views to per article, per day sketches in memory and flushes them to the database.
+    Shared by every NewsDB in a process."""
+
+    def __init__(self, precision: int = PRECISION, flush_every: int = 1000, flush_interval: float = 60,
+                 clock: Callable[[], float] = time.time):
+        """Initialize a new ViewSketches.
+
+        Args:
+            precision (int, optional): Precision of new sketches. Defaults to PRECISION.
+            flush_every (int, optional): Flush after this many views. Defaults to 1000.
+            flush_interval (float, optional): Flush views older than this many seconds. Defaults to 60.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.time.
+        """
+        self.precision = precision
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._dirty: Dict[Tuple[int, dt.date], HyperLogLog] = {}
+        # Sketches taken out of _dirty by flushes still storing them
+        self._flushing: List[Dict[Tuple[int, dt.date], HyperLogLog]] = []
+        self._views = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of views not flushed yet."""
+        return self._views
+
+    def subscribe(self, bus: EventBus):
+        """Add views to the sketches as they are committed, and drop the views of deleted articles."""
+        bus.subscribe(ArticleViewed, self._article_viewed)
+        bus.subscribe(ArticleDeleted, self._article_deleted)
+
+    def _article_viewed(self, event: ArticleViewed):
+        self.add(event.articleID, event.userID, event.at)
+
+    def _article_deleted(self, event: ArticleDeleted):
+        self.forget(event.articleID)
+
+    def forget(self, articleID: int):
+        """Drop the unflushed views of an article, e.g. after it was deleted."""
+        with self._lock:
+            for dirty in [self._dirty] + self._flushing:
+                for key in [key for key in dirty if key[0] == int(articleID)]:
+                    del dirty[key]
+
+    def add(self, articleID: int, userID: int, at: float = None):
+        at = self.clock() if at is None else at
+        key = (int(articleID), dt.date.fromtimestamp(at))
+        with self._lock:
+            if key not in self._dirty:
+                self._dirty[key] = HyperLogLog(self.precision)
+            self._dirty[key].add(int(userID))
+            self._views += 1
+            if self._oldest is None:
+                self._oldest = self.clock()
+
+    def pending(self) -> Dict[Tuple[int, dt.date], HyperLogLog]:
+        """Copies of the sketches of views that have not been flushed yet, including those being flushed right now,
+        by (articleID, day).
+
+        Take this before reading the stored sketches: views whose flush commits in between are then counted twice,
+        which merging makes harmless, rather than not at all.
+        """
+        with self._lock:
+            pending: Dict[Tuple[int, dt.date], HyperLogLog] = {}
+            for dirty in self._flushing + [self._dirty]:
+                for key, sketch in dirty.items():
+                    if key in pending:
+                        pending[key].merge(sketch)
+                    else:
+                        pending[key] = sketch.copy()
+            return pending
+
+    def due(self) -> bool:
+        return self._views >= self.flush_every or (
+            self._oldest is not None and self.clock() - self._oldest >= self.flush_interval)
+
+    def flush(self, conn) -> int:
+        """Merge the views added so far into the stored sketches. Must be called with no transaction in progress.
+
+        Raises:
+            DatabaseError: If storing failed. The views are kept for the next flush.
+
+        Returns:
+            int: The number of (article, day) sketches stored.
+        """
+        with self._lock:
+            dirty, views, oldest = self._dirty, self._views, self._oldest
+            if not dirty:
+                return 0
+            self._dirty, self._views, self._oldest = {}, 0, None
+            self._flushing.append(dirty)
+        try:
+            store_sketches(conn, dirty)
+        except DatabaseError:
+            conn.rollback()
+            with self._lock:
+                self._flushing.remove(dirty)
+                for key, sketch in dirty.items():
+                    self._dirty[key] = sketch.merge(self._dirty[key]) if key in self._dirty else sketch
+                self._views += views
+                self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+            raise
+        with self._lock:
+            self._flushing.remove(dirty)
+        return len(dirty)
+
+    def flush_if_due(self, conn):
+        """Flush if enough views have built up. Called after a commit; a failed flush is reported and retried later,
+        since the views themselves are already committed."""
+        if self.due():
+            try:
+                self.flush(conn)
+            except DatabaseError:
+                print("Storing view sketches failed", file=sys.stderr)
+                traceback.print_exc()
+
+
+def backfill(conn, since: dt.datetime = None, precision: int = PRECISION, months: bool = True) -> int:
+    """Build sketches from the views already in the database, including archived ones (counted on the first day of
+    their month). Safe to run again, since merging is idempotent.
+
+    Args:
+        conn: The database connection.
+        since (datetime, optional): Only views from this time on. Defaults to all views.
+        precision (int, optional): Precision of the sketches. Defaults to PRECISION.
+        months (bool, optional): Passed on to store_sketches. Defaults to True.
+
+    Returns:
+        int: The number of (article, day) sketches stored.
+    """
+    sketches: Dict[Tuple[int, dt.date], HyperLogLog] = {}
+    with conn.cursor() as cursor:
+        cursor.arraysize = 5000
+        cursor.execute(ALL_VIEW_DAYS, since=since or dt.datetime(1900, 1, 1))
+        for articleID, userID, viewedAt in cursor:
+            if isinstance(viewedAt, str):
+                viewedAt = dt.datetime.fromisoformat(viewedAt)
+            key = (int(articleID), viewedAt.date())
+            if key not in sketches:
+                sketches[key] = HyperLogLog(precision)
+            sketches[key].add(int(userID))
+    store_sketches(conn, sketches, months)
+    return len(sketches)
+
+
+def unique_viewers(conn, year: str, pending: Dict[Tuple[int, dt.date], HyperLogLog] = None) -> Dict[str, Dict]:
+    """Estimate unique viewers over a year of the articles published that year, and of their tags and categories.
+
+    Args:
+        conn: The database connection.
+        year (str): The year.
+        pending (dict, optional): Sketches not stored yet, from ViewSketches.pending(), to count as well.
+
+    Returns:
+        dict: {'articles': {articleID: count}, 'tags': {tagID: count}, 'categories': {catName: count}}. Articles,
+            tags and categories without views are left out.
+    """
+    year_start, year_end = dt.datetime(int(year), 1, 1), dt.datetime(int(year) + 1, 1, 1)
+    published = set()
+    articles: Dict[int, HyperLogLog] = {}
+    with conn.cursor() as cursor:
+        cursor.execute(YEAR_VIEW_SKETCHES, year=year, year_start=year_start, year_end=year_end)
+        for articleID, data in cursor:
+            published.add(int(articleID))
+            if data is not None:
+                sketch = HyperLogLog.from_bytes(_read(data))
+                if int(articleID) in articles:
+                    articles[int(articleID)].merge(sketch)
+                else:
+                    articles[int(articleID)] = sketch
+        cursor.execute(ARTICLE_TAG_CATEGORIES)
+        tag_links = cursor.fetchall()
+
+    for (articleID, day), sketch in (pending or {}).items():
+        if articleID in published and year_start.date() <= day < year_end.date():
+            articles.setdefault(articleID, HyperLogLog(sketch.precision)).merge(sketch)
+
+    tags: Dict[int, HyperLogLog] = {}
+    categories: Dict[str, HyperLogLog] = {}
+    for articleID, tagID, catName in tag_links:
+        sketch = articles.get(int(articleID))
+        if sketch is not None:
+            tags.setdefault(int(tagID), HyperLogLog(sketch.precision)).merge(sketch)
+            categories.setdefault(catName, HyperLogLog(sketch.precision)).merge(sketch)
+
+    return {'articles': {key: sketch.count() for key, sketch in articles.items()},
+            'tags': {key: sketch.count() for key, sketch in tags.items()},
+            'categories': {key: sketch.count() for key, sketch in categories.items()}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain unique viewer sketches.')
+    parser.add_argument('--backfill', action='store_true', help='Build sketches from the views in the database.')
+    parser.add_argument('--since', type=dt.datetime.fromisoformat, help='Only backfill views from this date.')
+    parser.add_argument('--sqlite', metavar='PATH', help='Use a SQLite database file instead of Oracle.')
+    args = parser.parse_args()
+
+    if args.sqlite:
+        import sqlite_db
+        db_conn = sqlite_db.connect(args.sqlite)
+    else:
+        from dotenv import load_dotenv
+
+        from db_pool import init_oracle_mode, oracle_connector
+
+        load_dotenv()  # load environment from .env file
+        init_oracle_mode()
+        db_conn = oracle_connector()()
+
+    with db_conn:
+        if args.backfill:
+            print(f"Stored {backfill(db_conn, args.since)} sketch(es)")
+        else:
+            parser.error("Must specify --backfill")
@@ -0,0 +1,192 @@
+"""
+Load test for the HTTP API. Runs a mix of requests from concurrent workers and reports throughput and latency.
+
+By default a local server is started on a fresh SQLite stand-in database, so no Oracle instance is needed:
+    python3 src/load_test.py --workers 16 --duration 10
+
+Or point it at a running server:
+    python3 src/load_test.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# (weight, method, path, body). {article} is replaced with a random article ID.
+REQUEST_MIX = [
+    (40, 'GET', '/articles/{article}', None),
+    (20, 'GET', '/articles', None),
+    (15, 'GET', '/articles/{article}/comments', None),
+    (15, 'POST', '/articles/{article}/views', {}),
+    (5, 'POST', '/articles/{article}/comments', {'content': 'Load test comment'}),
+    (5, 'GET', '/reports/tag_summary', None),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, url, username, password, article_ids, deadline, seed):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.username = username
+        self.password = password
+        self.article_ids = article_ids
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, conn, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=30)
+        status, body = self.request(conn, 'POST', '/login', {'username': self.username, 'password': self.password})
+        if status != 200:
+            raise RuntimeError(f"Login failed: {status} {body!r}")
+        token = json.loads(body)['token']
+
+        weights = [weight for weight, *_ in REQUEST_MIX]
+        while time.perf_counter() < self.deadline:
+            _, method, path, body = self.random.choices(REQUEST_MIX, weights)[0]
+            name = f"{method} {path}"
+            path = path.format(article=self.random.choice(self.article_ids))
+
+            start = time.perf_counter()
+            try:
+                status, _ = self.request(conn, method, path, body, token)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=30)
+                status = None
+            self.latencies[name].append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                self.errors[name] += 1
+        conn.close()
+
+
+def run_load_test(url, workers=8, duration=10.0, username='bob', password='123', article_ids=(0, 1, 2)) -> dict:
+    """Run the request mix against a server.
+
+    Returns:
+        dict: Per endpoint request counts, errors and latency percentiles in milliseconds, plus totals.
+    """
+    deadline = time.perf_counter() + duration
+    threads = [Worker(url, username, password, list(article_ids), deadline, seed) for seed in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize(threads, elapsed)
+
+
+def summarize(workers, elapsed: float) -> dict:
+    """Combine the latencies and errors recorded by each worker, keyed by endpoint or operation name.
+
+    Returns:
+        dict: Per name request counts, errors and latency percentiles in milliseconds, plus totals.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for worker in workers:
+        for name, values in worker.latencies.items():
+            latencies[name].extend(values)
+        for name, count in worker.errors.items():
+            errors[name] += count
+
+    results = {}
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        results[name] = {'requests': len(values),
+                         'errors': errors[name],
+                         'mean_ms': statistics.fmean(values) * 1000,
+                         'p50_ms': percentile(values, 50) * 1000,
+                         'p95_ms': percentile(values, 95) * 1000,
+                         'p99_ms': percentile(values, 99) * 1000,
+                         'max_ms': values[-1] * 1000}
+    total = sum(len(values) for values in latencies.values())
+    return {'endpoints': results,
+            'requests': total,
+            'errors': sum(errors.values()),
+            'seconds': elapsed,
+            'requests_per_second': total / elapsed if elapsed else 0.0}
+
+
+@contextlib.contextmanager
+def local_server(pool_size=8):
+    """Start an API server on a new, seeded SQLite stand-in database and yield its URL."""
+    import sqlite_db
+    from api_server import NewsAPIServer
+    from db_pool import NewsDBPool
+    from db_util import create_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'news.sqlite3'
+        with sqlite_db.connect(path) as conn:
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_data(conn, output=False)
+
+        pool = NewsDBPool(lambda: sqlite_db.connect(path), size=pool_size)
+        server = NewsAPIServer(('127.0.0.1', 0), pool)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_address[1]}"
+        finally:
+            server.shutdown()
+            server.server_close()
+            pool.close()
+
+
+def print_results(results: dict):
+    print(f"{'endpoint':40} {'requests':>9} {'errors':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, r in results['endpoints'].items():
+        print(f"{name:40} {r['requests']:>9} {r['errors']:>7} {r['mean_ms']:>8.2f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    print(f"\n{results['requests']} requests, {results['errors']} errors in {results['seconds']:.1f}s "
+          f"= {results['requests_per_second']:.0f} requests/s (latencies in ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the news HTTP API.')
+    parser.add_argument('--url', help='URL of a running server. A local SQLite backed server is started if not given.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent clients.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run for.')
+    parser.add_argument('--pool-size', type=int, default=8, help='Connections for the local server.')
+    parser.add_argument('--username', default='bob')
+    parser.add_argument('--password', default='123')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        url = args.url or stack.enter_context(local_server(args.pool_size))
+        results = run_load_test(url, args.workers, args.duration, args.username, args.password)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
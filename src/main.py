@@ -8,10 +8,12 @@ Driver for all application functionality.
 # Standard library imports
 import getpass
 import os
+import sys
 from pathlib import Path
 from datetime import datetime
 import argparse
 from enum import Enum, auto
+from functools import cached_property
 from typing import Union
 
 # Third party imports
@@ -19,10 +21,13 @@ from dotenv import load_dotenv
 import oracledb
 from oracledb.exceptions import DatabaseError
 
-# Local imports
+# Local imports. The article viewer, reports and batch mode pull in rich and are imported when first used.
 from db import User, UserTable, NewsDB
-from article_view import ArticleViewer
-from generate_report import ReportGenerator
+from db_pool import init_oracle_mode
+from events import EventBus
+from article_query import ArticleQuery
+from recent_views import RecentViews
+from sessions import SessionStore
 
 
 def empty_prompt(prompt: str) -> None:
@@ -69,25 +74,34 @@ class ApplicationCLI:
     def __init__(self, db_interface: NewsDB):
 
         self.db_interface = db_interface
-        self.article_viewer = ArticleViewer(self.db_interface)
-        self.report_generator = ReportGenerator(self.db_interface)
 
         # Users will start as being logged out
         self.current_state = AppStates.LOGGED_OUT
 
-        # the currently logged in user
+        # the currently logged in user and their session token
         self.current_user = None
+        self.session_token = None
         self.running = True
         
         try:
             self.db_interface.verify()
         except DatabaseError as e:
             print(f"*****Database error: {e}")
-            print("*****The database was not properly initialized. Ensure that you ran `make initdb` or the `create_data.txt` script before running.")
+            print("*****The database was not properly initialized. Ensure that you ran `make initdb` (or `python3 src/db_util.py --migrate` for an existing database) before running.")
             print("If you just ran the unit tests, the database will have been deleted.")
             print("*****Quitting...")
             self.running = False
 
+    @cached_property
+    def article_viewer(self):
+        from article_view import ArticleViewer
+        return ArticleViewer(self.db_interface)
+
+    @cached_property
+    def report_generator(self):
+        from generate_report import ReportGenerator
+        return ReportGenerator(self.db_interface)
+
     def print_help(self):
         global_help = "h (list commands) q (quit)"
 
@@ -98,17 +112,22 @@ class ApplicationCLI:
         r2 (Generate report of most popular article tags)
         r3 (Generate report of most popular article categories)
         r4 (Generate report of most active users)
+        r5 (Generate report of retention of users by the month they registered)
+        e (Export a report to a CSV, JSON Lines, Parquet or Arrow file)
         """
 
         user_menu = """
         d (list articles by date)
         c (list articles in category)
         t (list articles with tag)
+        f (filter articles by several tags, categories and dates)
         g (list all tags)
         a (list all categories)
         v (view article)
         x (comment on article)
         z (view comments on article)
+        trending (list trending articles)
+        recommended (list articles recommended for you)
         l (logout)
         """
 
@@ -121,16 +140,21 @@ class ApplicationCLI:
         else:
             print(global_help)
 
-    def login_prompt(self, retries=3) -> Union[int, None]:
+    def login_prompt(self, retries=3) -> Union[str, None]:
+        """Ask for a username and password until they are valid.
+
+        Returns:
+            str: A session token for the user, or None if the login failed.
+        """
         try:
             while retries > 0:
                 username = get_line("Enter username")
                 password = get_line("Enter password", hidden=True)
 
                 if username and password:
-                    user_id = self.db_interface.users.validate(username, password)
-                    if user_id is not None:
-                        return int(user_id)
+                    token = self.db_interface.users.login(username, password)
+                    if token is not None:
+                        return token
                     else:
                         print("Invalid username or password")
                         retries -= 1
@@ -139,6 +163,55 @@ class ApplicationCLI:
         print("Too many retries.")
         return None
 
+    def filter_prompt(self):
+        """Ask for tags, categories and a date range, then list the matching articles."""
+        params = {
+            'tags': get_line("Enter tag IDs separated by commas (blank for any)"),
+            'categories': get_line("Enter categories separated by commas (blank for any)"),
+            'after': get_line("Published on or after (YYYY-MM-DD, blank for any)"),
+            'before': get_line("Published before (YYYY-MM-DD, blank for any)"),
+        }
+        if params['tags'] and ',' in params['tags']:
+            params['tag_match'] = (get_line("Match all tags or any tag? (all/any)") or 'any').strip().lower()
+        if params['categories'] and ',' in params['categories']:
+            params['category_match'] = (get_line("Match all categories or any category? (all/any)") or 'any').strip().lower()
+
+        try:
+            query = ArticleQuery.from_params({key: value for key, value in params.items() if value})
+        except ValueError as e:
+            empty_prompt(f"Invalid filter: {e}")
+            return
+        self.article_viewer.print_search(query)
+
+    def export_prompt(self):
+        """Ask which report to export, in which format and where, then write it."""
+        reports = self.report_generator.reports
+        name = get_line(f"Enter report ({', '.join(reports)})")
+        if name not in reports:
+            empty_prompt(f"Unknown report '{name}'")
+            return
+
+        year = None
+        if reports[name][1]:
+            year = get_line("Enter year: ")
+            if not year or not year.isnumeric():
+                empty_prompt("year invalid")
+                return
+
+        fmt = get_line("Enter format (csv, jsonl, parquet, arrow)")
+        path = get_line("Enter file to write")
+        if not fmt or not path:
+            empty_prompt("Invalid input")
+            return
+
+        try:
+            count = self.report_generator.export(name, fmt.strip().lower(), path.strip(), year)
+            empty_prompt(f"Exported {count} row(s) to {path}")
+        except ValueError as e:
+            empty_prompt(str(e))
+        except (DatabaseError, OSError) as e:
+            empty_prompt(f"Error exporting report: {e}")
+
     def process_command(self, arg: str):
 
         ### Commands that can be used at any time ###
@@ -152,10 +225,12 @@ class ApplicationCLI:
         elif arg == 'l':
             # the user wants to login
             if self.current_state == AppStates.LOGGED_OUT:
-                user_id = self.login_prompt()
-                if user_id is not None:  # give the login prompt and login if it was successful
+                token = self.login_prompt()
+                if token is not None:  # give the login prompt and login if it was successful
                     ### THE USER IS LOGGED IN HERE ###
-                    self.current_user = self.db_interface.users.get(user_id)
+                    self.session_token = token
+                    self.current_user = self.db_interface.sessions.get(token)
+                    self.db_interface.router.reads.set_user(self.current_user.userID)
                     empty_prompt(f"Successfully logged in as {self.current_user.username}")
                     if self.current_user.is_admin:
                         self.current_state = AppStates.ADMIN_MENU
@@ -165,7 +240,10 @@ class ApplicationCLI:
 
             # User wants to logout
             elif self.current_state == AppStates.ADMIN_MENU or self.current_state == AppStates.ARTICLE_LIST:
+                self.db_interface.users.logout(self.session_token)
+                self.session_token = None
                 self.current_user = None
+                self.db_interface.router.reads.set_user(None)
                 self.current_state = AppStates.LOGGED_OUT
                 print("Successfully logged out")
                 return
@@ -199,6 +277,16 @@ class ApplicationCLI:
                 else:
                     empty_prompt("year invalid")
                 return
+            elif arg == 'r5':
+                year = get_line("Enter year users registered: ")
+                if year and year.isnumeric():
+                    self.report_generator.user_retention(year)
+                else:
+                    empty_prompt("year invalid")
+                return
+            elif arg == 'e':
+                self.export_prompt()
+                return
 
         elif self.current_state == AppStates.ARTICLE_LIST:
             if arg == 'd':  # list articles by date
@@ -220,6 +308,15 @@ class ApplicationCLI:
                 else:
                     empty_prompt(f"Tag with ID '{tagID}' does not exist")
                 return
+            elif arg == 'f':  # filter articles by tags, categories and dates
+                self.filter_prompt()
+                return
+            elif arg == 'trending':  # list articles by time-decayed views and comments
+                self.article_viewer.print_trending()
+                return
+            elif arg == 'recommended':  # list articles similar to the ones the user viewed
+                self.article_viewer.print_recommended(self.current_user.userID)
+                return
             elif arg == 'g':  # list all tags
                 self.report_generator.tag_details()
                 return
@@ -283,7 +380,11 @@ class ApplicationCLI:
                 command = get_line(prompt)
                 if command:
                     print(f"Got command: {command}")
-                    self.process_command(command.strip().lower())
+                    try:
+                        self.process_command(command.strip().lower())
+                    except DatabaseError as e:
+                        # e.g. a call timeout, or the circuit breaker failing fast while the database is down
+                        print(f"*****Database error: {e}")
                 else:  # get_line returns None if input was invalid
                     print("Command cannot be empty")
 
@@ -293,6 +394,12 @@ class ApplicationCLI:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='News database application.')
+    parser.add_argument('--batch', metavar='SCRIPT',
+                        help="Run commands from a script or JSON Lines file ('-' for stdin) instead of prompting. Results are printed as JSON Lines.")
+    parser.add_argument('--commit-every', type=int, default=100, help='Number of writes grouped into one commit in batch mode.')
+    args = parser.parse_args()
+
     # Connect to oracle database
     load_dotenv()  # load environment from .env file
     DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
@@ -300,15 +407,41 @@ if __name__ == '__main__':
     assert os.getenv('DB_PASS'), "DB_PASS cannot be empty. Ensure it is set in the .env file"
     assert os.getenv('DB_PORT'), "DB_PORT cannot be empty. Ensure it is set in the .env file"
     assert os.getenv('DB_HOST'), "DB_HOST cannot be empty. Ensure it is set in the .env file"
-    oracledb.init_oracle_client()
+    init_oracle_mode()
     with oracledb.connect(user=os.getenv('DB_USER'),
                         password=os.getenv('DB_PASS'),
                         port=os.getenv('DB_PORT'),
                         host=os.getenv('DB_HOST'),
                         service_name='XE') as db_conn:
-        print("Successfully connected to Oracle Database")
-        
-        db_interface = NewsDB(db_conn)
-        app = ApplicationCLI(db_interface)
+        print("Successfully connected to Oracle Database", file=sys.stderr if args.batch else sys.stdout)
+
+        # Optional read replica for article listings, comments and reports
+        replica_conn = None
+        if os.getenv('DB_REPLICA_HOST'):
+            replica_conn = oracledb.connect(user=os.getenv('DB_USER'),
+                                            password=os.getenv('DB_PASS'),
+                                            port=os.getenv('DB_REPLICA_PORT') or os.getenv('DB_PORT'),
+                                            host=os.getenv('DB_REPLICA_HOST'),
+                                            service_name='XE')
+
+        sessions = SessionStore(ttl=float(os.getenv('SESSION_TTL', 3600)), path=os.getenv('SESSION_FILE'))
+        recent_views = RecentViews(window=float(os.getenv('VIEW_DEDUP_WINDOW', 1800)))
+        db_interface = NewsDB(db_conn, sessions, events=EventBus(os.getenv('EVENT_LOG')), replica=replica_conn,
+                              recent_views=recent_views)
+
+        if args.batch:
+            from batch import BatchRunner
+            runner = BatchRunner(db_interface, commit_every=args.commit_every)
+            if args.batch == '-':
+                runner.run(sys.stdin)
+            else:
+                with open(args.batch, 'r') as script:
+                    runner.run(script)
+        else:
+            app = ApplicationCLI(db_interface)
+            app.prompt_loop()
 
-        app.prompt_loop()
+        # Store views not yet added to the unique viewer sketches
+        db_interface.sketches.flush(db_conn)
+        if replica_conn is not None:
+            replica_conn.close()
@@ -0,0 +1,73 @@
+"""
+Password hashing helpers. Passwords are stored as salted PBKDF2-SHA256 hashes in the Users table.
+
+Stored format: pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+"""
+
+import hashlib
+import hmac
+import secrets
+
+ALGORITHM = 'pbkdf2_sha256'
+ITERATIONS = 600_000
+SALT_BYTES = 16
+
+# Hash of a random throwaway password. Verifying against it keeps failed lookups as slow as real checks.
+DUMMY_HASH = 'pbkdf2_sha256$600000$ba257b7ea5d663b3d4b73b0a354268df$0fcd3c23a0e2154f1ea43296b58dcc1e3a98e9440a3522ee283de2db47f4185d'
+
+
+def hash_password(password: str, salt: bytes = None, iterations: int = ITERATIONS) -> str:
+    """Hash a password with a random salt.
+
+    Args:
+        password (str): The plaintext password.
+        salt (bytes, optional): Salt to use. A random one is generated if not given.
+        iterations (int, optional): Number of PBKDF2 iterations. Defaults to ITERATIONS.
+
+    Returns:
+        str: The encoded hash, suitable for storing in the password column.
+    """
+    if salt is None:
+        salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def is_hashed(stored: str) -> bool:
+    """Check if a stored password value is a hash rather than a legacy plaintext password."""
+    return stored is not None and stored.startswith(f"{ALGORITHM}$")
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a plaintext password against a stored value in constant time.
+
+    Legacy plaintext values are still accepted so that existing rows keep working until they are migrated.
+
+    Args:
+        password (str): The plaintext password given by the user.
+        stored (str): The value from the password column.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    if stored is None:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """Check if a stored value should be replaced with a fresh hash (plaintext or outdated iteration count)."""
+    if not is_hashed(stored):
+        return True
+    try:
+        return int(stored.split('$')[1]) < ITERATIONS
+    except (IndexError, ValueError):
+        return True
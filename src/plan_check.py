@@ -0,0 +1,258 @@
+"""
+Capture the query plan of every statement in queries.py and check it against golden files, to notice when a query
+silently switches to a full scan.
+
+Plans come from EXPLAIN PLAN on Oracle and EXPLAIN QUERY PLAN on the SQLite stand-in, with the sample bind values in
+SAMPLE_BINDS. Each plan is stored as tests/plans/<engine>/<STATEMENT>.txt, one step per line, indented under its
+parent. A plan regresses when:
+    - a table (or alias) is read with a full scan more often than in the golden plan, e.g. an index access became a
+      full scan, or
+    - the estimated cost (Oracle only) grew by more than `cost_threshold` and by at least `min_cost_delta`.
+Other differences are reported as changes without failing.
+
+Usage:
+    python3 src/plan_check.py --sqlite              check against a seeded in-memory SQLite database
+    python3 src/plan_check.py                       check against Oracle, using the .env settings
+    python3 src/plan_check.py --sqlite --update     record the current plans as the golden files
+
+The database needs the schema and its indexes, and ideally statistics representative of production, since both
+engines pick plans from them.
+"""
+
+import argparse
+import datetime as dt
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+import queries
+
+PLAN_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'plans'
+
+# Bind values used to explain statements, by bind name. Binds missing here are given 1.
+SAMPLE_BINDS = {
+    'articleID': 1, 'userID': 1, 'tagID': 1, 'commentID': 1, 'neighborID': 2,
+    'catName': 'technology', 'username': 'bob', 'password': 'x', 'content': 'x', 'title': 'x', 'author': 'x',
+    'description': 'x', 'tagName': 'x', 'sort_by': 'publishDate',
+    'year': '2022', 'year_start': dt.datetime(2022, 1, 1), 'year_end': dt.datetime(2023, 1, 1),
+    'since': dt.datetime(2022, 1, 1), 'viewedAt': dt.datetime(2022, 1, 1, 12), 'viewDay': dt.datetime(2022, 1, 1),
+    'viewMonth': dt.datetime(2022, 1, 1),
+    'registerDate': dt.datetime(2022, 1, 1), 'publishDate': dt.datetime(2022, 1, 1),
+    'commentDate': dt.datetime(2022, 1, 1), 'computedAt': dt.datetime(2022, 1, 1),
+    'score': 0.5, 'k': 10, 'offset': 0, 'page_size': 20, 'viewCount': 1, 'commentCount': 1, 'sketch': b'\x01\x0c',
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_BIND = re.compile(r"(?<![:\w]):(\w+)")
+
+# SQLite: "SCAN T", "SCAN T USING COVERING INDEX i", "SEARCH T USING INDEX i (x=?)"
+_SQLITE_ACCESS = re.compile(r'^(SCAN|SEARCH) (\S+)(?: USING (.*))?$')
+# Oracle: "TABLE ACCESS FULL ARTICLES", "INDEX RANGE SCAN ARTICLES_PUBLISHDATE"
+_ORACLE_FULL = re.compile(r'^(TABLE ACCESS FULL|MAT_VIEW ACCESS FULL) (\S+)')
+
+
+def statements() -> Dict[str, str]:
+    """Every named SQL statement in queries.py, by name. Statements in a tuple are named NAME_0, NAME_1, ..."""
+    named = {}
+    for name, value in vars(queries).items():
+        if not name.isupper():
+            continue
+        if isinstance(value, str):
+            named[name] = value
+        elif isinstance(value, tuple):
+            named.update((f"{name}_{i}", item) for i, item in enumerate(value) if isinstance(item, str))
+    # Statements taking a list of IDs are explained with a list of one
+    return {name: sql.replace('{in_list}', ':articleID') for name, sql in named.items()
+            if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')}
+
+
+def binds_for(sql: str) -> dict:
+    """Sample values for the binds of a statement. Text in quotes, like 'HH24:MI:SS', isn't mistaken for binds."""
+    names = _BIND.findall(_STRING.sub("''", sql))
+    return {name: SAMPLE_BINDS.get(name, 1) for name in dict.fromkeys(names)}
+
+
+class Plan:
+    """The steps of a query plan, one per line, indented by depth, and its estimated cost if the engine gives one."""
+
+    def __init__(self, lines: List[str], cost: int = None):
+        self.lines = lines
+        self.cost = cost
+
+    def __eq__(self, other):
+        return isinstance(other, Plan) and self.lines == other.lines and self.cost == other.cost
+
+    def full_scans(self) -> Counter:
+        """Number of full scans of each table or alias."""
+        scans = Counter()
+        for line in self.lines:
+            step = line.strip()
+            match = _SQLITE_ACCESS.match(step)
+            if match:
+                kind, name, using = match.groups()
+                if kind == 'SCAN' and not using and name != 'CONSTANT':
+                    scans[name] += 1
+                continue
+            match = _ORACLE_FULL.match(step)
+            if match:
+                scans[match.group(2)] += 1
+        return scans
+
+    def to_text(self) -> str:
+        header = f"# cost: {self.cost}\n" if self.cost is not None else ''
+        return header + ''.join(line + '\n' for line in self.lines)
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Plan':
+        lines = text.splitlines()
+        cost = None
+        if lines and lines[0].startswith('# cost:'):
+            cost = int(lines.pop(0).split(':', 1)[1])
+        return cls(lines, cost)
+
+
+def _indent(rows) -> List[str]:
+    """Indent (id, parent, text) rows under their parents."""
+    depth = {}
+    lines = []
+    for step_id, parent, text in rows:
+        depth[step_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[step_id] + text)
+    return lines
+
+
+def explain(conn, sql: str, binds: dict = None) -> Plan:
+    """Get the plan the database would use for a statement, without running it."""
+    binds = binds if binds is not None else binds_for(sql)
+    with conn.cursor() as cursor:
+        if getattr(conn, 'engine', 'oracle') == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, **binds)
+            return Plan(_indent((row[0], row[1], row[3]) for row in cursor.fetchall()))
+
+        statement_id = 'plan_check'
+        cursor.execute("DELETE FROM plan_table WHERE statement_id = :statement_id", statement_id=statement_id)
+        cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}", **binds)
+        cursor.execute("""SELECT id, parent_id, trim(operation || ' ' || options || ' ' || object_name), cost
+                          FROM plan_table WHERE statement_id = :statement_id ORDER BY id""", statement_id=statement_id)
+        rows = cursor.fetchall()
+        cursor.execute("DELETE FROM plan_table WHERE statement_id = :statement_id", statement_id=statement_id)
+    conn.rollback()
+    cost = rows[0][3] if rows and rows[0][3] is not None else None
+    return Plan(_indent((row[0], row[1], row[2]) for row in rows), None if cost is None else int(cost))
+
+
+def compare(golden: Plan, current: Plan, cost_threshold: float = 0.5, min_cost_delta: int = 10) -> List[str]:
+    """Find the ways a plan regressed from its golden plan.
+
+    Args:
+        golden (Plan): The recorded plan.
+        current (Plan): The plan now.
+        cost_threshold (float, optional): Fraction the cost may grow by. Defaults to 0.5.
+        min_cost_delta (int, optional): Cost increases smaller than this are ignored. Defaults to 10.
+
+    Returns:
+        List[str]: A description of each regression. Empty if there are none.
+    """
+    problems = []
+    before, after = golden.full_scans(), current.full_scans()
+    for name in sorted(after):
+        if after[name] > before[name]:
+            problems.append(f"full scan of {name} ({before[name]} -> {after[name]})")
+    if golden.cost is not None and current.cost is not None:
+        if current.cost - golden.cost >= min_cost_delta and current.cost > golden.cost * (1 + cost_threshold):
+            problems.append(f"cost {golden.cost} -> {current.cost}")
+    return problems
+
+
+class PlanResult:
+    """The outcome of checking one statement: 'ok', 'changed', 'new' (no golden file) or 'regressed'."""
+
+    def __init__(self, name: str, status: str, problems: List[str] = None):
+        self.name = name
+        self.status = status
+        self.problems = problems or []
+
+    @property
+    def failed(self) -> bool:
+        return self.status in ('new', 'regressed')
+
+    def __str__(self):
+        details = f": {'; '.join(self.problems)}" if self.problems else ''
+        return f"{self.status.upper():9} {self.name}{details}"
+
+
+def check(conn, plan_dir: Path = None, update=False, cost_threshold: float = 0.5, min_cost_delta: int = 10) -> List[PlanResult]:
+    """Explain every statement and compare each plan with its golden file.
+
+    Args:
+        conn: The database connection.
+        plan_dir (Path, optional): Holds a directory of golden files per engine. Defaults to PLAN_DIR.
+        update (bool, optional): Write the current plans as the golden files, and remove those of statements that
+            no longer exist. Defaults to False.
+        cost_threshold (float, optional): See compare. Defaults to 0.5.
+        min_cost_delta (int, optional): See compare. Defaults to 10.
+
+    Returns:
+        List[PlanResult]: One result per statement, by name.
+    """
+    engine_dir = Path(plan_dir or PLAN_DIR) / getattr(conn, 'engine', 'oracle')
+    engine_dir.mkdir(parents=True, exist_ok=True)
+    named = statements()
+
+    results = []
+    for name, sql in sorted(named.items()):
+        current = explain(conn, sql)
+        path = engine_dir / f"{name}.txt"
+        if update:
+            path.write_text(current.to_text())
+            results.append(PlanResult(name, 'ok'))
+        elif not path.exists():
+            results.append(PlanResult(name, 'new', ["no golden plan, run with --update"]))
+        else:
+            golden = Plan.from_text(path.read_text())
+            problems = compare(golden, current, cost_threshold, min_cost_delta)
+            status = 'regressed' if problems else 'ok' if golden == current else 'changed'
+            results.append(PlanResult(name, status, problems))
+
+    if update:
+        for path in engine_dir.glob('*.txt'):
+            if path.stem not in named:
+                path.unlink()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check query plans against golden files.')
+    parser.add_argument('--sqlite', nargs='?', const=':memory:', metavar='PATH',
+                        help='Use a SQLite database file, or a seeded in-memory one if no file is given.')
+    parser.add_argument('--update', action='store_true', help='Record the current plans as the golden files.')
+    parser.add_argument('--plan-dir', type=Path, default=PLAN_DIR, help='Directory of golden files.')
+    parser.add_argument('--cost-threshold', type=float, default=0.5, help='Fraction the estimated cost may grow by.')
+    parser.add_argument('--verbose', action='store_true', help='List unchanged statements too.')
+    args = parser.parse_args()
+
+    if args.sqlite:
+        import sqlite_db
+        db_conn = sqlite_db.connect(args.sqlite)
+        if args.sqlite == ':memory:':
+            from db_util import create_data
+            create_data(db_conn, output=False)
+    else:
+        from dotenv import load_dotenv
+
+        from db_pool import init_oracle_mode, oracle_connector
+
+        load_dotenv()  # load environment from .env file
+        init_oracle_mode()
+        db_conn = oracle_connector()()
+
+    with db_conn:
+        results = check(db_conn, args.plan_dir, args.update, args.cost_threshold)
+    for result in results:
+        if args.verbose or result.status != 'ok':
+            print(result)
+    failed = [result for result in results if result.failed]
+    print(f"{len(results)} statement(s), {len(failed)} failed" + (" (golden files updated)" if args.update else ''))
+    sys.exit(1 if failed else 0)
@@ -5,6 +5,8 @@ Home for SQL scripts that will be used by various modules in this project.
 @date: 2023-04-10
 """
 
+CURRENT_SCHEMA_VERSION = """SELECT MAX(version) FROM SchemaMigrations"""
+
 VERIFY_DB = """SELECT COUNT(*) FROM UserRoles WHERE roleName = 'None'
                UNION ALL
                SELECT COUNT(*) FROM Users WHERE userID = 0
@@ -25,8 +27,12 @@ VERIFY_DB = """SELECT COUNT(*) FROM UserRoles WHERE roleName = 'None'
 # I used this instead of a trigger due to time constraints.
 HIGHEST_COMMENT_ID = """SELECT MAX(commentID) FROM Comments"""
 
-ADD_VIEW = """INSERT INTO ArticleViews (articleID, userID, viewedAt)
-              values (:articleID, :userID, CURRENT_TIMESTAMP)"""
+ADD_VIEW = """INSERT INTO ArticleViews (articleID, userID, viewedAt, viewCount)
+              values (:articleID, :userID, :viewedAt, 1)"""
+
+# Count a repeated view in the row of the user's first view (served by the (articleID, viewedAt) index)
+COUNT_REPEAT_VIEW = """UPDATE ArticleViews SET viewCount = viewCount + 1
+                       WHERE articleID = :articleID AND viewedAt = :viewedAt AND userID = :userID"""
               
 ADD_COMMENT = """INSERT INTO Comments (commentID, articleID, userID, commentDate, content)
                  values (:commentID, :articleID, cast(:userID as integer), SYSDATE, :content)"""
@@ -43,13 +49,17 @@ GET_USER = """SELECT userID, username, password, registerDate, roleName
               FROM users
               WHERE userID = cast(:userID as integer)"""
 
-VALIDATE_USER = """SELECT COUNT(*), userID
+# Single lookup on the unique username index. The password is verified in Python (see passwords.py).
+VALIDATE_USER = """SELECT userID, password
                  FROM users
-                 WHERE username = :username AND password = :password
-                 GROUP BY userID"""
+                 WHERE username = :username"""
+
+UPDATE_PASSWORD = """UPDATE users SET password = :password WHERE userID = cast(:userID as integer)"""
+
+ALL_USER_PASSWORDS = """SELECT userID, password FROM users"""
 
 
-SINGLE_ARTICLE = """SELECT articleID, title, author, publishDate, to_char(content)
+SINGLE_ARTICLE = """SELECT articleID, title, author, publishDate, to_char(content), updatedAt
                  FROM articles WHERE articleID = cast(:articleID as integer)"""
 
 SINGLE_TAG = """SELECT tagID, tagName, catName
@@ -62,36 +72,79 @@ SINGLE_CATEGORY = """SELECT catName, description FROM Categories WHERE lower(cat
 CATEGORY_EXISTS = """SELECT COUNT(*) FROM Categories WHERE lower(catName) = lower(:catName)"""
 
 
+# ArticleTags has a unique (articleID, tagID) key, so these joins can't produce duplicates
 ARTICLE_TAGS = """SELECT T.tagName
                   FROM tags T join articleTags AT on T.tagID = AT.tagID
-                            join articles A on AT.articleID = A.articleID
-                  WHERE A.articleID = cast(:articleID as integer)
-                  GROUP BY T.tagName"""
+                  WHERE AT.articleID = cast(:articleID as integer)"""
+
+# Several articles by ID, and their tags. {in_list} is replaced by binds :id0, :id1, ... (see ArticleTable.get_many)
+ARTICLES_BY_IDS = """SELECT articleID, title, author, publishDate, to_char(content), updatedAt
+                     FROM Articles WHERE articleID IN ({in_list})"""
+
+ARTICLES_TAGS_BY_IDS = """SELECT AT.articleID, T.tagName
+                          FROM Tags T join ArticleTags AT on T.tagID = AT.tagID
+                          WHERE AT.articleID IN ({in_list})"""
 
 ARTICLE_COMMENTS = """SELECT C.commentID, C.articleID, C.userID, C.commentDate, to_char(C.content), U.username
                       FROM Comments C join Users U on C.userID = U.userID
-                      WHERE C.articleID = cast(:articleID as integer)"""
+                      WHERE C.articleID = cast(:articleID as integer)
+                      ORDER BY C.commentDate, C.commentID"""
+
+# Pages of comments, found by the date and ID of the last comment on the page before rather than by an offset, so
+# each page is a range read of the Comments(articleID, commentDate) index however deep it is
+ARTICLE_COMMENTS_FIRST_PAGE = """SELECT C.commentID, C.articleID, C.userID, C.commentDate, to_char(C.content), U.username
+                                 FROM Comments C join Users U on C.userID = U.userID
+                                 WHERE C.articleID = cast(:articleID as integer)
+                                 ORDER BY C.commentDate, C.commentID
+                                 OFFSET 0 ROWS FETCH NEXT :page_size ROWS ONLY"""
+
+ARTICLE_COMMENTS_PAGE = """SELECT C.commentID, C.articleID, C.userID, C.commentDate, to_char(C.content), U.username
+                           FROM Comments C join Users U on C.userID = U.userID
+                           WHERE C.articleID = cast(:articleID as integer) AND C.commentDate >= :afterDate
+                               AND (C.commentDate > :afterDate OR C.commentID > :afterID)
+                           ORDER BY C.commentDate, C.commentID
+                           OFFSET 0 ROWS FETCH NEXT :page_size ROWS ONLY"""
+
+# Recent events, to seed trending scores when they are first used. Range reads of the ArticleViews(viewedAt) and
+# Comments(commentDate) indexes.
+RECENT_VIEW_TIMES = """SELECT articleID, viewedAt, viewCount FROM ArticleViews
+                       WHERE viewedAt >= :since AND viewedAt < :until"""
+
+RECENT_COMMENT_TIMES = """SELECT articleID, commentDate, 1 FROM Comments
+                          WHERE commentDate >= :since AND commentDate < :until"""
+
+COMMENT_COUNT = """SELECT commentCount FROM ArticleCommentCounts WHERE articleID = cast(:articleID as integer)"""
+
+INCREMENT_COMMENT_COUNT = """UPDATE ArticleCommentCounts SET commentCount = commentCount + 1
+                             WHERE articleID = cast(:articleID as integer)"""
+
+INSERT_COMMENT_COUNT = """INSERT INTO ArticleCommentCounts (articleID, commentCount)
+                          VALUES (cast(:articleID as integer), 1)"""
 
 ARTICLES_SORTED = """SELECT articleID, title, author, publishDate, content
                       FROM articles
                       ORDER BY :sort_by ASC"""
 
+# An article can have several tags in the same category, so this is a semi-join rather than a join
 ARTICLES_BY_CATEGORY = """SELECT A.articleID, A.title, A.author, A.publishDate, to_char(A.content)
-                          FROM articles A join ArticleTags AT on A.articleID = AT.articleID
-                                          join Tags T on AT.tagID = T.tagID
-                          WHERE T.catName = :catName
-                          GROUP BY A.articleID, A.title, A.author, A.publishDate, to_char(A.content)
+                          FROM articles A
+                          WHERE EXISTS (SELECT 1
+                                        FROM ArticleTags AT join Tags T on AT.tagID = T.tagID
+                                        WHERE AT.articleID = A.articleID AND T.catName = :catName)
                           ORDER BY :sort_by ASC"""
 
 ARTICLES_BY_TAG = """SELECT A.articleID, A.title, A.author, A.publishDate, to_char(A.content)
                      FROM articles A join ArticleTags AT on A.articleID = AT.articleID
                      WHERE AT.tagID = cast(:tagID as integer)
-                     GROUP BY A.articleID, A.title, A.author, A.publishDate, to_char(A.content)
                      ORDER BY :sort_by ASC"""
 
 
 ######### ADMIN REPORTS #########
 
+# Views are read from ArticleViewHistory, which adds the monthly rollups of archived views to the
+# raw ArticleViews rows. They are filtered on a [year_start, year_end) range rather than
+# extract(year ...) so that Oracle only scans the partitions for that year.
+
 ARTICLE_VIEW_REPORT = """SELECT R."ID", R."Title", R."Views", R."Comments"
                          FROM
                          (SELECT 'ID' as "ID", 'Title' as "Title", 'Views' as "Views", 'Comments' as "Comments"
@@ -99,9 +152,9 @@ ARTICLE_VIEW_REPORT = """SELECT R."ID", R."Title", R."Views", R."Comments"
                          UNION ALL
                          SELECT to_char(A.articleID), to_char(A.title), to_char(NVL(V.viewcount, 0)), to_char(NVL(C.commentcount, 0))
                          FROM articles A
-                            left join (SELECT articleID, count(*) as viewcount
-                                       FROM ArticleViews
-                                       WHERE extract(year from viewedAt) = :year
+                            left join (SELECT articleID, sum(viewCount) as viewcount
+                                       FROM ArticleViewHistory
+                                       WHERE viewedAt >= :year_start and viewedAt < :year_end
                                        GROUP BY articleID) V on A.articleID = V.articleID
                             left join (SELECT articleID, count(*) as commentcount
                                        FROM Comments
@@ -121,11 +174,11 @@ TAG_VIEW_REPORT = """SELECT R."ID", R."TagName", R."Articles", R."Views"
                                     FROM ArticleTags AT join articles A on AT.articleID = A.articleID
                                     WHERE extract(year from A.publishDate) = :year
                                     GROUP BY tagID) A on T.tagID = A.tagID
-                        left join (SELECT tagID, count(*) as viewcount
-                                    FROM ArticleTags AT join ArticleViews AV on AT.articleID = AV.articleID
+                        left join (SELECT tagID, sum(AV.viewCount) as viewcount
+                                    FROM ArticleTags AT join ArticleViewHistory AV on AT.articleID = AV.articleID
                                        join articles A on AT.articleID = A.articleID
                                     WHERE extract(year from A.publishDate) = :year
-                                      and extract(year from AV.viewedAt) = :year
+                                      and AV.viewedAt >= :year_start and AV.viewedAt < :year_end
                                     GROUP BY tagID) V on T.tagID = V.tagID) R
                      ORDER BY R."Views" DESC"""
 
@@ -151,12 +204,12 @@ CATEGORY_VIEW_REPORT = """SELECT R."catName", R."description", R."articleCount",
                                          and extract(year from C2.commentDate) = :year
                                          GROUP BY T2.catName) CM on CM.catName = C.catName
 
-                              left join (SELECT distinct T3.catName as catName, count(*) as viewCount
+                              left join (SELECT distinct T3.catName as catName, sum(V3.viewCount) as viewCount
                                          FROM Tags T3 join ArticleTags AT3 on T3.tagID = AT3.tagID
                                                       join Articles A3 on A3.articleID = AT3.articleID
-                                                      join ArticleViews V3 on V3.articleID = AT3.articleID
+                                                      join ArticleViewHistory V3 on V3.articleID = AT3.articleID
                                          WHERE extract(year from A3.publishDate) = :year
-                                         and extract(year from V3.viewedAt) = :year
+                                         and V3.viewedAt >= :year_start and V3.viewedAt < :year_end
                                          GROUP BY T3.catName) V on V.catName = C.catName) R
                           ORDER BY R."viewCount" DESC"""
 
@@ -173,9 +226,9 @@ USER_ACTIVITY_REPORT = """SELECT R."userID", R."username", R."comCount", R."view
                                          WHERE extract(year from commentDate) = :year
                                          GROUP BY userID) CM on CM.userID = U.userID
 
-                              left join (SELECT userID, count(*) as viewCount
-                                         FROM ArticleViews
-                                         WHERE extract(year from viewedAt) = :year
+                              left join (SELECT userID, sum(viewCount) as viewCount
+                                         FROM ArticleViewHistory
+                                         WHERE viewedAt >= :year_start and viewedAt < :year_end
                                          GROUP BY userID) V on V.userID = U.userID
 
                               left join (SELECT U.userID as userID, 'Y' as vea
@@ -183,12 +236,28 @@ USER_ACTIVITY_REPORT = """SELECT R."userID", R."username", R."comCount", R."view
                                          WHERE not exists (SELECT *
                                                            FROM Articles A
                                                            WHERE not exists (SELECT *
-                                                                             FROM ArticleViews AV
+                                                                             FROM ArticleViewHistory AV
                                                                              WHERE AV.userID = U.userID
                                                                                and AV.articleID = A.articleID))) D
                                  on D.userID = U.userID) R
                           ORDER BY R."viewCount" DESC"""
 
+# Views and comments per user per month, for users registered in a year. Users with no activity come back once with
+# a null month. A user can have a view row and a comment row for the same month.
+USER_MONTH_ACTIVITY = """SELECT U.userID, to_char(U.registerDate, 'YYYY-MM'), A.activeMonth, A.views, A.comments
+                         FROM Users U
+                            left join (SELECT userID, to_char(viewedAt, 'YYYY-MM') as activeMonth,
+                                              sum(viewCount) as views, 0 as comments
+                                       FROM ArticleViewHistory
+                                       WHERE viewedAt >= :year_start
+                                       GROUP BY userID, to_char(viewedAt, 'YYYY-MM')
+                                       UNION ALL
+                                       SELECT userID, to_char(commentDate, 'YYYY-MM'), 0, count(*)
+                                       FROM Comments
+                                       WHERE commentDate >= :year_start
+                                       GROUP BY userID, to_char(commentDate, 'YYYY-MM')) A on A.userID = U.userID
+                         WHERE U.registerDate >= :year_start and U.registerDate < :year_end"""
+
 
 ######### USER REPORTS #########
 
@@ -215,3 +284,131 @@ CATEGORY_REPORT = """SELECT R."CategoryName", R."Description", R."ArticleCount"
                                    FROM Tags T join ArticleTags AT on T.tagID = AT.tagID
                                    GROUP BY T.catName) A on C.catName = A.catName) R
                      ORDER BY R."ArticleCount" DESC"""
+
+
+# Recommendations
+
+# Each user's articles, most recently viewed first
+DISTINCT_VIEWS = """SELECT userID, articleID FROM ArticleViewHistory
+                    GROUP BY userID, articleID
+                    ORDER BY userID, MAX(viewedAt) DESC, articleID"""
+
+ALL_ARTICLE_TAGS = """SELECT articleID, tagID FROM ArticleTags"""
+
+ARTICLES_VIEWED_SINCE = """SELECT DISTINCT articleID FROM ArticleViews WHERE viewedAt >= :since"""
+
+LAST_NEIGHBORS_UPDATE = """SELECT MAX(computedAt) FROM ArticleNeighbors"""
+
+DELETE_NEIGHBORS = """DELETE FROM ArticleNeighbors WHERE articleID = :articleID"""
+
+INSERT_NEIGHBOR = """INSERT INTO ArticleNeighbors (articleID, neighborID, score, computedAt)
+                     values (:articleID, :neighborID, :score, :computedAt)"""
+
+# Neighbors of everything the user has viewed, weighted by similarity, minus what they have already seen.
+# Archived views count too, as they do when the neighbors are built.
+USER_RECOMMENDATIONS = """SELECT N.neighborID, SUM(N.score) AS score
+                          FROM ArticleNeighbors N
+                          WHERE N.articleID IN (SELECT V.articleID FROM ArticleViewHistory V WHERE V.userID = :userID)
+                            AND N.neighborID NOT IN (SELECT V.articleID FROM ArticleViewHistory V
+                                                     WHERE V.userID = :userID)
+                          GROUP BY N.neighborID
+                          ORDER BY score DESC, N.neighborID ASC
+                          OFFSET 0 ROWS FETCH NEXT :k ROWS ONLY"""
+
+
+# Synthetic workload (bulk inserts)
+
+HIGHEST_IDS = """SELECT (SELECT NVL(MAX(articleID), -1) FROM Articles),
+                        (SELECT NVL(MAX(userID), -1) FROM Users),
+                        (SELECT NVL(MAX(tagID), -1) FROM Tags),
+                        (SELECT NVL(MAX(commentID), -1) FROM Comments),
+                        (SELECT COUNT(*) FROM Categories)
+                 FROM dual"""
+
+INSERT_CATEGORY = """INSERT INTO Categories (catName, description) VALUES (:catName, :description)"""
+
+INSERT_TAG = """INSERT INTO Tags (tagID, tagName, catName) VALUES (:tagID, :tagName, :catName)"""
+
+INSERT_USER = """INSERT INTO Users (userID, username, password, registerDate, roleName)
+                 VALUES (:userID, :username, :password, :registerDate, 'user')"""
+
+INSERT_ARTICLE = """INSERT INTO Articles (articleID, title, author, publishDate, content)
+                    VALUES (:articleID, :title, :author, :publishDate, :content)"""
+
+INSERT_ARTICLE_TAG = """INSERT INTO ArticleTags (articleID, tagID) VALUES (:articleID, :tagID)"""
+
+INSERT_VIEW = """INSERT INTO ArticleViews (articleID, userID, viewedAt, viewCount)
+                 VALUES (:articleID, :userID, :viewedAt, :viewCount)"""
+
+INSERT_COMMENT = """INSERT INTO Comments (commentID, articleID, userID, commentDate, content)
+                    VALUES (:commentID, :articleID, :userID, :commentDate, :content)"""
+
+INSERT_COMMENT_COUNTS = """INSERT INTO ArticleCommentCounts (articleID, commentCount) VALUES (:articleID, :commentCount)"""
+
+# Most viewed first, so replayed traffic can favour the same articles the generated views did
+ARTICLES_BY_POPULARITY = """SELECT A.articleID
+                            FROM Articles A
+                              left join (SELECT articleID, SUM(viewCount) AS views
+                                         FROM ArticleViews GROUP BY articleID) V on V.articleID = A.articleID
+                            ORDER BY NVL(V.views, 0) DESC, A.articleID"""
+
+ALL_USER_IDS = """SELECT userID FROM Users ORDER BY userID"""
+
+
+# Unique viewer sketches (see hyperloglog.py)
+
+SELECT_SKETCH_FOR_UPDATE = """SELECT sketch FROM ArticleViewSketches
+                              WHERE articleID = :articleID AND viewDay = :viewDay
+                              FOR UPDATE"""
+
+INSERT_SKETCH = """INSERT INTO ArticleViewSketches (articleID, viewDay, sketch) VALUES (:articleID, :viewDay, :sketch)"""
+
+UPDATE_SKETCH = """UPDATE ArticleViewSketches SET sketch = :sketch WHERE articleID = :articleID AND viewDay = :viewDay"""
+
+# The day sketches of each month merged, so a year takes at most 12 merges per article
+SELECT_MONTH_SKETCH_FOR_UPDATE = """SELECT sketch FROM ArticleViewMonthSketches
+                                    WHERE articleID = :articleID AND viewMonth = :viewMonth
+                                    FOR UPDATE"""
+
+INSERT_MONTH_SKETCH = """INSERT INTO ArticleViewMonthSketches (articleID, viewMonth, sketch)
+                         VALUES (:articleID, :viewMonth, :sketch)"""
+
+UPDATE_MONTH_SKETCH = """UPDATE ArticleViewMonthSketches SET sketch = :sketch
+                         WHERE articleID = :articleID AND viewMonth = :viewMonth"""
+
+ALL_DAY_SKETCHES = """SELECT articleID, viewDay, sketch FROM ArticleViewSketches"""
+
+ALL_VIEW_DAYS = """SELECT articleID, userID, viewedAt FROM ArticleViewHistory WHERE viewedAt >= :since"""
+
+# Same articles and date range as the admin view reports. Articles without views come back with a null sketch.
+YEAR_VIEW_SKETCHES = """SELECT A.articleID, S.sketch
+                        FROM Articles A
+                          left join ArticleViewMonthSketches S on S.articleID = A.articleID
+                                                              and S.viewMonth >= :year_start and S.viewMonth < :year_end
+                        WHERE extract(year from A.publishDate) = :year"""
+
+ARTICLE_TAG_CATEGORIES = """SELECT AT.articleID, AT.tagID, T.catName FROM ArticleTags AT join Tags T on T.tagID = AT.tagID"""
+
+# Publishing articles. INSERT_ARTICLE and INSERT_ARTICLE_TAG above add new ones.
+NEXT_ARTICLE_ID = """SELECT NVL(MAX(articleID), -1) + 1 FROM Articles"""
+
+# A null publishDate keeps the stored one
+UPDATE_ARTICLE = """UPDATE Articles SET title = :title, author = :author, publishDate = NVL(:publishDate, publishDate),
+                                        content = :content, updatedAt = :updatedAt
+                    WHERE articleID = :articleID"""
+
+DELETE_ARTICLE_TAGS = """DELETE FROM ArticleTags WHERE articleID = :articleID"""
+
+# Everything that references an article, deleted before the article itself
+DELETE_ARTICLE_REFERENCES = (
+    """DELETE FROM ArticleTags WHERE articleID = :articleID""",
+    """DELETE FROM Comments WHERE articleID = :articleID""",
+    """DELETE FROM ArticleCommentCounts WHERE articleID = :articleID""",
+    """DELETE FROM ArticleViews WHERE articleID = :articleID""",
+    """DELETE FROM ArticleViewRollups WHERE articleID = :articleID""",
+    """DELETE FROM ArticleViewSketches WHERE articleID = :articleID""",
+    """DELETE FROM ArticleViewMonthSketches WHERE articleID = :articleID""",
+    """DELETE FROM ArticleNeighbors WHERE articleID = :articleID or neighborID = :articleID""",
+)
+
+DELETE_ARTICLE = """DELETE FROM Articles WHERE articleID = :articleID"""
@@ -0,0 +1,82 @@
+"""
+Coalescing repeated views.
+
+A user refreshing an article would otherwise add a new ArticleViews row every time. Instead, the first view of an
+article by a user inserts a row, and further views within the dedup window either add to that row's viewCount or,
+if repeats are not counted, are dropped without writing anything.
+
+The window is kept in memory, per process. Views recorded by another process start their own row, which only
+costs some of the saving, not correctness.
+"""
+
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+
+class RecentViews:
+    """Remembers the row each (article, user) pair's views are currently counted in. Shared by every NewsDB in a process."""
+
+    def __init__(self, window: float = 1800, count_repeats: bool = True, max_entries: int = 100_000,
+                 clock: Callable[[], float] = time.time):
+        """Initialize a new RecentViews.
+
+        Args:
+            window (float, optional): Seconds after a user's first view of an article during which more views by the
+                same user are coalesced into it. 0 records every view as its own row. Defaults to 30 minutes.
+            count_repeats (bool, optional): Add repeats to the first view's viewCount. If False they are dropped.
+                Defaults to True.
+            max_entries (int, optional): Most pairs remembered at once. The oldest are forgotten first. Defaults to 100,000.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.time.
+        """
+        self.window = window
+        self.count_repeats = count_repeats
+        self.max_entries = max_entries
+        self.clock = clock
+        # (articleID, userID) -> viewedAt of the row, in the order the rows were started
+        self._rows: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def row_for(self, articleID: int, userID: int) -> Tuple[dt.datetime, bool]:
+        """Find the row a new view belongs in.
+
+        Args:
+            articleID (int): The article that was viewed.
+            userID (int): The user that viewed it.
+
+        Returns:
+            tuple: The viewedAt of the row, and True if that row is still to be inserted or False if it already
+                exists and the view is a repeat.
+        """
+        now = self.clock()
+        key = (int(articleID), int(userID))
+        with self._lock:
+            self._expire(now)
+            viewed_at = self._rows.get(key)
+            if viewed_at is not None:
+                return viewed_at, False
+            # Whole seconds, so the row can be found again whatever precision the database keeps
+            viewed_at = dt.datetime.fromtimestamp(int(now))
+            if self.window > 0:
+                self._rows[key] = viewed_at
+                if len(self._rows) > self.max_entries:
+                    self._rows.popitem(last=False)
+            return viewed_at, True
+
+    def forget(self, articleID: int, userID: int):
+        """Start a new row on the next view, because the current one was rolled back or failed to be written."""
+        with self._lock:
+            self._rows.pop((int(articleID), int(userID)), None)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._rows:
+            key, viewed_at = next(iter(self._rows.items()))
+            if viewed_at.timestamp() > cutoff:
+                break
+            del self._rows[key]
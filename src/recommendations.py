@@ -0,0 +1,224 @@
+"""
+"Recommended for you" articles, from item-to-item similarity.
+
+Two articles are similar when the same users viewed them (cosine similarity of their sets of viewers) and, to a
+lesser degree, when they share tags (Jaccard similarity of their tag sets, which also covers articles nobody has
+viewed yet). The top neighbors of every article are computed offline and stored in ArticleNeighbors, so a user's
+recommendations are one indexed query: the neighbors of what they viewed, minus what they viewed.
+
+Usage:
+    python3 src/recommendations.py --build      (recompute every article)
+    python3 src/recommendations.py --refresh    (only articles viewed since the last build or refresh)
+"""
+
+import argparse
+import datetime as dt
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from queries import (ALL_ARTICLE_TAGS, ARTICLES_VIEWED_SINCE, DELETE_NEIGHBORS, DISTINCT_VIEWS, INSERT_NEIGHBOR,
+                     LAST_NEIGHBORS_UPDATE, USER_RECOMMENDATIONS)
+
+# Neighbors kept per article
+TOP_N = 20
+
+# Share of the similarity that comes from tags rather than co-views
+TAG_WEIGHT = 0.2
+
+# Users with more distinct views than this only count the articles they viewed most recently, which bounds the pairs
+# a single user adds
+MAX_VIEWS_PER_USER = 500
+
+
+def compute_neighbors(viewed: Dict[int, Set[int]], tags: Dict[int, Set[int]], articles: Iterable[int] = None,
+                      top_n: int = TOP_N, tag_weight: float = TAG_WEIGHT) -> Dict[int, List[Tuple[int, float]]]:
+    """Compute the most similar articles for each article.
+
+    The co-view matrix is kept sparse: only pairs that were viewed by the same user or share a tag are ever counted.
+
+    Args:
+        viewed (Dict[int, Set[int]]): userID -> articles the user viewed, as returned by load_views.
+        tags (Dict[int, Set[int]]): articleID -> the article's tags.
+        articles (Iterable[int], optional): Only compute neighbors for these articles. Defaults to every article.
+        top_n (int, optional): Neighbors kept per article. Defaults to TOP_N.
+        tag_weight (float, optional): Share of the similarity that comes from tags. Defaults to TAG_WEIGHT.
+
+    Returns:
+        Dict[int, List[Tuple[int, float]]]: articleID -> (neighborID, similarity) pairs, most similar first.
+    """
+    targets = None if articles is None else set(articles)
+
+    viewers: Dict[int, int] = defaultdict(int)
+    co_views: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for user_articles in viewed.values():
+        for a in user_articles:
+            viewers[a] += 1
+            if targets is not None and a not in targets:
+                continue
+            row = co_views[a]
+            for b in user_articles:
+                if b != a:
+                    row[b] += 1
+
+    tagged: Dict[int, Set[int]] = defaultdict(set)
+    for articleID, article_tags in tags.items():
+        for tagID in article_tags:
+            tagged[tagID].add(articleID)
+
+    if targets is None:
+        targets = set(viewers) | set(tags)
+
+    neighbors = {}
+    for a in targets:
+        scores: Dict[int, float] = {}
+        for b, count in co_views.get(a, {}).items():
+            scores[b] = (1 - tag_weight) * count / math.sqrt(viewers[a] * viewers[b])
+
+        a_tags = tags.get(a, set())
+        candidates = set()
+        for tagID in a_tags:
+            candidates |= tagged[tagID]
+        candidates.discard(a)
+        for b in candidates:
+            b_tags = tags[b]
+            jaccard = len(a_tags & b_tags) / len(a_tags | b_tags)
+            scores[b] = scores.get(b, 0.0) + tag_weight * jaccard
+
+        neighbors[a] = heapq.nlargest(top_n, scores.items(), key=lambda item: (item[1], -item[0]))
+    return neighbors
+
+
+def load_views(conn) -> Tuple[Dict[int, Set[int]], Dict[int, Set[int]]]:
+    """Read who viewed what, including archived views, and the tags of every article. Only the MAX_VIEWS_PER_USER
+    articles each user viewed most recently are kept."""
+    viewed: Dict[int, Set[int]] = defaultdict(set)
+    tags: Dict[int, Set[int]] = defaultdict(set)
+    with conn.cursor() as cursor:
+        cursor.arraysize = 5000
+        cursor.execute(DISTINCT_VIEWS)
+        for userID, articleID in cursor:
+            if len(viewed[userID]) < MAX_VIEWS_PER_USER:
+                viewed[userID].add(articleID)
+        cursor.execute(ALL_ARTICLE_TAGS)
+        for articleID, tagID in cursor:
+            tags[articleID].add(tagID)
+    return viewed, tags
+
+
+def store_neighbors(conn, neighbors: Dict[int, List[Tuple[int, float]]], computed_at: dt.datetime = None):
+    """Replace the stored neighbors of the given articles, in one transaction."""
+    computed_at = computed_at or dt.datetime.now()
+    with conn.cursor() as cursor:
+        cursor.executemany(DELETE_NEIGHBORS, [{'articleID': articleID} for articleID in neighbors])
+        rows = [{'articleID': articleID, 'neighborID': neighborID, 'score': score, 'computedAt': computed_at}
+                for articleID, article_neighbors in neighbors.items()
+                for neighborID, score in article_neighbors]
+        if rows:
+            cursor.executemany(INSERT_NEIGHBOR, rows)
+    conn.commit()
+
+
+def last_update(conn) -> Union[dt.datetime, None]:
+    with conn.cursor() as cursor:
+        cursor.execute(LAST_NEIGHBORS_UPDATE)
+        computed_at = cursor.fetchone()[0]
+    if isinstance(computed_at, str):
+        computed_at = dt.datetime.fromisoformat(computed_at)
+    return computed_at
+
+
+def build(conn, top_n: int = TOP_N) -> int:
+    """Recompute and store the neighbors of every article.
+
+    Returns:
+        int: The number of articles updated.
+    """
+    computed_at = dt.datetime.now()
+    viewed, tags = load_views(conn)
+    neighbors = compute_neighbors(viewed, tags, top_n=top_n)
+    store_neighbors(conn, neighbors, computed_at)
+    return len(neighbors)
+
+
+def refresh(conn, since: dt.datetime = None, top_n: int = TOP_N) -> int:
+    """Recompute the neighbors of articles viewed since the last build or refresh, and of the articles co-viewed with them.
+
+    Co-view counts only change for pairs that include a newly viewed article, so every other article keeps its stored
+    neighbors. A full build is run if nothing has been stored yet.
+
+    Args:
+        conn: The database connection.
+        since (datetime, optional): Look for views from this time. Defaults to the time of the last build or refresh.
+        top_n (int, optional): Neighbors kept per article. Defaults to TOP_N.
+
+    Returns:
+        int: The number of articles updated.
+    """
+    since = since or last_update(conn)
+    if since is None:
+        return build(conn, top_n)
+
+    computed_at = dt.datetime.now()
+    with conn.cursor() as cursor:
+        # viewedAt is kept in whole seconds, so a view just after `since` can be stored as just before it
+        cursor.execute(ARTICLES_VIEWED_SINCE, since=since - dt.timedelta(seconds=1))
+        changed = {row[0] for row in cursor.fetchall()}
+    if not changed:
+        return 0
+
+    viewed, tags = load_views(conn)
+    affected = set(changed)
+    for user_articles in viewed.values():
+        if not changed.isdisjoint(user_articles):
+            affected |= user_articles
+
+    neighbors = compute_neighbors(viewed, tags, affected, top_n=top_n)
+    store_neighbors(conn, neighbors, computed_at)
+    return len(neighbors)
+
+
+def recommend(conn, userID: int, k: int = 10) -> List[Tuple[int, float]]:
+    """Get recommendations for a user from the stored neighbors.
+
+    Args:
+        conn: The database connection.
+        userID (int): The user.
+        k (int, optional): Number of articles. Defaults to 10.
+
+    Returns:
+        List[Tuple[int, float]]: (articleID, score) pairs, best first. Empty for users who have not viewed anything.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(USER_RECOMMENDATIONS, userID=userID, k=k)
+        return [(articleID, float(score)) for articleID, score in cursor.fetchall()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute article neighbors for recommendations.')
+    parser.add_argument('--build', action='store_true', help='Recompute the neighbors of every article.')
+    parser.add_argument('--refresh', action='store_true', help='Only update articles viewed since the last run.')
+    parser.add_argument('--top-n', type=int, default=TOP_N, help=f'Neighbors kept per article. Defaults to {TOP_N}.')
+    parser.add_argument('--sqlite', metavar='PATH', help='Use a SQLite database file instead of Oracle.')
+    args = parser.parse_args()
+
+    if args.sqlite:
+        import sqlite_db
+        db_conn = sqlite_db.connect(args.sqlite)
+    else:
+        from dotenv import load_dotenv
+
+        from db_pool import init_oracle_mode, oracle_connector
+
+        load_dotenv()  # load environment from .env file
+        init_oracle_mode()
+        db_conn = oracle_connector()()
+
+    with db_conn:
+        if args.build:
+            print(f"Updated neighbors of {build(db_conn, args.top_n)} article(s)")
+        elif args.refresh:
+            print(f"Updated neighbors of {refresh(db_conn, top_n=args.top_n)} article(s)")
+        else:
+            parser.error("Must specify --build or --refresh")
@@ -0,0 +1,133 @@
+"""
+Export reports to files. Rows are streamed from the cursor with fetchmany straight into the writer, so the full
+result is never held in memory.
+
+Supported formats: csv, jsonl, parquet and arrow. The last two need the optional `pyarrow` package.
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import List, Sequence, Union
+
+from oracledb.exceptions import DatabaseError
+
+
+class CSVWriter:
+    def __init__(self, path: Path, columns: List[str]):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows: Sequence[tuple]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLinesWriter:
+    def __init__(self, path: Path, columns: List[str]):
+        self.file = open(path, 'w')
+        self.columns = columns
+
+    def write_rows(self, rows: Sequence[tuple]):
+        self.file.writelines(json.dumps(dict(zip(self.columns, row)), default=str) + '\n' for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    """Writes each fetched batch as one Arrow record batch, to either a Parquet or an Arrow IPC file."""
+
+    def __init__(self, path: Path, columns: List[str], parquet=True):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Exporting to Parquet or Arrow needs the pyarrow package: pip install pyarrow")
+        self.pa = pyarrow
+        self.columns = columns
+        # Report columns are all formatted as text by the queries
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        if parquet:
+            self.writer = pyarrow.parquet.ParquetWriter(str(path), self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(str(path), self.schema)
+
+    def write_rows(self, rows: Sequence[tuple]):
+        arrays = [self.pa.array([None if row[i] is None else str(row[i]) for row in rows], type=self.pa.string())
+                  for i in range(len(self.columns))]
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+    'parquet': lambda path, columns: ArrowWriter(path, columns, parquet=True),
+    'arrow': lambda path, columns: ArrowWriter(path, columns, parquet=False),
+}
+
+
+def export_query(conn, query: str, fmt: str, path: Union[str, Path], batch_size: int = 1000, **binds) -> int:
+    """Run a report query and stream its rows into a file.
+
+    The first row of every report holds the column headers, as in ReportGenerator.table_view.
+
+    Args:
+        conn: The database connection.
+        query (str): The report query.
+        fmt (str): One of the keys of WRITERS.
+        path (str | Path): The file to write.
+        batch_size (int, optional): Rows fetched per round trip. Defaults to 1000.
+
+    Raises:
+        ValueError: If the format is unknown or its dependency is missing.
+        DatabaseError: If the query returned no rows.
+
+    Returns:
+        int: The number of data rows written, not counting the header.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of {', '.join(WRITERS)}")
+
+    count = 0
+    with conn.cursor() as cursor:
+        cursor.arraysize = batch_size
+        cursor.execute(query, **binds)
+        header = cursor.fetchone()
+        if header is None:
+            raise DatabaseError("No rows were returned")
+
+        writer = WRITERS[fmt](Path(path), [str(column) for column in header])
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write_rows(rows)
+                count += len(rows)
+        finally:
+            writer.close()
+    return count
+
+
+def export_rows(rows: Sequence[tuple], fmt: str, path: Union[str, Path]) -> int:
+    """Write report rows computed in Python into a file. The first row holds the column headers.
+
+    Returns:
+        int: The number of data rows written, not counting the header.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of {', '.join(WRITERS)}")
+    writer = WRITERS[fmt](Path(path), [str(column) for column in rows[0]])
+    try:
+        writer.write_rows(rows[1:])
+    finally:
+        writer.close()
+    return len(rows) - 1
@@ -0,0 +1,246 @@
+"""
+Timeouts, retries and a circuit breaker around database calls.
+
+Every read and write made through NewsDB goes through Resilience.run, which:
+    - sets `call_timeout` on the connection for the kind of call (read, write or report), so a slow database raises
+      an error instead of stalling the CLI or an API worker,
+    - retries idempotent reads that failed with a transient error (lost connection, timeout, lock wait), after a
+      random delay of up to `base_delay * 2**attempt` seconds ("full jitter"), so retrying sessions spread out,
+    - counts transient failures in a CircuitBreaker. After `failure_threshold` of them in a row the breaker opens and
+      calls fail fast with CircuitOpenError, or are served from a cache when the caller has one, until `reset_after`
+      seconds have passed. Then one trial call is let through, and closes the breaker if it succeeds.
+
+Errors that aren't transient (e.g. a unique constraint or a missing article) are raised unchanged and don't count
+towards opening the breaker.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict
+
+from oracledb.exceptions import DatabaseError, OperationalError
+
+# Error codes meaning the database is unreachable, slow or busy, rather than that the call itself was wrong
+TRANSIENT_CODES = {
+    'ORA-00054',  # resource busy
+    'ORA-00060',  # deadlock
+    'ORA-03113',  # end-of-file on communication channel
+    'ORA-03114',  # not connected
+    'ORA-03135',  # connection lost contact
+    'ORA-12170',  # connect timeout
+    'ORA-12541',  # no listener
+    'DPI-1067',   # call timeout (thick mode)
+    'DPI-1080',   # connection closed by the database
+    'DPY-4011',   # connection closed by the database
+    'DPY-4024',   # call timeout (thin mode)
+}
+
+_CODE = re.compile(r'\b(ORA|DPI|DPY)-\d{4,5}\b')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class CircuitOpenError(DatabaseError):
+    """Raised instead of calling the database while the circuit breaker is open."""
+
+
+def error_code(error: Exception) -> str:
+    """The Oracle error code of an error, e.g. 'ORA-03113', or '' if it has none."""
+    if error.args and hasattr(error.args[0], 'full_code'):
+        return error.args[0].full_code
+    match = _CODE.search(str(error))
+    return match.group(0) if match else ''
+
+
+def is_transient(error: Exception) -> bool:
+    return isinstance(error, OperationalError) or error_code(error) in TRANSIENT_CODES
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a trial call through once `reset_after` seconds have passed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30, clock: Callable[[], float] = time.monotonic):
+        """Initialize a new CircuitBreaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open the breaker. Defaults to 5.
+            reset_after (float, optional): Seconds the breaker stays open before a trial call. Defaults to 30.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if self._trial or self.clock() - self.opened_at >= self.reset_after:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go to the database now. While half open, only one trial call is allowed at a time."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.clock() - self.opened_at < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def release(self):
+        """End a trial call that never reached the database, so another call can be the trial."""
+        with self._lock:
+            self._trial = False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> bool:
+        """Record a failed call.
+
+        Returns:
+            bool: True if this failure opened the breaker.
+        """
+        with self._lock:
+            self.failures += 1
+            if self._trial:
+                # The trial call failed, so wait another reset_after
+                self._trial = False
+                self.opened_at = self.clock()
+                return False
+            if self.opened_at is None and self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                return True
+            return False
+
+
+class Resilience:
+    """Runs database calls with timeouts, retries and a circuit breaker. Shared by every NewsDB in a process."""
+
+    # kind of call -> call timeout in milliseconds
+    timeouts = {'read': 5000, 'write': 10000, 'report': 30000}
+
+    def __init__(self, breaker: CircuitBreaker = None, attempts: int = 3, base_delay: float = 0.05,
+                 max_delay: float = 1.0, timeouts: Dict[str, int] = None, rng: random.Random = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        """Initialize a new Resilience.
+
+        Args:
+            breaker (CircuitBreaker, optional): Defaults to a breaker with the default settings.
+            attempts (int, optional): Attempts at an idempotent read, including the first. Defaults to 3.
+            base_delay (float, optional): Upper bound of the delay before the first retry, in seconds. Doubles for
+                every retry after. Defaults to 0.05.
+            max_delay (float, optional): Upper bound of any delay, in seconds. Defaults to 1.
+            timeouts (dict, optional): Overrides of `timeouts`, in milliseconds. 0 means no timeout.
+            rng (random.Random, optional): Source of the jitter. Defaults to a new Random.
+            sleep (Callable, optional): Waits a number of seconds. Defaults to time.sleep.
+        """
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeouts = dict(self.timeouts, **(timeouts or {}))
+        self.rng = rng if rng is not None else random.Random()
+        self.sleep = sleep
+        self.metrics = Counter()
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._metrics_lock:
+            self.metrics[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts of calls, failures, retries, trips, rejected calls and fallbacks, and the breaker's state."""
+        with self._metrics_lock:
+            return dict(self.metrics, state=self.breaker.state)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt` (starting at 0)."""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def run(self, conn, call: Callable[[], Any], kind: str = 'read', idempotent: bool = True,
+            fallback: Callable[[], Any] = None) -> Any:
+        """Make a database call.
+
+        Args:
+            conn: The connection the call uses, whose call_timeout is set for the call.
+            call (Callable): Makes the call and returns its result.
+            kind (str, optional): One of the keys of `timeouts`. Defaults to 'read'.
+            idempotent (bool, optional): Whether the call may be retried. Writes must pass False, since a write
+                whose commit was lost on the way back may have been applied. Defaults to True.
+            fallback (Callable, optional): Returns a cached result to serve when the breaker is open or the call
+                failed with a transient error, or None if there is none.
+
+        Raises:
+            CircuitOpenError: If the breaker is open and there is no cached result.
+            DatabaseError: If the call failed and there is no cached result.
+
+        Returns:
+            Any: The result of the call, or of the fallback.
+        """
+        attempts = self.attempts if idempotent else 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count('rejected')
+                return self._fall_back(fallback, CircuitOpenError(
+                    f"Database unavailable after {self.breaker.failures} failed calls, retrying in "
+                    f"{self.breaker.reset_after:g}s"))
+
+            self._count('calls')
+            try:
+                result = self._with_timeout(conn, kind, call)
+            except DatabaseError as e:
+                if not is_transient(e):
+                    # The database answered, so it is healthy
+                    self.breaker.success()
+                    raise
+                self._count('failures')
+                if error_code(e) in ('DPI-1067', 'DPY-4024'):
+                    self._count('timeouts')
+                if self.breaker.failure():
+                    self._count('trips')
+                if attempt + 1 == attempts:
+                    return self._fall_back(fallback, e)
+                self._count('retries')
+                self.sleep(self.delay(attempt))
+            except Exception:
+                # Failed before or after reaching the database, which says nothing about its health
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.success()
+                return result
+
+    def _with_timeout(self, conn, kind: str, call: Callable[[], Any]) -> Any:
+        # Connections without call_timeout, like test fakes, are called as they are. The SQLite stand-in accepts it,
+        # but its calls are not interrupted.
+        if not hasattr(conn, 'call_timeout'):
+            return call()
+        previous = conn.call_timeout
+        conn.call_timeout = self.timeouts[kind]
+        try:
+            return call()
+        finally:
+            try:
+                conn.call_timeout = previous
+            except DatabaseError:
+                pass  # the connection is gone; keep the error of the call
+
+    def _fall_back(self, fallback: Callable[[], Any], error: DatabaseError) -> Any:
+        cached = fallback() if fallback is not None else None
+        if cached is None:
+            raise error
+        self._count('fallbacks')
+        return cached
@@ -0,0 +1,96 @@
+"""
+Routing reads to a read replica.
+
+Article listings, comments and reports are read from the replica when one is configured; everything else, and every
+write, uses the primary. A replica may lag behind the primary, so a user who has just written (e.g. commented) reads
+from the primary for a short while afterwards and sees their own change.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Union
+
+
+class ReadYourWrites:
+    """Remembers which users wrote recently. Shared by every connection pair in a process."""
+
+    def __init__(self, sticky_for: float = 5.0, clock: Callable[[], float] = time.time):
+        """Initialize a new ReadYourWrites.
+
+        Args:
+            sticky_for (float, optional): Seconds a user keeps reading from the primary after a write. This should be
+                longer than the replica's usual lag. Defaults to 5.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.time.
+        """
+        self.sticky_for = sticky_for
+        self.clock = clock
+        self._last_write: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def current_user(self) -> Union[int, None]:
+        """The user the current thread is acting for, if any."""
+        return getattr(self._local, 'userID', None)
+
+    @contextmanager
+    def acting_as(self, userID: Union[int, None]) -> Iterator[None]:
+        """Route the reads of this thread as reads by a user, for the duration of a with block."""
+        previous = self.current_user
+        self._local.userID = None if userID is None else int(userID)
+        try:
+            yield
+        finally:
+            self._local.userID = previous
+
+    def set_user(self, userID: Union[int, None]):
+        """Route the reads of this thread as reads by a user until changed, e.g. for the life of a CLI login."""
+        self._local.userID = None if userID is None else int(userID)
+
+    def wrote(self, userID: int):
+        with self._lock:
+            self._last_write[int(userID)] = self.clock()
+
+    def is_sticky(self, userID: Union[int, None]) -> bool:
+        """Whether a user wrote recently enough that the replica may not have their write yet."""
+        if userID is None:
+            return False
+        with self._lock:
+            last_write = self._last_write.get(int(userID))
+            if last_write is None:
+                return False
+            if self.clock() - last_write >= self.sticky_for:
+                del self._last_write[int(userID)]
+                return False
+            return True
+
+
+class ConnectionRouter:
+    """A primary connection and an optional replica connection, picking one for each read."""
+
+    def __init__(self, primary, replica=None, reads: ReadYourWrites = None):
+        """Initialize a new ConnectionRouter.
+
+        Args:
+            primary: Connection to the primary database. Used for all writes.
+            replica (optional): Connection to a read replica. Every read goes to the primary if not given.
+            reads (ReadYourWrites, optional): Tracks recent writes. Defaults to a private tracker.
+        """
+        self.primary = primary
+        self.replica = replica
+        self.reads = reads if reads is not None else ReadYourWrites()
+
+    def reader(self):
+        """The connection to read from for the current thread's user."""
+        if self.replica is None or self.reads.is_sticky(self.reads.current_user):
+            return self.primary
+        return self.replica
+
+    def wrote(self, userID: int):
+        """Record a write by a user, so their next reads see it."""
+        self.reads.wrote(userID)
+
+    def close(self):
+        if self.replica is not None:
+            self.replica.close()
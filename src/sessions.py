@@ -0,0 +1,169 @@
+"""
+Session tokens for logged in users.
+
+A session caches the user's record (including their role) so that authorization checks do not need to query
+the Users table again. Sessions expire after a fixed time to live and can optionally be persisted to a JSON file
+so they survive a restart.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Union
+
+from events import UserDeleted
+
+if TYPE_CHECKING:
+    from db import User
+    from events import EventBus
+
+
+class Session:
+    def __init__(self, token: str, user: 'User', expires_at: float):
+        self.token = token
+        self.user = user
+        self.expires_at = expires_at
+
+    def expired(self, now: float) -> bool:
+        return now >= self.expires_at
+
+    def to_json(self) -> dict:
+        # The password hash is deliberately left out of the session
+        registerDate = self.user.registerDate
+        return {'token': self.token,
+                'expires_at': self.expires_at,
+                'userID': self.user.userID,
+                'username': self.user.username,
+                'registerDate': registerDate.isoformat() if registerDate is not None else None,
+                'roleName': self.user.roleName}
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Session':
+        from db import User  # db imports this module
+
+        registerDate = data['registerDate']
+        user = User(data['userID'], data['username'], None,
+                    datetime.fromisoformat(registerDate) if registerDate is not None else None,
+                    data['roleName'])
+        return cls(data['token'], user, data['expires_at'])
+
+
+class SessionStore:
+    """In-memory store of active sessions with a time to live and optional file persistence."""
+
+    def __init__(self, ttl: float = 3600, path: Union[str, Path, None] = None, clock: Callable[[], float] = time.time):
+        """Initialize a new SessionStore.
+
+        Args:
+            ttl (float, optional): Seconds a session stays valid after it is issued. Defaults to one hour.
+            path (str | Path, optional): JSON file to persist sessions to. Sessions are only kept in memory if not given.
+            clock (Callable, optional): Source of the current time. Defaults to time.time.
+        """
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.clock = clock
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def issue(self, user: 'User') -> str:
+        """Start a new session for a user.
+
+        Args:
+            user (User): The user that logged in.
+
+        Returns:
+            str: The session token.
+        """
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = Session(token, user, self.clock() + self.ttl)
+            self._save()
+        return token
+
+    def get(self, token: str) -> Union['User', None]:
+        """Get the user for a session token.
+
+        Args:
+            token (str): The session token.
+
+        Returns:
+            User: The cached user, or None if the token is unknown or expired.
+        """
+        if token is None:
+            return None
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.expired(self.clock()):
+            self.revoke(token)
+            return None
+        return session.user
+
+    def revoke(self, token: str):
+        """End a session. Unknown tokens are ignored."""
+        with self._lock:
+            if self._sessions.pop(token, None) is not None:
+                self._save()
+
+    def subscribe(self, bus: 'EventBus'):
+        """End a user's sessions when the user is deleted."""
+        bus.subscribe(UserDeleted, self._user_deleted)
+
+    def _user_deleted(self, event: UserDeleted):
+        self.revoke_user(event.userID)
+
+    def revoke_user(self, userID: int):
+        """End every session belonging to a user, e.g. after they are deleted."""
+        with self._lock:
+            tokens = [token for token, session in self._sessions.items() if int(session.user.userID) == int(userID)]
+            for token in tokens:
+                del self._sessions[token]
+            if tokens:
+                self._save()
+
+    def purge_expired(self) -> int:
+        """Remove expired sessions.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        now = self.clock()
+        with self._lock:
+            expired = [token for token, session in self._sessions.items() if session.expired(now)]
+            for token in expired:
+                del self._sessions[token]
+            if expired:
+                self._save()
+        return len(expired)
+
+    def _save(self):
+        """Write all sessions to the persistence file. Must be called with the lock held."""
+        if self.path is None:
+            return
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        # The file holds live tokens, so only the owner may read it. A leftover temp file keeps its old mode.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(tmp_path, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump([session.to_json() for session in self._sessions.values()], f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        now = self.clock()
+        try:
+            with open(self.path, 'r') as f:
+                sessions = [Session.from_json(data) for data in json.load(f)]
+        except (OSError, ValueError, KeyError):
+            # A corrupt session file only logs everyone out
+            return
+        self._sessions = {session.token: session for session in sessions if not session.expired(now)}
@@ -0,0 +1,216 @@
+"""
+SQLite stand-in for the Oracle database, used for load tests and local development without an Oracle instance.
+
+`connect` returns a connection that behaves like an oracledb connection as far as this project uses it:
+cursors are context managers, binds can be passed as keyword arguments, errors are raised as oracledb
+exceptions, and the Oracle specific SQL in create_data.txt and queries.py is translated on the fly.
+"""
+
+import datetime as dt
+import functools
+import re
+import sqlite3
+from pathlib import Path
+from typing import Union
+
+from oracledb.exceptions import DatabaseError, IntegrityError
+
+ENGINE = 'sqlite'
+
+# (pattern, replacement) pairs turning the Oracle dialect used in this project into SQLite
+_TRANSLATIONS = [
+    (re.compile(r"extract\s*\(\s*year\s+from\s+([\w.]+)\s*\)", re.IGNORECASE), r"strftime('%Y', \1)"),
+    (re.compile(r"\b(SYSDATE|CURRENT_TIMESTAMP)\b", re.IGNORECASE), "oracle_now()"),
+    (re.compile(r"\bcascade\s+constraints\b", re.IGNORECASE), ""),
+    # Indexes of partitioned tables are partitioned the same way; SQLite has no partitions
+    (re.compile(r"\)\s+local\s*$", re.IGNORECASE), ")"),
+    # SQLite locks the whole database for a write transaction, so row locks are not needed
+    (re.compile(r"\bFOR\s+UPDATE\b", re.IGNORECASE), ""),
+    (re.compile(r"\bOFFSET\s+(\S+)\s+ROWS\s+FETCH\s+NEXT\s+(\S+)\s+ROWS\s+ONLY\b", re.IGNORECASE), r"LIMIT \2 OFFSET \1"),
+]
+
+# Oracle date format elements -> strftime directives
+_DATE_FORMATS = [('YYYY', '%Y'), ('MM', '%m'), ('DD', '%d'), ('HH24', '%H'), ('MI', '%M'), ('SS', '%S')]
+
+
+@functools.lru_cache(maxsize=512)
+def translate(sql: str) -> str:
+    """Translate an Oracle SQL statement into SQLite."""
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _format_datetime(value: dt.datetime) -> str:
+    return value.isoformat(sep=' ', timespec='microseconds' if value.microsecond else 'seconds')
+
+
+def _to_char(value, fmt: str = None):
+    if value is None:
+        return None
+    if fmt is not None:
+        for oracle, strftime in _DATE_FORMATS:
+            fmt = fmt.replace(oracle, strftime)
+        return dt.datetime.fromisoformat(value).strftime(fmt)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _to_date(value: str, fmt: str = 'YYYY-MM-DD HH24:MI:SS'):
+    if value is None:
+        return None
+    for oracle, strftime in _DATE_FORMATS:
+        fmt = fmt.replace(oracle, strftime)
+    return _format_datetime(dt.datetime.strptime(value, fmt))
+
+
+def _nvl(value, default):
+    return default if value is None else value
+
+
+def _now():
+    return _format_datetime(dt.datetime.now())
+
+
+def _parse_datetime(value: bytes) -> dt.datetime:
+    return dt.datetime.fromisoformat(value.decode())
+
+
+# Oracle DATE and TIMESTAMP columns both come back as datetime objects
+sqlite3.register_converter('date', _parse_datetime)
+sqlite3.register_converter('timestamp', _parse_datetime)
+sqlite3.register_adapter(dt.datetime, _format_datetime)
+sqlite3.register_adapter(dt.date, lambda value: value.isoformat() + ' 00:00:00')
+
+
+def _reraise(e: sqlite3.Error):
+    if isinstance(e, sqlite3.IntegrityError):
+        raise IntegrityError(str(e)) from e
+    raise DatabaseError(str(e)) from e
+
+
+class SQLiteCursor:
+
+    def __init__(self, conn: 'SQLiteConnection'):
+        self.connection = conn
+        self._cursor = conn._conn.cursor()
+        self.arraysize = 100
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, statement: str, parameters=None, **kwargs):
+        if parameters is None:
+            parameters = kwargs
+        try:
+            self._cursor.execute(translate(statement), parameters)
+        except sqlite3.Error as e:
+            _reraise(e)
+        return self if self._cursor.description is not None else None
+
+    def executemany(self, statement: str, parameters):
+        try:
+            self._cursor.executemany(translate(statement), parameters)
+        except sqlite3.Error as e:
+            _reraise(e)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = None):
+        return self._cursor.fetchmany(size or self.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+
+    engine = ENGINE
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        # Accepted for compatibility with oracledb. SQLite calls are not interrupted.
+        self.call_timeout = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(path: Union[str, Path] = ':memory:') -> SQLiteConnection:
+    """Open a SQLite database that can be used in place of an Oracle connection.
+
+    Args:
+        path (str | Path, optional): Database file. Defaults to an in-memory database.
+
+    Returns:
+        SQLiteConnection: The connection.
+    """
+    conn = sqlite3.connect(str(path), detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, timeout=30)
+    conn.create_function('to_char', 1, _to_char, deterministic=True)
+    conn.create_function('to_char', 2, _to_char, deterministic=True)
+    conn.create_function('to_date', 2, _to_date, deterministic=True)
+    conn.create_function('to_timestamp', 2, _to_date, deterministic=True)
+    conn.create_function('nvl', 2, _nvl, deterministic=True)
+    conn.create_function('oracle_now', 0, _now)
+    conn.execute("CREATE TEMP VIEW IF NOT EXISTS dual AS SELECT 'X' AS dummy")
+    if str(path) != ':memory:':
+        conn.execute("PRAGMA journal_mode=WAL")
+    return SQLiteConnection(conn)
+
+
+def connect_copy(path: Union[str, Path]) -> SQLiteConnection:
+    """Open an in-memory copy of a database file, e.g. a seeded template that tests can then change freely.
+
+    The copy is made page by page with SQLite's backup API, which is much faster than replaying the SQL that
+    built the template.
+
+    Args:
+        path (str | Path): Database file to copy.
+
+    Returns:
+        SQLiteConnection: A connection to the copy. Changes never reach the file.
+    """
+    conn = connect()
+    source = sqlite3.connect(str(path))
+    try:
+        source.backup(conn._conn)
+    finally:
+        source.close()
+    return conn
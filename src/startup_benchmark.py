@@ -0,0 +1,109 @@
+"""
+Measure how long the application takes to get to its first prompt.
+
+Each measurement runs in a fresh interpreter, so module imports and driver initialization are counted the way a user
+sees them. Compares:
+    - importing main.py, which defers rich, the article viewer, reports and batch mode, against importing all of them
+      up front as main.py used to
+    - the schema version check NewsDB.verify() runs at startup against the full table probe (verify(full=True)),
+      on a SQLite stand-in database
+    - with --oracle, connecting in thin mode against initializing the thick client first (needs the .env settings
+      and, for thick mode, the Oracle client libraries)
+
+Usage:
+    python3 src/startup_benchmark.py --runs 10 [--oracle]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+SRC = Path(__file__).resolve().parent
+
+# Code run in a fresh interpreter for each case. Each prints the seconds it took.
+CASES = {
+    'import main (lazy)': "import main",
+    'import main + rich modules (eager)': "import main, article_view, generate_report, batch",
+    'verify: schema version': """
+import sqlite_db
+from db import NewsDB
+from db_util import create_data
+conn = sqlite_db.connect(); create_data(conn, output=False); db = NewsDB(conn)
+start = time.perf_counter()
+for _ in range(100): db.verify()
+print((time.perf_counter() - start) / 100)
+""",
+    'verify: full table probe': """
+import sqlite_db
+from db import NewsDB
+from db_util import create_data
+conn = sqlite_db.connect(); create_data(conn, output=False); db = NewsDB(conn)
+start = time.perf_counter()
+for _ in range(100): db.verify(full=True)
+print((time.perf_counter() - start) / 100)
+""",
+}
+
+ORACLE_CASES = {
+    'connect: thin mode': """
+import oracledb
+from dotenv import load_dotenv
+from db_pool import oracle_connector
+load_dotenv()
+start = time.perf_counter()
+oracle_connector()().close()
+print(time.perf_counter() - start)
+""",
+    'connect: thick mode': """
+import oracledb
+from dotenv import load_dotenv
+from db_pool import oracle_connector
+load_dotenv()
+start = time.perf_counter()
+oracledb.init_oracle_client()
+oracle_connector()().close()
+print(time.perf_counter() - start)
+""",
+}
+
+
+def run_case(code: str) -> float:
+    """Run code in a fresh interpreter. Returns the time it printed, or the wall time of the whole run otherwise."""
+    script = f"import sys, time\nsys.path.insert(0, {str(SRC)!r})\n{code}"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=SRC.parent)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    output = result.stdout.strip()
+    return float(output.splitlines()[-1]) if output else elapsed
+
+
+def benchmark(cases: dict, runs: int) -> List[tuple]:
+    results = []
+    for name, code in cases.items():
+        try:
+            times = [run_case(code) for _ in range(runs)]
+            results.append((name, statistics.median(times), min(times)))
+        except RuntimeError as e:
+            results.append((name, None, str(e)))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure application startup time.')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per case. Defaults to 10.')
+    parser.add_argument('--oracle', action='store_true', help='Also compare thin and thick mode connections.')
+    args = parser.parse_args()
+
+    cases = dict(CASES, **(ORACLE_CASES if args.oracle else {}))
+    print(f"{'case':<40} {'median':>10} {'best':>10}")
+    for name, median, best in benchmark(cases, args.runs):
+        if median is None:
+            print(f"{name:<40} skipped: {best}")
+        else:
+            print(f"{name:<40} {median * 1000:>8.2f}ms {best * 1000:>8.2f}ms")
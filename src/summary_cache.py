@@ -0,0 +1,80 @@
+"""
+Memoized tag and category summaries.
+
+The summaries only change when tags are added to or removed from articles, yet every user asking for them would
+otherwise rerun the report query and rebuild the table. Entries are keyed by a data version that is bumped by
+ArticleTagsChanged events, so a cached entry is never served after a change made through this process. Changes made
+by other processes (e.g. bulk loads) show up once an entry reaches `max_age`.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from events import ArticleTagsChanged, EventBus
+
+
+class SummaryCache:
+    """Values computed from tag data, such as report rows and rendered tables. Shared by every NewsDB in a process."""
+
+    def __init__(self, max_age: float = 300, clock: Callable[[], float] = time.monotonic):
+        """Initialize a new SummaryCache.
+
+        Args:
+            max_age (float, optional): Seconds an entry is served for at most, to pick up changes made by other
+                processes. Defaults to 5 minutes.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        """
+        self.max_age = max_age
+        self.clock = clock
+        self.version = 0
+        # key -> (data version, time computed, value)
+        self._entries: Dict[Hashable, Tuple[int, float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def subscribe(self, bus: EventBus):
+        """Bump the data version whenever an article's tags change."""
+        bus.subscribe(ArticleTagsChanged, self._tags_changed)
+
+    def _tags_changed(self, event: ArticleTagsChanged):
+        self.bump()
+
+    def bump(self):
+        """Start a new data version. Every entry computed before is dropped."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Get the value for a key, computing and storing it if it is missing, stale or from an older data version.
+
+        Args:
+            key (Hashable): What the value is, e.g. ('rows', 'tag_summary').
+            compute (Callable): Computes the value. Called without the lock held, so concurrent misses may both compute.
+
+        Returns:
+            Any: The value.
+        """
+        now = self.clock()
+        with self._lock:
+            version = self.version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and now - entry[1] < self.max_age:
+                return entry[2]
+
+        value = compute()
+        with self._lock:
+            # A value computed while the data changed may already be stale, so it is not kept
+            if self.version == version:
+                self._entries[key] = (version, now, value)
+        return value
+
+    def stale(self, key: Hashable) -> Any:
+        """The last value stored for a key in the current data version, however old, or None. Served while the
+        database is unavailable."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[2] if entry is not None and entry[0] == self.version else None
@@ -0,0 +1,173 @@
+"""
+Trending articles, ranked by exponentially time-decayed view and comment counts.
+
+An event of weight w at time t contributes w * 2^(-(now - t) / half_life) to its article's score. Scores are kept as
+log(sum(w * e^(rate * t))), which grows with each event but never has to be decayed: every score shares the same
+e^(-rate * now) factor, so the ranking only changes when an event arrives. Recording an event is one push onto a heap
+(O(log n)); entries that an article's newer score replaced are skipped and cleared out lazily. Events arrive from
+the NewsDB event bus after they are committed.
+"""
+
+import datetime as dt
+import heapq
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Tuple, Union
+
+from events import ArticleDeleted, ArticleViewed, CommentAdded, EventBus
+from queries import RECENT_COMMENT_TIMES, RECENT_VIEW_TIMES
+
+
+def log_add_exp(a: float, b: float) -> float:
+    """log(e^a + e^b) without overflowing."""
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TrendingScores:
+    """Incrementally maintained trending scores, shared by every NewsDB in a process."""
+
+    def __init__(self, half_life: float = 6 * 3600, view_weight: float = 1.0, comment_weight: float = 3.0,
+                 clock: Callable[[], float] = time.time):
+        """Initialize a new TrendingScores.
+
+        Args:
+            half_life (float, optional): Seconds after which an event counts half as much. Defaults to 6 hours.
+            view_weight (float, optional): Weight of a view. Defaults to 1.
+            comment_weight (float, optional): Weight of a comment. Defaults to 3.
+            clock (Callable, optional): Returns the current time in seconds. Defaults to time.time.
+        """
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.view_weight = view_weight
+        self.comment_weight = comment_weight
+        self.clock = clock
+        # Exponents are taken relative to this, so they stay small for a long running process
+        self.epoch = clock()
+
+        self._log_scores: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []  # (-log score, articleID), possibly stale
+        self._lock = threading.Lock()
+        self._warm = False
+        self._warm_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._log_scores)
+
+    def record(self, articleID: int, weight: float, at: Union[float, dt.datetime, None] = None):
+        """Add an event to an article's score.
+
+        Args:
+            articleID (int): The article.
+            weight (float): The event's weight at the time it happened.
+            at (float | datetime, optional): When it happened, as a timestamp or datetime. Defaults to now.
+        """
+        if at is None:
+            at = self.clock()
+        elif isinstance(at, dt.datetime):
+            at = at.timestamp()
+        term = math.log(weight) + self.rate * (at - self.epoch)
+
+        with self._lock:
+            old = self._log_scores.get(articleID)
+            new = term if old is None else log_add_exp(old, term)
+            self._log_scores[articleID] = new
+            heapq.heappush(self._heap, (-new, articleID))
+            if len(self._heap) > 2 * len(self._log_scores) + 64:
+                self._compact()
+
+    def record_view(self, articleID: int, at=None):
+        self.record(articleID, self.view_weight, at)
+
+    def record_comment(self, articleID: int, at=None):
+        self.record(articleID, self.comment_weight, at)
+
+    def subscribe(self, bus: EventBus):
+        """Score views and comments as they are committed, at the time they happened, and drop deleted articles."""
+        bus.subscribe(ArticleViewed, self._article_viewed)
+        bus.subscribe(CommentAdded, self._comment_added)
+        bus.subscribe(ArticleDeleted, self._article_deleted)
+
+    def _article_viewed(self, event: ArticleViewed):
+        self.record_view(event.articleID, event.at)
+
+    def _comment_added(self, event: CommentAdded):
+        self.record_comment(event.articleID, event.at)
+
+    def _article_deleted(self, event: ArticleDeleted):
+        self.forget(event.articleID)
+
+    def forget(self, articleID: int):
+        """Drop an article, e.g. after it was deleted. Its heap entries become stale."""
+        with self._lock:
+            self._log_scores.pop(articleID, None)
+
+    def score(self, articleID: int, now: float = None) -> float:
+        """The current decayed score of an article, 0 if it has no events."""
+        log_score = self._log_scores.get(articleID)
+        if log_score is None:
+            return 0.0
+        now = self.clock() if now is None else now
+        return math.exp(log_score - self.rate * (now - self.epoch))
+
+    def top(self, k: int = 10) -> List[Tuple[int, float]]:
+        """Get the highest scoring articles.
+
+        Args:
+            k (int, optional): Number of articles. Defaults to 10.
+
+        Returns:
+            List[Tuple[int, float]]: (articleID, current score) pairs, highest first.
+        """
+        now = self.clock()
+        with self._lock:
+            found = []
+            while self._heap and len(found) < k:
+                entry = heapq.heappop(self._heap)
+                if self._log_scores.get(entry[1]) == -entry[0]:
+                    found.append(entry)
+            for entry in found:
+                heapq.heappush(self._heap, entry)
+
+        decay = self.rate * (now - self.epoch)
+        return [(articleID, math.exp(-neg_log_score - decay)) for neg_log_score, articleID in found]
+
+    def _compact(self):
+        """Rebuild the heap from the current scores only."""
+        self._heap = [(-log_score, articleID) for articleID, log_score in self._log_scores.items()]
+        heapq.heapify(self._heap)
+
+    def ensure_warm(self, conn):
+        """Warm start once, the first time the scores are needed rather than when the process starts. Tried again
+        next time if it fails."""
+        if self._warm:
+            return
+        with self._warm_lock:
+            if not self._warm:
+                self.warm_start(conn)
+                self._warm = True
+
+    def warm_start(self, conn, half_lives: float = 8):
+        """Seed the scores from recent views and comments.
+
+        Events older than `half_lives` half lives would add less than 2^-half_lives each, so they are not read.
+        Events since the scores were created have come in through the event bus, so they are not read either.
+
+        Args:
+            conn: The database connection.
+            half_lives (float, optional): How far back to read. Defaults to 8.
+
+        Returns:
+            int: The number of events read.
+        """
+        since = dt.datetime.fromtimestamp(self.epoch - half_lives * self.half_life)
+        until = dt.datetime.fromtimestamp(self.epoch)
+        count = 0
+        with conn.cursor() as cursor:
+            for query, weight in ((RECENT_VIEW_TIMES, self.view_weight), (RECENT_COMMENT_TIMES, self.comment_weight)):
+                cursor.execute(query, since=since, until=until)
+                for articleID, at, repeats in cursor:
+                    self.record(articleID, weight * repeats, at)
+                    count += repeats
+        return count
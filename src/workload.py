@@ -0,0 +1,320 @@
+"""
+Synthetic workload: generate realistic data at scale, and replay a realistic mix of calls against it.
+
+Article popularity and user activity follow Zipf distributions (a few articles get most of the views, a few users do
+most of the viewing), and views and comments arrive soon after an article is published and tail off after that.
+Generated rows are written with array inserts, in batches.
+
+The replay drives NewsDB directly from concurrent workers sharing a NewsDBPool, the way the API server does, and
+reports throughput and latency percentiles per call.
+
+Usage:
+    python3 src/workload.py --sqlite news.sqlite3 --generate --articles 5000 --users 2000 --views 500000
+    python3 src/workload.py --sqlite news.sqlite3 --replay --workers 16 --duration 30
+"""
+
+import argparse
+import bisect
+import datetime as dt
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Sequence
+
+from load_test import print_results, summarize
+from passwords import hash_password
+from queries import (ALL_USER_IDS, ARTICLES_BY_POPULARITY, HIGHEST_IDS, INSERT_ARTICLE, INSERT_ARTICLE_TAG,
+                     INSERT_CATEGORY, INSERT_COMMENT, INSERT_COMMENT_COUNTS, INSERT_TAG, INSERT_USER, INSERT_VIEW)
+
+# Password of every generated user
+SYNTHETIC_PASSWORD = 'password'
+
+# (weight, operation) pairs replayed against NewsDB
+OPERATION_MIX = [
+    (45, 'get'),
+    (10, 'get_all'),
+    (30, 'add_view'),
+    (10, 'add_comment'),
+    (5, 'report'),
+]
+
+_WORDS = ("market election recipe quantum senate startup climate league budget vaccine harvest court festival "
+          "satellite border pasta summit rally chip treaty storm museum olive protest merger orbit").split()
+
+_COMMENTS = ["Great article", "I don't agree with you", "Thanks for sharing", "This could be disastrous",
+             "Can you cite a source?", "Finally someone said it", "Interesting read", "Not convinced"]
+
+
+class ZipfSampler:
+    """Draws ranks 0..n-1, where rank k is drawn with probability proportional to 1 / (k + 1) ** s."""
+
+    def __init__(self, n: int, s: float = 1.1, rng: random.Random = None):
+        self.rng = rng or random.Random()
+        self._cumulative = list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+    def __call__(self) -> int:
+        return bisect.bisect(self._cumulative, self.rng.random() * self._cumulative[-1])
+
+    def choice(self, items: Sequence):
+        """Draw from items, which should be ordered most popular first."""
+        return items[self()]
+
+
+def _executemany(cursor, statement: str, rows: List[dict], batch_size: int) -> int:
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(statement, rows[start:start + batch_size])
+    return len(rows)
+
+
+def _after(rng: random.Random, start: dt.datetime, end: dt.datetime, mean_days: float) -> dt.datetime:
+    """A time after start, usually within a few mean_days of it, and never after end."""
+    span = (end - start).total_seconds()
+    offset = rng.expovariate(1 / (mean_days * 86400))
+    if offset > span:
+        offset = rng.random() * span
+    return (start + dt.timedelta(seconds=offset)).replace(microsecond=0)
+
+
+def generate(conn, articles: int = 1000, users: int = 500, categories: int = 8, tags_per_category: int = 10,
+             views: int = 100_000, comments: int = 5_000, days: int = 90, zipf_s: float = 1.1, seed: int = 0,
+             now: dt.datetime = None, batch_size: int = 5000, output: bool = True) -> Dict[str, int]:
+    """Add synthetic categories, tags, users, articles, views and comments to a database.
+
+    IDs continue from the highest ones already there, so this can be run against the seed data or run more than once.
+
+    Args:
+        conn: The database connection.
+        articles (int, optional): Articles to add. Defaults to 1000.
+        users (int, optional): Users to add. Their password is SYNTHETIC_PASSWORD. Defaults to 500.
+        categories (int, optional): Categories to add. Defaults to 8.
+        tags_per_category (int, optional): Tags in each new category. Defaults to 10.
+        views (int, optional): Views to add, spread over the new articles and users. Defaults to 100,000.
+        comments (int, optional): Comments to add. Defaults to 5,000.
+        days (int, optional): Articles are published over this many days before now. Defaults to 90.
+        zipf_s (float, optional): Skew of article popularity and user activity. Defaults to 1.1.
+        seed (int, optional): Random seed, so the same arguments always generate the same data. Defaults to 0.
+        now (datetime, optional): End of the generated timeline. Defaults to the current time.
+        batch_size (int, optional): Rows per array insert. Defaults to 5000.
+        output (bool, optional): Print progress. Defaults to True.
+
+    Returns:
+        Dict[str, int]: Rows added to each table.
+    """
+    rng = random.Random(seed)
+    now = (now or dt.datetime.now()).replace(microsecond=0)
+    start = now - dt.timedelta(days=days)
+
+    with conn.cursor() as cursor:
+        cursor.execute(HIGHEST_IDS)
+        last_article, last_user, last_tag, last_comment, category_count = (int(value) for value in cursor.fetchone())
+
+    category_rows = [{'catName': f"category {category_count + i}", 'description': f"Synthetic category {category_count + i}"}
+                     for i in range(categories)]
+    tag_rows = []
+    for category in category_rows:
+        for _ in range(tags_per_category):
+            tagID = last_tag + 1 + len(tag_rows)
+            tag_rows.append({'tagID': tagID, 'tagName': f"{rng.choice(_WORDS)} {tagID}", 'catName': category['catName']})
+
+    # Hashing is deliberately slow, so every generated user shares one hash
+    password = hash_password(SYNTHETIC_PASSWORD)
+    user_ids = [last_user + 1 + i for i in range(users)]
+    user_rows = [{'userID': userID, 'username': f"user{userID}", 'password': password,
+                  'registerDate': _after(rng, start - dt.timedelta(days=days), now, days)}
+                 for userID in user_ids]
+
+    article_ids = [last_article + 1 + i for i in range(articles)]
+    published = {articleID: start + dt.timedelta(seconds=rng.random() * days * 86400) for articleID in article_ids}
+    article_rows, article_tag_rows = [], []
+    for articleID in article_ids:
+        # An article's tags come from a single category
+        catName = rng.choice(category_rows)['catName'] if category_rows else None
+        category_tags = [tag for tag in tag_rows if tag['catName'] == catName]
+        article_tags = rng.sample(category_tags, min(len(category_tags), rng.randint(1, 3)))
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(40, 200))]
+        article_rows.append({'articleID': articleID,
+                             'title': f"{' '.join(words[:6]).capitalize()} ({articleID})",
+                             'author': f"Author {rng.randint(1, max(1, articles // 20))}",
+                             'publishDate': published[articleID].replace(microsecond=0),
+                             'content': ' '.join(words).capitalize() + '.'})
+        article_tag_rows += [{'articleID': articleID, 'tagID': tag['tagID']} for tag in article_tags]
+
+    # Popularity rank is independent of ID and publish date
+    by_popularity = rng.sample(article_ids, len(article_ids))
+    by_activity = rng.sample(user_ids, len(user_ids))
+    pick_article = ZipfSampler(len(by_popularity), zipf_s, rng)
+    pick_user = ZipfSampler(len(by_activity), zipf_s * 0.8, rng)
+
+    view_rows = []
+    for _ in range(views if article_ids and user_ids else 0):
+        articleID = pick_article.choice(by_popularity)
+        view_rows.append({'articleID': articleID, 'userID': pick_user.choice(by_activity),
+                          'viewedAt': _after(rng, published[articleID], now, 2), 'viewCount': 1})
+
+    comment_rows = []
+    for i in range(comments if article_ids and user_ids else 0):
+        articleID = pick_article.choice(by_popularity)
+        comment_rows.append({'commentID': last_comment + 1 + i, 'articleID': articleID,
+                             'userID': pick_user.choice(by_activity),
+                             'commentDate': _after(rng, published[articleID], now, 3),
+                             'content': rng.choice(_COMMENTS)})
+    comment_counts = Counter(row['articleID'] for row in comment_rows)
+
+    counts = {}
+    with conn.cursor() as cursor:
+        for table, statement, rows in [
+            ('Categories', INSERT_CATEGORY, category_rows),
+            ('Tags', INSERT_TAG, tag_rows),
+            ('Users', INSERT_USER, user_rows),
+            ('Articles', INSERT_ARTICLE, article_rows),
+            ('ArticleTags', INSERT_ARTICLE_TAG, article_tag_rows),
+            ('ArticleViews', INSERT_VIEW, view_rows),
+            ('Comments', INSERT_COMMENT, comment_rows),
+            ('ArticleCommentCounts', INSERT_COMMENT_COUNTS,
+             [{'articleID': articleID, 'commentCount': count} for articleID, count in comment_counts.items()]),
+        ]:
+            began = time.perf_counter()
+            counts[table] = _executemany(cursor, statement, rows, batch_size)
+            if output:
+                print(f"{table:22} {counts[table]:>9} rows in {time.perf_counter() - began:.2f}s")
+    conn.commit()
+    return counts
+
+
+class ReplayWorker(threading.Thread):
+
+    def __init__(self, pool, article_ids: List[int], user_ids: List[int], deadline: float, seed: int,
+                 zipf_s: float = 1.1, report_year: str = None):
+        super().__init__(daemon=True)
+        self.pool = pool
+        self.article_ids = article_ids
+        self.user_ids = user_ids
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.pick_article = ZipfSampler(len(article_ids), zipf_s, self.random)
+        self.pick_user = ZipfSampler(len(user_ids), zipf_s * 0.8, self.random)
+        self.report_year = report_year or str(dt.datetime.now().year)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, db, operation: str):
+        if operation == 'get':
+            db.articles.get(self.pick_article.choice(self.article_ids))
+        elif operation == 'get_all':
+            db.articles.get_all()
+        elif operation == 'add_view':
+            db.articles.add_view(self.pick_article.choice(self.article_ids), self.pick_user.choice(self.user_ids))
+        elif operation == 'add_comment':
+            db.articles.add_comment(self.pick_article.choice(self.article_ids), self.pick_user.choice(self.user_ids),
+                                    self.random.choice(_COMMENTS))
+        elif operation == 'report':
+            from generate_report import ReportGenerator
+
+            name = self.random.choice(sorted(ReportGenerator.reports))
+            ReportGenerator(db).report_rows(name, self.report_year if name in ReportGenerator.admin_reports else None)
+
+    def run(self):
+        weights = [weight for weight, _ in OPERATION_MIX]
+        while time.perf_counter() < self.deadline:
+            operation = self.random.choices(OPERATION_MIX, weights)[0][1]
+            start = time.perf_counter()
+            try:
+                with self.pool.acquire() as db:
+                    self.call(db, operation)
+            except Exception:
+                # Counted rather than ending the worker, so the throughput reported covers every worker
+                self.errors[operation] += 1
+            self.latencies[operation].append(time.perf_counter() - start)
+
+
+def replay(connect: Callable, workers: int = 8, duration: float = 10.0, zipf_s: float = 1.1, seed: int = 0,
+           report_year: str = None) -> dict:
+    """Replay the operation mix against a database from concurrent workers.
+
+    Args:
+        connect (Callable): Opens a new database connection. Each worker gets one from a shared pool.
+        workers (int, optional): Concurrent workers. Defaults to 8.
+        duration (float, optional): Seconds to run for. Defaults to 10.
+        zipf_s (float, optional): Skew of which articles and users are picked. Defaults to 1.1.
+        seed (int, optional): Random seed. Defaults to 0.
+        report_year (str, optional): Year admin reports are run for. Defaults to the current year.
+
+    Returns:
+        dict: Per operation call counts, errors and latency percentiles in milliseconds, plus totals, in the same
+            form as load_test.run_load_test.
+    """
+    from db_pool import NewsDBPool
+
+    pool = NewsDBPool(connect, size=workers)
+    try:
+        with pool.acquire() as db:
+            with db.conn.cursor() as cursor:
+                cursor.execute(ARTICLES_BY_POPULARITY)
+                article_ids = [row[0] for row in cursor.fetchall()]
+                cursor.execute(ALL_USER_IDS)
+                user_ids = [row[0] for row in cursor.fetchall()]
+
+        deadline = time.perf_counter() + duration
+        threads = [ReplayWorker(pool, article_ids, user_ids, deadline, seed + i, zipf_s, report_year)
+                   for i in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    return summarize(threads, elapsed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic workload and replay it against the database.')
+    parser.add_argument('--generate', action='store_true', help='Add synthetic data.')
+    parser.add_argument('--replay', action='store_true', help='Replay the operation mix and report latencies.')
+    parser.add_argument('--articles', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--categories', type=int, default=8)
+    parser.add_argument('--tags-per-category', type=int, default=10)
+    parser.add_argument('--views', type=int, default=100_000)
+    parser.add_argument('--comments', type=int, default=5_000)
+    parser.add_argument('--days', type=int, default=90, help='Days the generated timeline covers.')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Popularity skew. Defaults to 1.1.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent replay workers.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to replay for.')
+    parser.add_argument('--sqlite', metavar='PATH', help='Use a SQLite database file instead of Oracle. Created if needed.')
+    parser.add_argument('--json', action='store_true', help='Print replay results as JSON.')
+    args = parser.parse_args()
+    if not (args.generate or args.replay):
+        parser.error("Must specify --generate and/or --replay")
+
+    if args.sqlite:
+        import sqlite_db
+        from db_util import SCHEMA_VERSION, applied_migrations, create_data
+
+        connect = lambda: sqlite_db.connect(args.sqlite)
+        with connect() as conn:
+            if SCHEMA_VERSION not in applied_migrations(conn):
+                create_data(conn, output=False)
+    else:
+        from dotenv import load_dotenv
+
+        from db_pool import init_oracle_mode, oracle_connector
+
+        load_dotenv()  # load environment from .env file
+        init_oracle_mode()
+        connect = oracle_connector()
+
+    if args.generate:
+        with connect() as conn:
+            generate(conn, args.articles, args.users, args.categories, args.tags_per_category, args.views,
+                     args.comments, args.days, args.zipf, args.seed)
+    if args.replay:
+        results = replay(connect, args.workers, args.duration, args.zipf, args.seed)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_results(results)
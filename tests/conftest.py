@@ -0,0 +1,100 @@
+"""
+Shared fixtures giving each test class its own seeded database, so the suite can run in parallel with pytest-xdist
+(`pytest -n auto`).
+
+TEST_DB_ENGINE picks the database:
+    sqlite (default)  The seed data is loaded once per worker into a template file. Each test class gets an in-memory
+                      copy of it, so classes never see each other's changes and no Oracle instance is needed.
+    oracle            Uses the .env settings. Under xdist each worker needs a schema of its own, given by
+                      DB_USER_<WORKER>/DB_PASS_<WORKER> (e.g. DB_USER_GW0), and rebuilds it for every test class.
+
+`news_db` gives a test class a shared NewsDB. Tests that need a NewsDB of their own (e.g. with a fake clock) use
+`seeded_conn`, a fresh connection per test. Tests on SQLite files copy `seed_template`.
+"""
+
+# Standard library imports
+import os
+import sys
+
+# Third party imports
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from db_util import create_data, drop_data
+import sqlite_db
+
+
+def db_engine() -> str:
+    return os.getenv('TEST_DB_ENGINE', 'sqlite').lower()
+
+
+def worker_id() -> str:
+    """Name of the pytest-xdist worker running this process, or 'master' when not running in parallel."""
+    return os.getenv('PYTEST_XDIST_WORKER', 'master')
+
+
+def connect_oracle():
+    """Open a connection to this worker's Oracle schema."""
+    from dotenv import load_dotenv
+
+    from db_pool import init_oracle_mode, oracle_connector
+
+    load_dotenv()  # load environment from .env file
+    init_oracle_mode()
+    worker = worker_id().upper()
+    if worker != 'MASTER':
+        if not os.getenv(f'DB_USER_{worker}'):
+            pytest.exit(f"TEST_DB_ENGINE=oracle with xdist needs DB_USER_{worker} and DB_PASS_{worker} "
+                        "so workers don't share a schema", returncode=4)
+        os.environ['DB_USER'] = os.environ[f'DB_USER_{worker}']
+        os.environ['DB_PASS'] = os.getenv(f'DB_PASS_{worker}', '')
+    return oracle_connector()()
+
+
+@pytest.fixture(scope='session')
+def seed_template(tmp_path_factory):
+    """Path of a SQLite database holding the seed data, built once per worker."""
+    path = tmp_path_factory.mktemp('seed') / 'news.sqlite3'
+    with sqlite_db.connect(path) as conn:
+        create_data(conn, output=False)
+    return path
+
+
+def seeded_connection(request):
+    """Open a connection to freshly seeded data: an in-memory copy of the template, or this worker's Oracle schema
+    rebuilt."""
+    if db_engine() == 'oracle':
+        conn = connect_oracle()
+        drop_data(conn, output=False)
+        create_data(conn, output=False)
+        return conn
+    return sqlite_db.connect_copy(request.getfixturevalue('seed_template'))
+
+
+def close_seeded(conn):
+    if db_engine() == 'oracle':
+        drop_data(conn, output=False)
+    conn.close()
+
+
+@pytest.fixture(scope='class')
+def news_db(request):
+    """A NewsDB over freshly seeded data, shared by the tests of one class and set as its `db_interface`."""
+    conn = seeded_connection(request)
+    db = NewsDB(conn)
+    if request.cls is not None:
+        request.cls.db_interface = db
+    yield db
+    close_seeded(conn)
+
+
+@pytest.fixture
+def seeded_conn(request):
+    """A connection to freshly seeded data for one test, for tests that build their own NewsDB around it."""
+    conn = seeded_connection(request)
+    yield conn
+    close_seeded(conn)
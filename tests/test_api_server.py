@@ -0,0 +1,138 @@
+"""
+Tests for the HTTP JSON API, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import http.client
+import json
+import sys
+from urllib.parse import urlsplit
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from api_server import NewsAPIHandler, article_last_modified
+from db import Article
+from load_test import local_server
+
+
+def test_last_modified_follows_updates():
+    article = Article(1, 'Title', 'Author', dt.datetime(2022, 1, 1), 'Content', tags=[])
+    assert article_last_modified(article) == 'Sat, 01 Jan 2022 00:00:00 GMT'
+    article.updatedAt = dt.datetime(2023, 3, 4, 5, 6, 7)
+    assert article_last_modified(article) == 'Sat, 04 Mar 2023 05:06:07 GMT'
+
+
+class TestAPIServer:
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = local_server(pool_size=2)
+        url = urlsplit(cls.server.__enter__())
+        cls.host, cls.port = url.hostname, url.port
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.__exit__(None, None, None)
+
+    def request(self, method, path, body=None, token=None, headers=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        conn.close()
+        return response, json.loads(payload) if payload else None
+
+    def login(self, username='bob', password='123'):
+        response, body = self.request('POST', '/login', {'username': username, 'password': password})
+        assert response.status == 200
+        return body['token']
+
+    def test_login_required(self):
+        response, _ = self.request('GET', '/articles')
+        assert response.status == 401
+        response, _ = self.request('POST', '/login', {'username': 'bob', 'password': 'wrong'})
+        assert response.status == 401
+
+    def test_articles(self):
+        token = self.login()
+        response, articles = self.request('GET', '/articles', token=token)
+        assert response.status == 200
+        assert len(articles) == 3
+
+        response, articles = self.request('GET', '/articles?category=politics', token=token)
+        assert [a['articleID'] for a in articles] == [1]
+
+        response, _ = self.request('GET', '/articles/99', token=token)
+        assert response.status == 404
+
+    def test_article_conditional_get(self):
+        """A matching ETag or a later If-Modified-Since should give 304 Not Modified."""
+        token = self.login()
+        response, article = self.request('GET', '/articles/1', token=token)
+        assert response.status == 200
+        assert article['title'] == 'President of Venezuela resigns'
+        etag = response.getheader('ETag')
+        last_modified = response.getheader('Last-Modified')
+        assert etag and last_modified
+
+        response, body = self.request('GET', '/articles/1', token=token, headers={'If-None-Match': etag})
+        assert response.status == 304
+        assert body is None
+
+        response, _ = self.request('GET', '/articles/1', token=token, headers={'If-Modified-Since': last_modified})
+        assert response.status == 304
+
+        response, _ = self.request('GET', '/articles/1', token=token, headers={'If-None-Match': '"stale"'})
+        assert response.status == 200
+
+    def test_comments_and_views(self):
+        token = self.login()
+        response, body = self.request('POST', '/articles/2/comments', {'content': 'Nice'}, token=token)
+        assert response.status == 201
+        response, page = self.request('GET', '/articles/2/comments?page_size=100', token=token)
+        assert body['commentID'] in [c['commentID'] for c in page['comments']]
+        assert page['total'] == len(page['comments'])
+        assert page['next_cursor'] is None
+
+        response, first = self.request('GET', '/articles/2/comments?page_size=1', token=token)
+        response, second = self.request('GET', f"/articles/2/comments?page_size=1&cursor={first['next_cursor']}", token=token)
+        assert [c['commentID'] for c in first['comments'] + second['comments']] == [c['commentID'] for c in page['comments'][:2]]
+
+        response, _ = self.request('POST', '/articles/2/views', token=token)
+        assert response.status == 201
+
+    def test_reports(self):
+        """Admin reports should only be available to admins."""
+        response, _ = self.request('GET', '/reports/articles?year=2022', token=self.login('bob'))
+        assert response.status == 403
+
+        response, rows = self.request('GET', '/reports/articles?year=2022', token=self.login('rick'))
+        assert response.status == 200
+        assert rows[0]['Title'] == 'How to make a database'
+
+        response, _ = self.request('GET', '/reports/bogus', token=self.login('rick'))
+        assert response.status == 400
+
+    def test_errors_answered(self, monkeypatch):
+        """Malformed requests and unexpected errors should still get a JSON response."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        conn.putrequest('POST', '/login')
+        conn.putheader('Content-Length', 'abc')
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read()) == {'error': 'Invalid Content-Length'}
+        conn.close()
+
+        def fail(handler, db):
+            raise KeyError('boom')
+        monkeypatch.setattr(NewsAPIHandler, 'get_health', fail)
+        response, body = self.request('GET', '/health')
+        assert response.status == 500
+        assert body == {'error': 'Internal server error'}
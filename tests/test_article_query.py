@@ -0,0 +1,70 @@
+"""
+Tests for filtering articles by several tags, categories and dates, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from article_query import ArticleQuery
+
+
+@pytest.fixture(scope='class')
+def second_tag(news_db):
+    """Give article 0 ('How to make a database') a second tag, 'quantum computing'."""
+    with news_db.conn.cursor() as cursor:
+        cursor.execute("insert into ArticleTags values (0, 1)")
+    news_db.conn.commit()
+
+
+@pytest.mark.usefixtures('news_db', 'second_tag')
+class TestArticleQuery:
+
+    def ids(self, **kwargs):
+        return [article.articleID for article in self.db_interface.articles.search(ArticleQuery(**kwargs))]
+
+    def test_no_filters(self):
+        assert self.ids() == [0, 1, 2]
+        assert self.ids(sort_by='title') == [0, 1, 2]
+
+    def test_tags(self):
+        assert self.ids(tags=[0, 2]) == [0, 1]
+        assert self.ids(tags=[0, 1], tag_match='all') == [0]
+        assert self.ids(tags=[1, 2], tag_match='all') == []
+
+    def test_categories(self):
+        assert self.ids(categories=['Politics']) == [1]
+        assert self.ids(categories=['politics', 'technology']) == [0, 1, 2]
+        assert self.ids(categories=['politics', 'technology'], category_match='all') == []
+
+    def test_tags_and_categories(self):
+        """Tag and category filters should both apply."""
+        assert self.ids(tags=[1], categories=['technology']) == [0, 2]
+        assert self.ids(tags=[2], categories=['technology']) == []
+
+    def test_dates(self):
+        assert self.ids(published_after=dt.datetime(2022, 1, 3)) == [1, 2]
+        assert self.ids(published_after=dt.datetime(2022, 1, 2), published_before=dt.datetime(2022, 1, 4)) == [1]
+
+    def test_from_params(self):
+        query = ArticleQuery.from_params({'tags': '1, 0', 'tag_match': 'all', 'after': '2022-01-01', 'sort': 'author'})
+        assert query.tags == [0, 1]
+        assert query.published_after == dt.datetime(2022, 1, 1)
+        assert [a.articleID for a in self.db_interface.articles.search(query)] == [0]
+
+        with pytest.raises(ValueError):
+            ArticleQuery.from_params({'tag_match': 'some'})
+        with pytest.raises(ValueError):
+            ArticleQuery.from_params({'sort': 'content; drop table Articles'})
+
+    def test_single_statement(self):
+        """Any number of tags should still be one statement with bind variables."""
+        sql, binds = ArticleQuery(tags=range(50), tag_match='all').sql()
+        assert sql.count('SELECT') == 2
+        assert len(binds) == 51
@@ -0,0 +1,108 @@
+"""
+Tests for presenting articles to the user.
+
+@author: Ethan Posner
+@date: 2023-04-10
+"""
+
+# Standard library imports
+import sys
+import threading
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from article_view import ArticleViewer, PagedSource
+
+
+class TestPagedSource:
+    """Test the PagedSource class."""
+
+    def test_pages_are_fetched_lazily(self):
+        """Only the items needed for the requested page should be pulled from the source."""
+        pulled = []
+
+        def items():
+            for i in range(25):
+                pulled.append(i)
+                yield i
+
+        source = PagedSource(items(), page_size=10, render=lambda i: f"{i},")
+        assert source.page(0) == ''.join(f"{i}," for i in range(10))
+        assert len(pulled) == 11  # one past the page, to know there is a next page
+        assert source.has_next(0)
+
+        assert source.page(2) == ''.join(f"{i}," for i in range(20, 25))
+        assert source.counts == [10, 10, 5]
+        assert source.page(3) is None
+        assert source.exhausted and not source.has_next(2)
+
+        # going back doesn't fetch again
+        assert source.page(1) == ''.join(f"{i}," for i in range(10, 20))
+        assert len(pulled) == 25
+
+    def test_close(self):
+        closed = []
+
+        def items():
+            try:
+                yield from range(100)
+            finally:
+                closed.append(True)
+
+        source = PagedSource(items(), page_size=10)
+        source.page(0)
+        source.close()
+        assert closed == [True]
+        assert source.page(5) is None
+
+
+@pytest.mark.usefixtures('news_db')
+class TestArticleViewer:
+    """Test the ArticleViewer class against the seeded database."""
+
+    def test_page_navigation(self, monkeypatch):
+        """Next and previous should move between pages, and quit should stop without reading further."""
+        viewer = ArticleViewer(self.db_interface)
+        viewer.page_size = 1
+        commands = iter(['n', 'p', 'n', 'q'])
+        monkeypatch.setattr('builtins.input', lambda *args: next(commands))
+
+        source = PagedSource(self.db_interface.articles.iter_all(batch_size=1), viewer.page_size)
+        assert viewer.page_through(source, "Articles") == 3  # two pages seen, plus one prefetched
+        assert next(commands, None) is None
+
+    def test_prompt_does_not_wait_for_prefetch(self, monkeypatch):
+        """The user should be prompted while the next page is still being fetched."""
+        release = threading.Event()
+        prompted_early = []
+
+        def items():
+            yield from (0, 1)
+            release.wait(5)  # the lookahead for page 1, fetched in the background
+            yield 2
+
+        def prompt(*args):
+            prompted_early.append(not release.is_set())
+            release.set()
+            return 'q'
+
+        viewer = ArticleViewer(self.db_interface)
+        monkeypatch.setattr('builtins.input', prompt)
+        viewer.page_through(PagedSource(items(), page_size=1), "Numbers")
+        assert prompted_early == [True]
+
+    def test_empty_listing(self, capsys):
+        viewer = ArticleViewer(self.db_interface)
+        viewer.print_articles(catName='cooking')
+        assert 'No Articles Found' in capsys.readouterr().out
+
+    def test_single_page_needs_no_input(self, monkeypatch, capsys):
+        monkeypatch.setattr('builtins.input', lambda *args: (_ for _ in ()).throw(AssertionError("prompted")))
+        viewer = ArticleViewer(self.db_interface)
+        viewer.print_comments(1)
+        out = capsys.readouterr().out
+        assert 'This could be disastrous for the country' in out
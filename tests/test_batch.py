@@ -0,0 +1,50 @@
+"""
+Tests for the non-interactive batch mode.
+"""
+
+# Standard library imports
+import io
+import json
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from batch import BatchError, BatchRunner
+
+
+class TestBatchParse:
+    """Test parsing of script lines. No database is needed."""
+
+    def setup_method(self):
+        self.runner = BatchRunner(None, out=io.StringIO())
+
+    def test_plain_command(self):
+        assert self.runner.parse('comment 2 "Great article"') == {'cmd': 'comment', 'articleID': '2', 'content': 'Great article'}
+        assert self.runner.parse('report articles year=2022') == {'cmd': 'report', 'name': 'articles', 'year': '2022'}
+
+    def test_json_command(self):
+        assert self.runner.parse('{"cmd": "view", "articleID": 1}') == {'cmd': 'view', 'articleID': 1}
+        assert self.runner.parse('{"cmd": "view", "args": {"articleID": 1}}') == {'cmd': 'view', 'articleID': 1}
+
+    def test_invalid_commands(self):
+        with pytest.raises(BatchError):
+            self.runner.parse('launch rockets')
+        with pytest.raises(BatchError):
+            self.runner.parse('view 1 2')
+
+    def test_run_reports_errors(self):
+        """Failed commands should produce an error result without stopping the script."""
+        out = io.StringIO()
+        runner = BatchRunner(None, out=out)
+        summary = runner.run(['# comment', '', 'view 1', 'bogus', '{not json'])
+        assert summary == {'succeeded': 0, 'failed': 3}
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r.get('line') for r in results[:3]] == [3, 4, 5]
+        assert all(not r['ok'] for r in results[:3])
+        assert 'logged in' in results[0]['error']
+        assert results[-1] == {'summary': summary}
@@ -6,13 +6,11 @@ Tests for main database functionality.
 """
 
 # Standard library imports
-import os
 import sys
+from datetime import datetime
 from unittest.mock import patch
 
 # Third party imports
-from dotenv import load_dotenv
-import oracledb
 from oracledb.exceptions import DatabaseError
 import pytest
 
@@ -20,36 +18,14 @@ if 'src' not in sys.path:
     sys.path.insert(0,'src')
 
 # Local imports
-from db import User, UserTable, Article, ArticleTable, NewsDB
-from db_util import create_data, drop_data
+from db import Article, User
+from passwords import hash_password, verify_password
 
 
+@pytest.mark.usefixtures('news_db')
 class TestInterface:
     """Test the NewsDB class, which is the main interface to the database."""
-    @classmethod
-    def setup_class(cls):
-        """Fully initialize the database from scratch. Create a NewsDB instance and connect to the database."""
-        # Connect to oracle database
-        load_dotenv()  # load environment from .env file
-        oracledb.init_oracle_client()
-        db_conn = oracledb.connect(user=os.getenv('DB_USER'),
-                              password=os.getenv('DB_PASS'),
-                              port=os.getenv('DB_PORT'),
-                              host=os.getenv('DB_HOST'),
-                              service_name='XE')
-        print("Successfully connected to Oracle Database")
-
-        cls.db_interface = NewsDB(db_conn)
-        drop_data(cls.db_interface.conn)
-        create_data(cls.db_interface.conn, output=False)
-
-    @classmethod
-    def teardown_class(cls):
-        """Close the database connection and drop all data."""
-        drop_data(cls.db_interface.conn, output=False)
-        cls.db_interface.conn.close()
-        print("Successfully closed connection to Oracle Database")
-        
+
     def test_initialize(self):
         """Ensure all attributes were initialized successfully.
         """
@@ -58,32 +34,10 @@ class TestInterface:
         assert self.db_interface.conn is not None
 
 
+@pytest.mark.usefixtures('news_db')
 class TestUser:
     """Test the UserTable class."""
-    @classmethod
-    def setup_class(cls):
-        """Fully initialize the database from scratch. Create a NewsDB instance and connect to the database."""
-        # Connect to oracle database
-        load_dotenv()  # load environment from .env file
-        oracledb.init_oracle_client()
-        db_conn = oracledb.connect(user=os.getenv('DB_USER'),
-                              password=os.getenv('DB_PASS'),
-                              port=os.getenv('DB_PORT'),
-                              host=os.getenv('DB_HOST'),
-                              service_name='XE')
-        print("Successfully connected to Oracle Database")
-            
-        cls.db_interface = NewsDB(db_conn)
-        drop_data(cls.db_interface.conn)
-        create_data(cls.db_interface.conn, output=False)
-
-    @classmethod
-    def teardown_class(cls):
-        """Close the database connection and drop all data."""
-        drop_data(cls.db_interface.conn, output=False)
-        cls.db_interface.conn.close()
-        print("Successfully closed connection to Oracle Database")
-        
+
     def test_user_validate(self):
         """Ensure user validation works as expected.
         """
@@ -96,6 +50,10 @@ class TestUser:
 
         # Nonexistent user
         assert self.db_interface.users.validate('nonexistent_user', 'password') is None
+
+        # Repeated logins are served from the credential cache and still check the password
+        assert self.db_interface.users.validate('bob', '123') is not None
+        assert self.db_interface.users.validate('bob', 'wrong_password') is None
         
     def test_user_get(self):
         """Ensure user retrieval works as expected.
@@ -114,8 +72,9 @@ class TestUser:
         assert bob.username == 'bob', "Bob's username should be 'bob'"
         assert rick.username == 'rick', "Rick's username should be 'rick'"
         
-        assert bob.password == '123', "Bob's password should be '123'"
-        assert rick.password == '123', "Rick's password should be '123'"
+        assert bob.password != '123', "Bob's password should not be stored in plaintext"
+        assert verify_password('123', bob.password), "Bob's password should be '123'"
+        assert verify_password('123', rick.password), "Rick's password should be '123'"
         
         # Invalid user
         with pytest.raises(DatabaseError):
@@ -124,32 +83,40 @@ class TestUser:
             self.db_interface.users.get(3)
 
 
+    def test_user_login(self):
+        """Ensure login issues a session that caches the user until logout."""
+        token = self.db_interface.users.login('rick', '123')
+        assert token is not None
+        assert self.db_interface.users.login('rick', 'wrong_password') is None
+
+        rick = self.db_interface.sessions.get(token)
+        assert rick.username == 'rick'
+        assert rick.is_admin
+
+        self.db_interface.users.logout(token)
+        assert self.db_interface.sessions.get(token) is None
+
+    def test_user_create(self):
+        """Passwords are always hashed, even ones that look like a hash, unless they are marked as hashes."""
+        users = self.db_interface.users
+        lookalike = hash_password('123', iterations=1000)
+        userID = users.create(User(None, 'lookalike', lookalike, datetime(2023, 1, 1), None))
+        assert users.get(userID).password != lookalike
+        assert users.validate('lookalike', lookalike) == userID
+        users.delete(userID)
+
+        userID = users.create(User(None, 'copied', lookalike, datetime(2023, 1, 1), None), password_is_hash=True)
+        assert users.get(userID).password == lookalike
+        assert users.validate('copied', '123') == userID
+        users.delete(userID)
+        with pytest.raises(ValueError):
+            users.create(User(None, 'plain', '123', datetime(2023, 1, 1), None), password_is_hash=True)
+
+
+@pytest.mark.usefixtures('news_db')
 class TestArticle:
     """Test the ArticleTable class."""
 
-    @classmethod
-    def setup_class(cls):
-        """Fully initialize the database from scratch. Create a NewsDB instance and connect to the database."""
-        # Connect to oracle database
-        load_dotenv()  # load environment from .env file
-        oracledb.init_oracle_client()
-        db_conn = oracledb.connect(user=os.getenv('DB_USER'),
-                              password=os.getenv('DB_PASS'),
-                              port=os.getenv('DB_PORT'),
-                              host=os.getenv('DB_HOST'),
-                              service_name='XE')
-        print("Successfully connected to Oracle Database")
-            
-        cls.db_interface = NewsDB(db_conn)
-        drop_data(cls.db_interface.conn)
-        create_data(cls.db_interface.conn, output=False)
-
-    @classmethod
-    def teardown_class(cls):
-        """Close the database connection and drop all data."""
-        drop_data(cls.db_interface.conn, output=False)
-        cls.db_interface.conn.close()
-        print("Successfully closed connection to Oracle Database")
 
     def test_article_get(self):
         """Ensure article retrieval works as expected.
@@ -186,6 +153,14 @@ class TestArticle:
         venezuela_article_tags = self.db_interface.articles.get_tags(venezuela_article_id)
         assert venezuela_article_tags == venezuela_article.tags
         
+    def test_get_many(self):
+        """Several articles should come back by ID, with their tags, leaving out missing ones."""
+        articles = self.db_interface.articles.get_many([2, 1, 99, 1])
+        assert sorted(articles) == [1, 2]
+        for articleID, article in articles.items():
+            expected = self.db_interface.articles.get(articleID)
+            assert (article.title, sorted(article.tags)) == (expected.title, sorted(expected.tags))
+
     def test_get_all(self):
         pass
 
@@ -193,7 +168,29 @@ class TestArticle:
         pass
     
     def test_get_comments(self):
-        pass
+        """Comments should come back oldest first, a page at a time, with the total count."""
+        comments = self.db_interface.articles.get_comments(0)
+        assert len(comments) == 3
+
+        page = self.db_interface.articles.get_comment_page(0, page_size=2)
+        assert page.total == 3
+        assert page.has_next
+        assert [c.commentID for c in page.comments] == [c.commentID for c in comments[:2]]
+
+        page = self.db_interface.articles.get_comment_page(0, page.next_cursor, page_size=2)
+        assert [c.commentID for c in page.comments] == [comments[2].commentID]
+        assert not page.has_next and page.next_cursor is None
+
+        with pytest.raises(ValueError, match='cursor'):
+            self.db_interface.articles.get_comment_page(0, 'bogus')
+
+    def test_add_comment(self):
+        """Adding a comment should keep the comment count up to date."""
+        before = self.db_interface.articles.get_comment_page(2).total
+        commentID = self.db_interface.articles.add_comment(2, 0, 'Another comment')
+        page = self.db_interface.articles.get_comment_page(2)
+        assert page.total == before + 1
+        assert page.comments[-1].commentID == commentID
     
     def test_add_view(self):
         pass
@@ -202,6 +199,87 @@ class TestArticle:
         pass
     
 
+@pytest.mark.usefixtures('news_db')
+class TestArticleWrites:
+    """Test creating, updating and deleting articles."""
+
+    def test_create(self):
+        articles = self.db_interface.articles
+        version = self.db_interface.summaries.version
+        article = Article(None, 'New article', 'Jane Doe', datetime(2022, 5, 1), 'x' * 10000, tags=[])
+        articleID = articles.create(article, [0, 1, 0])
+
+        created = articles.get(articleID)
+        assert created.title == 'New article'
+        assert created.content == 'x' * 10000
+        assert sorted(created.tags) == ['database', 'quantum computing']
+        assert self.db_interface.summaries.version > version
+
+    def test_publish_many(self):
+        articles = self.db_interface.articles
+        with patch.object(articles, '_insert_tags', wraps=articles._insert_tags) as insert_tags:
+            ids = articles.publish_many([(Article(None, f'Wire story {i}', 'Wire', None, 'Story', tags=[]), [i % 6])
+                                         for i in range(50)])
+        assert insert_tags.call_count == 1
+        assert ids == list(range(ids[0], ids[0] + 50))
+        assert articles.get_tags(ids[9]) == ['elections']
+        assert articles.publish_many([]) == []
+
+    def test_update(self):
+        articles = self.db_interface.articles
+        article = articles.get(2)
+        article.title = 'Quantum computing setback'
+        articles.update(article, [2, 3])
+
+        updated = articles.get(2)
+        assert updated.title == 'Quantum computing setback'
+        assert updated.content == article.content
+        assert sorted(updated.tags) == ['elections', 'world leaders']
+
+        # Tags are kept if not given
+        article.content = 'Updated'
+        articles.update(article)
+        assert articles.get(2).content == 'Updated'
+        assert len(articles.get_tags(2)) == 2
+
+        with pytest.raises(DatabaseError):
+            articles.update(Article(99, 'Missing', 'Nobody', None, '', tags=[]))
+
+    def test_update_publish_date(self):
+        """Updates stamp updatedAt, and keep the stored publish date unless a new one is given."""
+        articles = self.db_interface.articles
+        article = articles.get(1)
+        published = article.publishDate
+        assert article.updatedAt is None
+
+        article.publishDate = None
+        articles.update(article)
+        updated = articles.get(1)
+        assert updated.publishDate == published
+        assert updated.updatedAt is not None
+
+        updated.publishDate = datetime(2022, 7, 1)
+        articles.update(updated)
+        assert articles.get(1).publishDate == datetime(2022, 7, 1)
+        assert articles.get_many([1])[1].updatedAt >= updated.updatedAt
+
+    def test_delete(self):
+        articles = self.db_interface.articles
+        articleID = articles.create(Article(None, 'Short lived', 'Jane Doe', None, 'Soon gone', tags=[]), [4])
+        articles.add_view(articleID, 0)
+        articles.add_comment(articleID, 1, 'First!')
+        assert self.db_interface.trending.score(articleID) > 0
+        assert articles.get(articleID).title == 'Short lived'
+
+        articles.delete(articleID)
+        with pytest.raises(DatabaseError):
+            articles.get(articleID)
+        assert articles.get_comments(articleID) == []
+        assert self.db_interface.trending.score(articleID) == 0
+        with pytest.raises(DatabaseError):
+            articles.delete(articleID)
+
+
 class TestTag:
     """Test the TagTable class."""
     pass
@@ -0,0 +1,148 @@
+"""
+Tests for the database setup helpers, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import gzip
+import json
+import sys
+
+from oracledb.exceptions import DatabaseError, IntegrityError
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from db_util import (MIGRATIONS, SCHEMA_VERSION, applied_migrations, archive_views, create_data, drop_data,
+                     migrate, run_script, split_statements)
+from generate_report import ReportGenerator
+import sqlite_db
+
+
+class TestMigrations:
+
+    def test_create_applies_all_migrations(self):
+        with sqlite_db.connect() as conn:
+            create_data(conn, output=False)
+            assert applied_migrations(conn) == [m.version for m in MIGRATIONS]
+            assert migrate(conn, output=False) == []
+
+    def test_upgrade_existing_database(self):
+        """An old database with duplicate tag links should be deduplicated and then keyed."""
+        with sqlite_db.connect() as conn:
+            run_script(conn, 'create_data.txt', output=False)
+            with conn.cursor() as cursor:
+                cursor.execute("insert into ArticleTags values (1, 2)")
+                cursor.execute("SELECT COUNT(*) FROM ArticleTags WHERE articleID = 1")
+                assert cursor.fetchone()[0] == 2
+            conn.commit()
+
+            assert migrate(conn, output=False) == list(range(1, SCHEMA_VERSION + 1))
+
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM ArticleTags WHERE articleID = 1")
+                assert cursor.fetchone()[0] == 1
+                with pytest.raises(IntegrityError):
+                    cursor.execute("insert into ArticleTags values (1, 2)")
+
+                cursor.execute("SELECT commentCount FROM ArticleCommentCounts WHERE articleID = 0")
+                assert cursor.fetchone()[0] == 3
+
+    def test_failed_migration_is_not_recorded(self, monkeypatch, seeded_conn):
+        broken = MIGRATIONS + [type(MIGRATIONS[0])(SCHEMA_VERSION + 1, "Broken", ["create index x on NoSuchTable(y)"])]
+        monkeypatch.setattr('db_util.MIGRATIONS', broken)
+        with pytest.raises(DatabaseError):
+            migrate(seeded_conn, output=False)
+        assert SCHEMA_VERSION + 1 not in applied_migrations(seeded_conn)
+
+    def test_drop(self):
+        with sqlite_db.connect() as conn:
+            create_data(conn, output=False)
+            drop_data(conn, output=False)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'")
+                assert cursor.fetchone()[0] == 0
+
+
+class TestArchiveViews:
+
+    def test_reports_unchanged_after_archiving(self, tmp_path, seeded_conn):
+        conn = seeded_conn
+        report_generator = ReportGenerator(NewsDB(conn))
+        names = sorted(ReportGenerator.admin_reports)
+        before = {name: report_generator.report_rows(name, '2022') for name in names}
+
+        archived = archive_views(conn, retain_months=3, archive_dir=tmp_path, now=dt.datetime(2023, 6, 15), output=False)
+        # The seed data's 7 views are in 5 rows once identical ones are merged
+        assert [(entry['month'], entry['rows']) for entry in archived] == [('2022-01', 5)]
+
+        with gzip.open(archived[0]['file'], 'rt') as f:
+            records = [json.loads(line) for line in f]
+        assert sum(record['viewCount'] for record in records) == 7
+        assert records[0] == {'articleID': 0, 'userID': 0, 'viewedAt': '2022-01-01 12:00:00', 'viewCount': 2}
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM ArticleViews")
+            assert cursor.fetchone()[0] == 0
+            cursor.execute("SELECT SUM(viewCount) FROM ArticleViewRollups")
+            assert cursor.fetchone()[0] == 7
+
+        assert {name: report_generator.report_rows(name, '2022') for name in names} == before
+
+        # Nothing left to archive on a second run
+        assert archive_views(conn, retain_months=3, archive_dir=tmp_path, now=dt.datetime(2023, 6, 15), output=False) == []
+
+    def test_recent_views_are_kept(self, tmp_path, seeded_conn):
+        conn = seeded_conn
+        assert archive_views(conn, retain_months=13, archive_dir=tmp_path, now=dt.datetime(2022, 12, 1), output=False) == []
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT SUM(viewCount) FROM ArticleViews")
+            assert cursor.fetchone()[0] == 7
+
+
+class TestScripts:
+
+    def test_split_statements(self):
+        script = """-- comment; not a statement
+        insert into T values ('a; b -- c', 'it''s');  /* block; comment */
+        insert into T values (1, "odd;name");
+        """
+        assert split_statements(script) == ["insert into T values ('a; b -- c', 'it''s')",
+                                             'insert into T values (1, "odd;name")']
+        with pytest.raises(DatabaseError):
+            split_statements("insert into T values ('unterminated);")
+
+    def test_inserts_are_grouped_and_rerun_is_skipped(self):
+        with sqlite_db.connect() as conn:
+            results = run_script(conn, 'create_data.txt', output=False)
+            views = results[-1]
+            assert views['statement'].startswith('insert into ArticleViews values (:v1, :v2') and views['rows'] == 7
+            assert all(result['status'] == 'applied' for result in results)
+
+            assert {result['status'] for result in run_script(conn, 'create_data.txt', output=False)} == {'skipped'}
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM ArticleViews")
+                assert cursor.fetchone()[0] == 7
+
+    def test_only_new_steps_run(self, tmp_path):
+        script = tmp_path / 'script.txt'
+        script.write_text("create table T (id integer primary key, name varchar(20));\n"
+                          "insert into T values (1, 'one');\n")
+        with sqlite_db.connect() as conn:
+            run_script(conn, script, output=False)
+            script.write_text(script.read_text() + "insert into T values (2, 'two');\n")
+            results = run_script(conn, script, output=False)
+            statuses = [result['status'] for result in results]
+            assert results[1]['rows'] == 1
+            # The two inserts are now one step, of which only the new row is run
+            assert statuses == ['skipped', 'applied']
+
+            # Without tracking, the existing table is tolerated but a duplicate row is not
+            with pytest.raises(DatabaseError, match='step 2'):
+                run_script(conn, script, output=False, track=False)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT name FROM T ORDER BY id")
+                assert cursor.fetchall() == [('one',), ('two',)]
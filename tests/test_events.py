@@ -0,0 +1,99 @@
+"""
+Tests for change events. The database tests run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import sys
+import threading
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import User
+from events import ArticleViewed, CommentAdded, Event, EventBus, EventLog, UserCreated, UserDeleted
+
+
+class TestEventLog:
+
+    def test_read_from_offsets(self, tmp_path):
+        bus = EventBus(tmp_path / 'events.jsonl')
+        log = EventLog(tmp_path / 'events.jsonl')
+        assert log.read() == ([], 0)
+
+        bus.publish([ArticleViewed(1, 2, at=10.0), CommentAdded(5, 1, 2, at=11.0)])
+        events, offset = log.read()
+        assert events == [ArticleViewed(1, 2, at=10.0), CommentAdded(5, 1, 2, at=11.0)]
+        assert events[0].offset == 0 and events[1].offset > 0
+
+        # A consumer resumes from where it stopped, and ignores a line that is still being written
+        bus.publish([UserDeleted(3, at=12.0)])
+        with open(tmp_path / 'events.jsonl', 'a') as f:
+            f.write('{"kind": "UserDel')
+        events, offset = log.read(offset)
+        assert events == [UserDeleted(3, at=12.0)]
+        assert log.read(offset) == ([], offset)
+
+        events, _ = log.read(limit=2)
+        assert log.read(events[1].offset, limit=1)[0] == [events[1]]
+
+    def test_tail(self, tmp_path):
+        bus = EventBus(tmp_path / 'events.jsonl')
+        stop = threading.Event()
+        received = []
+
+        def follow():
+            for event in EventLog(tmp_path / 'events.jsonl').tail(poll_interval=0.01, stop=stop):
+                received.append(event)
+                if len(received) == 2:
+                    stop.set()
+
+        thread = threading.Thread(target=follow)
+        thread.start()
+        bus.publish([ArticleViewed(1, 2)])
+        bus.publish([ArticleViewed(3, 4)])
+        thread.join(timeout=5)
+        assert [event.articleID for event in received] == [1, 3]
+
+    def test_round_trip(self):
+        event = UserCreated(7, 'alice', at=1.5)
+        assert Event.from_json(event.to_json()) == event
+        assert repr(event) == "UserCreated(userID=7, username='alice')"
+
+
+@pytest.mark.usefixtures('news_db')
+class TestNewsDBEvents:
+
+    def setup_method(self):
+        self.received = []
+        self.db_interface.events.subscribe(Event, self.received.append)
+
+    def test_published_after_commit(self):
+        articles = self.db_interface.articles
+        articles.add_view(1, 0, commit=False)
+        commentID = articles.add_comment(1, 0, "Not yet", commit=False)
+        assert self.received == []
+
+        self.db_interface.commit()
+        assert [type(event) for event in self.received] == [ArticleViewed, CommentAdded]
+        assert self.received[1].commentID == commentID
+
+    def test_rollback_drops_events(self):
+        self.db_interface.articles.add_view(1, 0, commit=False)
+        self.db_interface.rollback()
+        self.db_interface.commit()
+        assert self.received == []
+
+    def test_user_deleted_revokes_sessions(self):
+        users = self.db_interface.users
+        userID = users.create(User(None, 'eventful', 'secret', dt.datetime(2023, 1, 1), None))
+        token = users.login('eventful', 'secret')
+        assert self.db_interface.sessions.get(token) is not None
+
+        users.delete(userID)
+        assert self.received == [UserCreated(userID, 'eventful', at=self.received[0].at),
+                                 UserDeleted(userID, at=self.received[1].at)]
+        assert self.db_interface.sessions.get(token) is None
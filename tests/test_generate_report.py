@@ -0,0 +1,50 @@
+"""
+Tests for the cohort retention report, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import csv
+import datetime as dt
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from generate_report import ReportGenerator
+
+
+@pytest.mark.usefixtures('news_db')
+class TestCohortReport:
+
+    def setup_method(self):
+        self.report_generator = ReportGenerator(self.db_interface)
+
+    def test_cohort_rows(self):
+        activity = [
+            (0, '2022-01', '2022-01', 3, 1),
+            (0, '2022-01', '2022-01', 0, 2),  # comments of the same month come in their own row
+            (0, '2022-01', '2022-03', 1, 0),
+            (1, '2022-01', None, None, None),
+            (2, '2022-02', '2022-01', 5, 0),  # before registering
+            (2, '2022-02', '2023-02', 1, 0),
+        ]
+        rows = self.report_generator.cohort_rows(activity, today=dt.date(2022, 4, 15))
+        assert rows[0][:6] == ('Cohort', 'Users', 'Views', 'Comments', 'M0', 'M1')
+        assert len(rows[0]) == 4 + 13
+        cohorts = {row[0]: row for row in rows[1:]}
+        assert cohorts['2022-01'][:8] == ('2022-01', '2', '4', '3', '50%', '0%', '50%', '0%')
+        assert cohorts['2022-01'][8:] == ('',) * 9
+        assert cohorts['2022-02'][:7] == ('2022-02', '1', '6', '0', '0%', '0%', '0%')
+
+    def test_seed_data(self, tmp_path):
+        rows = self.report_generator.report_rows('cohorts', '2022')
+        assert rows[1][:5] == ('2022-01', '3', '7', '6', '100%')
+        assert rows[1][5] == '0%'
+
+        path = tmp_path / 'cohorts.csv'
+        assert self.report_generator.export('cohorts', 'csv', path, year='2022') == 1
+        with open(path, newline='') as f:
+            assert [tuple(row) for row in csv.reader(f)] == rows
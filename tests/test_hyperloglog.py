@@ -0,0 +1,155 @@
+"""
+Tests for the HyperLogLog unique viewer sketches, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import sys
+
+import pytest
+from oracledb.exceptions import DatabaseError
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from generate_report import ReportGenerator
+from hyperloglog import HyperLogLog, ViewSketches, backfill, by_month, rollup_months, unique_viewers
+
+
+def test_error_bounds():
+    assert HyperLogLog().update(range(10)).count() == 10
+    for n in (1000, 10000, 100000):
+        estimate = HyperLogLog().update(range(n)).count()
+        assert abs(estimate - n) / n < 0.05
+
+
+def test_merge_is_union():
+    a = HyperLogLog().update(range(0, 6000))
+    b = HyperLogLog().update(range(3000, 9000))
+    assert HyperLogLog.union([a, b]) == HyperLogLog().update(range(9000))
+    assert HyperLogLog().merge(a).merge(a) == a
+
+
+def test_merge_takes_register_max():
+    a, b = HyperLogLog(4), HyperLogLog(4)
+    a.registers = bytearray([0, 61, 5, 7, 1, 0, 30, 2, 0, 0, 9, 61, 3, 4, 60, 1])
+    b.registers = bytearray([1, 60, 5, 8, 0, 0, 31, 2, 61, 0, 8, 61, 4, 3, 1, 60])
+    expected = bytearray(map(max, a.registers, b.registers))
+    assert a.copy().merge(b).registers == expected
+    assert b.copy().merge(a).registers == expected
+
+
+def test_by_month():
+    day = HyperLogLog().update(range(100))
+    other = HyperLogLog().update(range(50, 200))
+    months = by_month({(1, dt.date(2022, 3, 1)): day, (1, dt.date(2022, 3, 31)): other,
+                       (1, dt.date(2022, 4, 1)): other, (2, dt.date(2022, 3, 5)): day})
+    assert months == {(1, dt.date(2022, 3, 1)): HyperLogLog().update(range(200)),
+                      (1, dt.date(2022, 4, 1)): other, (2, dt.date(2022, 3, 1)): day}
+    assert day == HyperLogLog().update(range(100))
+
+
+def test_serialization_round_trip():
+    sparse = HyperLogLog().update(range(50))
+    dense = HyperLogLog().update(range(50000))
+    assert len(sparse.to_bytes()) < len(dense.to_bytes())
+    for sketch in (sparse, dense, HyperLogLog(8)):
+        assert HyperLogLog.from_bytes(sketch.to_bytes()) == sketch
+
+
+def test_precision_mismatch():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(10))
+    with pytest.raises(ValueError):
+        HyperLogLog(20)
+
+
+@pytest.mark.usefixtures('news_db')
+class TestViewSketches:
+
+    def test_report_columns(self):
+        """Sketches are backfilled by the migration; articles 0 and 2 were each viewed by two users in 2022."""
+        generator = ReportGenerator(self.db_interface)
+        rows = generator.report_rows('articles', '2022')
+        assert rows[0][-1] == 'Unique Viewers'
+        assert {row[0]: row[-1] for row in rows[1:]} == {'0': '2', '1': '1', '2': '2'}
+        tags = generator.report_rows('tags', '2022')
+        assert all(int(row[-1]) >= 1 for row in tags[1:] if int(row[3]) > 0)
+
+    def test_views_counted_before_and_after_flush(self):
+        db = self.db_interface
+        sketches = db.sketches
+        day = dt.datetime(2022, 6, 1).timestamp()
+        for userID in (0, 1, 2, 0):
+            sketches.add(1, userID, at=day)
+        assert len(sketches) == 4
+
+        counts = unique_viewers(db.conn, '2022', sketches.pending())
+        assert counts['articles'][1] == 3
+        assert sketches.flush(db.conn) == 1
+        assert len(sketches) == 0 and sketches.pending() == {}
+        assert unique_viewers(db.conn, '2022')['articles'][1] == 3
+
+        # Storing the same views again changes nothing
+        backfill(db.conn)
+        backfill(db.conn)
+        assert unique_viewers(db.conn, '2022')['articles'][1] == 3
+
+    def test_committed_views_flush_when_due(self):
+        db = self.db_interface
+        db.sketches.flush_every = 2
+        db.articles.add_view(2, 0)
+        assert len(db.sketches) == 1
+        db.articles.add_view(2, 3)
+        assert len(db.sketches) == 0
+        db.sketches.flush_every = 1000
+
+    def test_failed_flush_keeps_views(self):
+        sketches = ViewSketches()
+        sketches.add(0, 5)
+
+        class BrokenConnection:
+            def cursor(self):
+                raise DatabaseError("connection lost")
+
+            def rollback(self):
+                pass
+
+        with pytest.raises(DatabaseError):
+            sketches.flush(BrokenConnection())
+        assert len(sketches) == 1
+        assert sketches.flush(self.db_interface.conn) == 1
+
+    def test_views_being_flushed_are_pending(self):
+        """A report taken while a flush is storing views still counts them."""
+        db = self.db_interface
+        sketches = ViewSketches()
+        day = dt.datetime(2022, 7, 1).timestamp()
+        sketches.add(0, 7, at=day)
+        seen = []
+
+        class SlowConnection:
+            """Takes the report's pending views just before the flush stores its own."""
+            def cursor(self):
+                seen.append(sketches.pending())
+                return db.conn.cursor()
+
+            def commit(self):
+                db.conn.commit()
+
+        assert sketches.flush(SlowConnection()) == 1
+        key = (0, dt.date(2022, 7, 1))
+        assert seen[0][key] == HyperLogLog().add(7)
+        assert sketches.pending() == {}
+
+    def test_month_rollup(self):
+        db = self.db_interface
+        before = unique_viewers(db.conn, '2022')['articles']
+        with db.conn.cursor() as cursor:
+            cursor.execute("DELETE FROM ArticleViewMonthSketches")
+        db.conn.commit()
+        assert unique_viewers(db.conn, '2022')['articles'] == {}
+        assert rollup_months(db.conn) > 0
+        assert rollup_months(db.conn) > 0
+        assert unique_viewers(db.conn, '2022')['articles'] == before
@@ -8,13 +8,10 @@ Tests for main application driver.
 # Standard library imports
 from unittest.mock import patch
 import builtins
-import os
 import sys
 from unittest.mock import patch
 
 # Third party imports
-from dotenv import load_dotenv
-import oracledb
 from oracledb.exceptions import DatabaseError
 import pytest
 
@@ -22,35 +19,12 @@ if 'src' not in sys.path:
     sys.path.insert(0,'src')
 
 # Local imports
-from db import NewsDB
-from db_util import create_data, drop_data
 import main
 from main import AppStates, ApplicationCLI
 
 # @pytest.mark.skip("Skipping until I can figure out how to mock input()")
+@pytest.mark.usefixtures('news_db')
 class TestMain:
-    
-    @classmethod
-    def setup_class(cls):
-        # Connect to oracle database
-        load_dotenv()  # load environment from .env file
-        oracledb.init_oracle_client()
-        db_conn = oracledb.connect(user=os.getenv('DB_USER'),
-                              password=os.getenv('DB_PASS'),
-                              port=os.getenv('DB_PORT'),
-                              host=os.getenv('DB_HOST'),
-                              service_name='XE')
-        print("Successfully connected to Oracle Database")
-            
-        cls.db_interface = NewsDB(db_conn)
-        drop_data(cls.db_interface.conn)
-        create_data(cls.db_interface.conn, output=False)
-    
-    @classmethod
-    def teardown_class(cls):
-        drop_data(cls.db_interface.conn, output=False)
-        cls.db_interface.conn.close()
-        print("Successfully closed connection to Oracle Database")
 
     def test_init(self, monkeypatch):
         """Test that the application initializes correctly. The quit command is fed in to stop the application."""
@@ -0,0 +1,41 @@
+"""
+Tests for password hashing.
+"""
+
+# Standard library imports
+import sys
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from passwords import hash_password, is_hashed, needs_rehash, verify_password
+
+
+class TestPasswords:
+    """Test the password hashing helpers."""
+
+    def test_hash_roundtrip(self):
+        """A hashed password should verify, and a wrong password should not."""
+        stored = hash_password('123', iterations=1000)
+        assert is_hashed(stored)
+        assert stored.split('$')[-1] != '123'
+        assert verify_password('123', stored)
+        assert not verify_password('1234', stored)
+
+    def test_salted(self):
+        """The same password should hash differently each time."""
+        assert hash_password('123', iterations=1000) != hash_password('123', iterations=1000)
+
+    def test_legacy_plaintext(self):
+        """Plaintext values from before the migration should still verify and be flagged for rehashing."""
+        assert verify_password('123', '123')
+        assert not verify_password('12', '123')
+        assert needs_rehash('123')
+        assert needs_rehash(hash_password('123', iterations=1000))
+        assert not needs_rehash(hash_password('123'))
+
+    def test_malformed(self):
+        """Corrupt hashes should fail verification rather than raise."""
+        assert not verify_password('123', 'pbkdf2_sha256$abc$zz$00')
+        assert not verify_password('123', None)
@@ -0,0 +1,54 @@
+"""
+Tests that the query plans of queries.py match the golden files in tests/plans.
+
+After an intended change to a query or an index, record the new plans with:
+    python3 src/plan_check.py --sqlite --update
+"""
+
+# Standard library imports
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from plan_check import PLAN_DIR, Plan, binds_for, check, compare, statements
+from queries import CREATE_USER, SINGLE_ARTICLE
+
+
+def test_binds_for():
+    assert binds_for(SINGLE_ARTICLE) == {'articleID': 1}
+    # to_date('...', 'HH24:MI:SS') has no binds in it
+    assert set(binds_for("SELECT to_date(:day, 'YYYY-MM-DD HH24:MI:SS') FROM dual")) == {'day'}
+    assert set(binds_for(CREATE_USER)) == {'username', 'password', 'registerDate'}
+
+
+def test_compare():
+    golden = Plan(["SEARCH A USING INDEX Articles_publishDate (publishDate>?)", "SCAN T"])
+    assert compare(golden, golden) == []
+    assert compare(golden, Plan(["SCAN A", "SCAN T"])) == ["full scan of A (0 -> 1)"]
+    assert compare(golden, Plan(["SCAN A USING COVERING INDEX Articles_publishDate", "SCAN T"])) == []
+
+    oracle = Plan(["SELECT STATEMENT", "  TABLE ACCESS BY INDEX ROWID ARTICLES", "    INDEX UNIQUE SCAN SYS_C001"], cost=2)
+    assert compare(oracle, Plan(["SELECT STATEMENT", "  TABLE ACCESS FULL ARTICLES"], cost=3)) == [
+        "full scan of ARTICLES (0 -> 1)"]
+    assert compare(Plan([], cost=20), Plan([], cost=40)) == ["cost 20 -> 40"]
+    assert compare(Plan([], cost=2), Plan([], cost=8)) == []  # below min_cost_delta
+    assert Plan.from_text(oracle.to_text()) == oracle
+
+
+def test_every_statement_explained():
+    assert {'SINGLE_ARTICLE', 'ARTICLE_VIEW_REPORT', 'ADD_VIEW', 'DELETE_USER'} <= set(statements())
+
+
+@pytest.mark.usefixtures('news_db')
+class TestGoldenPlans:
+
+    def test_no_regressions(self):
+        engine = getattr(self.db_interface.conn, 'engine', 'oracle')
+        if not (PLAN_DIR / engine).exists():
+            pytest.skip(f"No golden plans for {engine}")
+        failed = [str(result) for result in check(self.db_interface.conn) if result.failed]
+        assert failed == []
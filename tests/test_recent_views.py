@@ -0,0 +1,93 @@
+"""
+Tests for coalescing repeated views, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import sys
+
+import pytest
+from oracledb.exceptions import DatabaseError
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from recent_views import RecentViews
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestRecentViews:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, seeded_conn):
+        self.conn = seeded_conn
+        self.clock = FakeClock()
+
+    def view_rows(self, articleID):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""SELECT userID, viewCount FROM ArticleViews
+                              WHERE articleID = :articleID ORDER BY viewedAt""", articleID=articleID)
+            return cursor.fetchall()
+
+    def test_seed_duplicates_merged(self):
+        assert self.view_rows(0) == [(0, 2), (2, 1)]
+
+    def test_repeats_counted_in_one_row(self):
+        db = NewsDB(self.conn, recent_views=RecentViews(window=60, clock=self.clock))
+        for _ in range(3):
+            db.articles.add_view(1, 0)
+            self.clock.now += 10
+        db.articles.add_view(1, 1)
+        assert self.view_rows(1)[1:] == [(0, 3), (1, 1)]
+
+        # A view after the window starts a new row
+        self.clock.now += 60
+        db.articles.add_view(1, 0)
+        assert self.view_rows(1)[1:] == [(0, 3), (1, 1), (0, 1)]
+        assert len(db.recent_views) == 1
+
+    def test_repeats_dropped(self):
+        db = NewsDB(self.conn, recent_views=RecentViews(window=60, count_repeats=False, clock=self.clock))
+        db.articles.add_view(1, 0)
+        db.articles.add_view(1, 0)
+        assert self.view_rows(1)[1:] == [(0, 1)]
+
+    def test_rolled_back_row_is_replaced(self):
+        db = NewsDB(self.conn, recent_views=RecentViews(window=60, clock=self.clock))
+        db.articles.add_view(1, 0, commit=False)
+        db.rollback()
+        db.articles.add_view(1, 0)
+        assert self.view_rows(1)[1:] == [(0, 1)]
+
+    def test_first_view_undone(self, monkeypatch):
+        """A first view that was rolled back or failed to write should not make later views count as repeats."""
+        db = NewsDB(self.conn, recent_views=RecentViews(window=60, count_repeats=False, clock=self.clock))
+        db.articles.add_view(1, 0, commit=False)
+        db.rollback()
+        assert len(db.recent_views) == 0
+
+        def fail(call):
+            raise DatabaseError("ORA-00001: unique constraint violated")
+        monkeypatch.setattr(db.articles, '_write', fail)
+        with pytest.raises(DatabaseError):
+            db.articles.add_view(1, 0)
+        monkeypatch.undo()
+
+        db.articles.add_view(1, 0)
+        assert self.view_rows(1)[1:] == [(0, 1)]
+
+    def test_reports_count_every_view(self):
+        db = NewsDB(self.conn, recent_views=RecentViews(window=60, clock=self.clock))
+        for _ in range(4):
+            db.articles.add_view(1, 0)
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT SUM(viewCount) FROM ArticleViewHistory WHERE articleID = 1")
+            assert cursor.fetchone()[0] == 5
@@ -0,0 +1,98 @@
+"""
+Tests for article recommendations. The database tests run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import math
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db_util import archive_views
+import recommendations
+
+
+def stored_neighbors(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT articleID, neighborID, score FROM ArticleNeighbors ORDER BY articleID, neighborID")
+        return [(articleID, neighborID, pytest.approx(score)) for articleID, neighborID, score in cursor.fetchall()]
+
+
+class TestComputeNeighbors:
+
+    def test_cosine_and_tags(self):
+        viewed = {1: {10, 11}, 2: {10, 11, 12}, 3: {10}}
+        tags = {10: {1}, 12: {1, 2}}
+        neighbors = recommendations.compute_neighbors(viewed, tags, tag_weight=0.2)
+
+        assert [articleID for articleID, _ in neighbors[10]] == [11, 12]
+        assert neighbors[10][0][1] == pytest.approx(0.8 * 2 / math.sqrt(3 * 2))
+        # One co-view plus half of the tags in common
+        assert neighbors[10][1][1] == pytest.approx(0.8 * 1 / math.sqrt(3 * 1) + 0.2 * 0.5)
+
+    def test_untouched_articles_are_skipped(self):
+        viewed = {1: {10, 11}, 2: {12, 13}}
+        neighbors = recommendations.compute_neighbors(viewed, {}, articles=[10])
+        assert list(neighbors) == [10]
+        assert neighbors[10] == [(11, pytest.approx(0.8))]
+
+    def test_top_n(self):
+        viewed = {user: {0, user} for user in range(1, 30)}
+        neighbors = recommendations.compute_neighbors(viewed, {}, top_n=5)
+        assert len(neighbors[0]) == 5
+        assert neighbors[3] == [(0, pytest.approx(0.8 / math.sqrt(29)))]
+
+
+@pytest.mark.usefixtures('news_db')
+class TestRecommendations:
+
+    def test_build_and_refresh(self):
+        conn = self.db_interface.conn
+        assert recommendations.build(conn) == 3
+
+        # bob (user 0) only viewed article 0, which fred viewed along with 1 and 2
+        recommended = self.db_interface.articles.get_recommended(0)
+        assert [article.articleID for article, _ in recommended] == [1, 2]
+
+        # Nothing changed yet
+        assert recommendations.refresh(conn) == 0
+
+        self.db_interface.articles.add_view(2, 0)
+        assert recommendations.refresh(conn) == 3
+        refreshed = stored_neighbors(conn)
+        recommendations.build(conn)
+        assert refreshed == stored_neighbors(conn)
+
+        assert [article.articleID for article, _ in self.db_interface.articles.get_recommended(0)] == [1]
+        assert self.db_interface.articles.get_recommended(99) == []
+
+
+def test_archived_views_count_as_seen(seeded_conn, tmp_path):
+    """Views moved to ArticleViewRollups still seed recommendations and are still left out of them."""
+    archive_views(seeded_conn, retain_months=3, archive_dir=tmp_path, now=dt.datetime(2023, 6, 15), output=False)
+    recommendations.build(seeded_conn)
+    assert [articleID for articleID, _ in recommendations.recommend(seeded_conn, 0)] == [1, 2]
+
+    # A current view of article 1 adds its neighbors, but not the archived article 0
+    with seeded_conn.cursor() as cursor:
+        cursor.execute("INSERT INTO ArticleViews (articleID, userID, viewedAt) VALUES (1, 0, :viewedAt)",
+                       viewedAt=dt.datetime(2023, 6, 1))
+    seeded_conn.commit()
+    recommendations.build(seeded_conn)
+    assert [articleID for articleID, _ in recommendations.recommend(seeded_conn, 0)] == [2]
+
+
+def test_heavy_users_count_recent_views(seeded_conn, monkeypatch):
+    monkeypatch.setattr(recommendations, 'MAX_VIEWS_PER_USER', 1)
+    with seeded_conn.cursor() as cursor:
+        for articleID, month in ((1, 6), (0, 2)):
+            cursor.execute("INSERT INTO ArticleViews (articleID, userID, viewedAt) VALUES (:articleID, 1, :viewedAt)",
+                           articleID=articleID, viewedAt=dt.datetime(2022, month, 1))
+    seeded_conn.commit()
+    viewed, _ = recommendations.load_views(seeded_conn)
+    assert viewed[1] == {1} and viewed[2] == {0}
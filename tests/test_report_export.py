@@ -0,0 +1,63 @@
+"""
+Tests for streaming report exports, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import csv
+import json
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from generate_report import ReportGenerator
+from queries import ARTICLE_VIEW_REPORT
+from report_export import export_query
+
+
+@pytest.mark.usefixtures('news_db')
+class TestReportExport:
+
+    def setup_method(self):
+        self.report_generator = ReportGenerator(self.db_interface)
+
+    def test_csv(self, tmp_path):
+        """The CSV file should hold the header and the same rows as the rendered report, including the estimated
+        Unique Viewers column."""
+        for name in ('articles', 'tags', 'categories'):
+            path = tmp_path / f'{name}.csv'
+            count = self.report_generator.export(name, 'csv', path, year='2022')
+
+            with open(path, newline='') as f:
+                rows = [tuple(row) for row in csv.reader(f)]
+            assert count == len(rows) - 1
+            assert rows[0][-1] == 'Unique Viewers'
+            assert rows == [tuple(str(value) for value in row)
+                            for row in self.report_generator.report_rows(name, '2022')]
+
+    def test_jsonl_in_small_batches(self, tmp_path):
+        path = tmp_path / 'articles.jsonl'
+        query, binds = self.report_generator.report_query('articles', '2022')
+        assert query == ARTICLE_VIEW_REPORT
+        count = export_query(self.db_interface.conn, query, 'jsonl', path, batch_size=1, **binds)
+
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert count == len(records) == 3
+        assert records[0] == {'ID': '0', 'Title': 'How to make a database', 'Views': '3', 'Comments': '3'}
+
+    def test_parquet(self, tmp_path):
+        pq = pytest.importorskip('pyarrow.parquet')
+        path = tmp_path / 'tags.parquet'
+        count = self.report_generator.export('tag_summary', 'parquet', path)
+        table = pq.read_table(path)
+        assert table.num_rows == count
+        assert table.column_names == ['ID', 'Tag Name', 'Category', 'Article Count']
+
+    def test_invalid(self, tmp_path):
+        with pytest.raises(ValueError):
+            self.report_generator.export('articles', 'xlsx', tmp_path / 'x', year='2022')
+        with pytest.raises(ValueError):
+            self.report_generator.export('articles', 'csv', tmp_path / 'x')
@@ -0,0 +1,183 @@
+"""
+Tests for call timeouts, retries and the circuit breaker, using a connection that fails on demand.
+"""
+
+# Standard library imports
+import random
+import sys
+
+import pytest
+from oracledb.exceptions import DatabaseError, IntegrityError, OperationalError
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from generate_report import ReportGenerator
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, Resilience, is_transient
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FaultyConnection:
+    """Wraps a connection. Each execute raises the next queued fault, if any, and records the call timeout."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.call_timeout = 0
+        self.faults = []
+        self.timeouts_seen = []
+        self.executes = 0
+
+    def cursor(self):
+        return FaultyCursor(self, self.conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class FaultyCursor:
+    def __init__(self, conn: FaultyConnection, cursor):
+        self.conn = conn
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+    def execute(self, *args, **kwargs):
+        self.conn.executes += 1
+        self.conn.timeouts_seen.append(self.conn.call_timeout)
+        if self.conn.faults:
+            raise self.conn.faults.pop(0)
+        return self.cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def lost_connection():
+    return OperationalError("DPY-4011: the database or network closed the connection")
+
+
+def test_transient_errors():
+    assert is_transient(lost_connection())
+    assert is_transient(DatabaseError("ORA-00060: deadlock detected while waiting for resource"))
+    assert not is_transient(IntegrityError("ORA-00001: unique constraint violated"))
+    assert not is_transient(DatabaseError("Article not found"))
+
+
+def test_breaker_states():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=10, clock=clock)
+    assert not breaker.failure() and breaker.state == CLOSED
+    assert breaker.failure() and breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and not breaker.allow()  # one trial call at a time
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_other_errors_leave_breaker_alone():
+    clock = FakeClock()
+    resilience = Resilience(CircuitBreaker(failure_threshold=2, reset_after=10, clock=clock), sleep=lambda delay: None)
+
+    def broken():
+        raise KeyError('articleID')
+
+    resilience.breaker.failure()
+    with pytest.raises(KeyError):
+        resilience.run(object(), broken)
+    assert resilience.breaker.failures == 1
+
+    # A trial call that fails without reaching the database lets the next call be the trial
+    resilience.breaker.failure()
+    clock.now += 10
+    with pytest.raises(KeyError):
+        resilience.run(object(), broken)
+    assert resilience.breaker.state == HALF_OPEN
+    assert resilience.run(object(), lambda: 1) == 1
+    assert resilience.breaker.state == CLOSED
+
+
+def test_jitter_bounds():
+    resilience = Resilience(base_delay=0.1, max_delay=0.5, rng=random.Random(1))
+    for attempt in range(6):
+        assert all(0 <= resilience.delay(attempt) <= min(0.5, 0.1 * 2 ** attempt) for _ in range(100))
+
+
+class TestResilience:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, seeded_conn):
+        self.conn = FaultyConnection(seeded_conn)
+        self.clock = FakeClock()
+        self.delays = []
+        self.resilience = Resilience(CircuitBreaker(failure_threshold=3, reset_after=30, clock=self.clock),
+                                     rng=random.Random(0), sleep=self.delays.append)
+        self.db = NewsDB(self.conn, resilience=self.resilience)
+
+    def test_reads_retried_with_timeout(self):
+        self.conn.faults = [lost_connection(), lost_connection()]
+        assert self.db.articles.get(0).title == 'How to make a database'
+        assert len(self.delays) == 2
+        assert all(timeout == Resilience.timeouts['read'] for timeout in self.conn.timeouts_seen)
+        assert self.conn.call_timeout == 0
+        stats = self.resilience.stats()
+        assert stats['retries'] == 2 and stats['failures'] == 2 and stats['state'] == CLOSED
+
+    def test_errors_not_retried(self):
+        with pytest.raises(DatabaseError, match='not found'):
+            self.db.articles.get(99)
+        assert self.delays == []
+
+        # Writes are never retried
+        self.conn.faults = [lost_connection()]
+        with pytest.raises(OperationalError):
+            self.db.articles.add_comment(0, 0, 'Hello')
+        assert self.delays == [] and self.resilience.stats()['failures'] == 1
+        self.db.rollback()
+
+    def test_breaker_fails_fast_and_serves_cache(self):
+        self.db.articles.get(0)
+        report = ReportGenerator(self.db)
+        tag_rows = report.report_rows('tag_summary')
+
+        # Three failed attempts open the breaker
+        self.conn.faults = [lost_connection()] * 3
+        assert self.db.articles.get(0).title == 'How to make a database'
+        stats = self.resilience.stats()
+        assert stats['trips'] == 1 and stats['fallbacks'] == 1 and stats['state'] == OPEN
+
+        executes = self.conn.executes
+        with pytest.raises(CircuitOpenError):
+            self.db.articles.get(1)
+        with pytest.raises(CircuitOpenError):
+            self.db.articles.add_view(0, 0)
+        assert self.db.articles.get(0).articleID == 0
+        self.db.summaries.max_age = 0
+        assert report.report_rows('tag_summary') == tag_rows
+        assert self.conn.executes == executes
+        assert self.resilience.stats()['rejected'] == 4
+
+        # A successful trial call closes the breaker
+        self.clock.now += 30
+        assert self.db.articles.get(1).articleID == 1
+        assert self.resilience.stats()['state'] == CLOSED
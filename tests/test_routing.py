@@ -0,0 +1,107 @@
+"""
+Tests for routing reads to a replica, with two SQLite files standing in for the primary and the replica.
+"""
+
+# Standard library imports
+import shutil
+import sys
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from generate_report import ReportGenerator
+from routing import ReadYourWrites
+import sqlite_db
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestReplicaRouting:
+
+    def setup_method(self):
+        self.connections = []
+
+    def make_db(self, tmp_path, seed_template):
+        primary_path, replica_path = tmp_path / 'primary.sqlite3', tmp_path / 'replica.sqlite3'
+        shutil.copy(seed_template, primary_path)
+        shutil.copy(seed_template, replica_path)
+
+        self.clock = FakeClock()
+        self.primary = sqlite_db.connect(primary_path)
+        self.replica = sqlite_db.connect(replica_path)
+        self.connections += [self.primary, self.replica]
+        # Mark the replica's copy so it is clear where a read was served from
+        with self.replica.cursor() as cursor:
+            cursor.execute("UPDATE Articles SET title = 'From the replica' WHERE articleID = 1")
+        self.replica.commit()
+        return NewsDB(self.primary, replica=self.replica, reads=ReadYourWrites(sticky_for=5, clock=self.clock))
+
+    def teardown_method(self):
+        for conn in self.connections:
+            conn.close()
+
+    def test_reads_go_to_replica(self, tmp_path, seed_template):
+        db = self.make_db(tmp_path, seed_template)
+        assert db.articles.get(1).title == 'From the replica'
+        assert 'From the replica' in [article.title for article in db.articles.get_all()]
+        rows = ReportGenerator(db).report_rows('articles', '2022')
+        assert ('1', 'From the replica', '1', '2', '1') in [tuple(row) for row in rows]
+
+        # Authentication and writes stay on the primary
+        assert db.users.login('bob', '123') is not None
+        db.articles.add_view(1, 0)
+        with self.primary.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM ArticleViews WHERE articleID = 1")
+            assert cursor.fetchone()[0] == 2
+
+    def test_read_your_writes(self, tmp_path, seed_template):
+        db = self.make_db(tmp_path, seed_template)
+        reads = db.router.reads
+
+        with reads.acting_as(0):
+            db.articles.add_comment(1, 0, "Only on the primary so far")
+            # The commenter sees their comment straight away...
+            page = db.articles.get_comment_page(1)
+            assert page.comments[-1].content == "Only on the primary so far"
+            assert db.articles.get(1).title != 'From the replica'
+
+        # ...while other users keep reading the lagging replica
+        with reads.acting_as(1):
+            assert db.articles.get_comment_page(1).total == 2
+        assert db.articles.get(1).title == 'From the replica'
+
+        # Once the replica has had time to catch up, the commenter goes back to it
+        self.clock.now += 5
+        with reads.acting_as(0):
+            assert db.articles.get(1).title == 'From the replica'
+
+    def test_without_replica(self, seed_template):
+        with sqlite_db.connect_copy(seed_template) as conn:
+            db = NewsDB(conn)
+            assert db.router.reader() is conn
+
+    def test_read_runs_on_the_connection_it_was_timed_on(self, tmp_path, seed_template):
+        db = self.make_db(tmp_path, seed_template)
+        with db.router.reads.acting_as(0):
+            db.articles.add_comment(1, 0, "Only on the primary so far")
+            used = []
+            run = db.articles.resilience.run
+
+            def expiring_run(conn, call, *args, **kwargs):
+                # The sticky window ends after the connection was picked, before the query runs
+                used.append(conn)
+                self.clock.now += 5
+                return run(conn, call, *args, **kwargs)
+
+            db.articles.resilience.run = expiring_run
+            assert db.articles.get(1).title != 'From the replica'
+            assert db.articles.get(1).title == 'From the replica'
+        assert used == [self.primary, self.replica]
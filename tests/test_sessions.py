@@ -0,0 +1,82 @@
+"""
+Tests for login sessions.
+"""
+
+# Standard library imports
+from datetime import datetime
+import os
+import stat
+import sys
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import User
+from sessions import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore:
+    """Test the SessionStore class."""
+
+    def make_user(self, userID=0, roleName='user'):
+        return User(userID, 'bob', 'hash', datetime(2022, 1, 1), roleName)
+
+    def test_issue_and_get(self):
+        """An issued token should return the cached user until it expires."""
+        clock = FakeClock()
+        store = SessionStore(ttl=60, clock=clock)
+        token = store.issue(self.make_user(roleName='admin'))
+
+        user = store.get(token)
+        assert user.username == 'bob'
+        assert user.is_admin
+
+        clock.now += 61
+        assert store.get(token) is None
+        assert len(store) == 0
+
+    def test_revoke(self):
+        """Revoked tokens and tokens of revoked users should no longer be valid."""
+        store = SessionStore()
+        token = store.issue(self.make_user(0))
+        other = store.issue(self.make_user(1))
+
+        store.revoke(token)
+        assert store.get(token) is None
+        assert store.get('not a token') is None
+
+        store.revoke_user(1)
+        assert store.get(other) is None
+
+    def test_purge_expired(self):
+        clock = FakeClock()
+        store = SessionStore(ttl=10, clock=clock)
+        store.issue(self.make_user())
+        clock.now += 5
+        store.issue(self.make_user())
+        clock.now += 6
+        assert store.purge_expired() == 1
+        assert len(store) == 1
+
+    def test_persistence(self, tmp_path):
+        """Sessions should survive a restart when a file is given, without storing the password hash."""
+        path = tmp_path / 'sessions.json'
+        token = SessionStore(path=path).issue(self.make_user())
+
+        assert 'hash' not in path.read_text()
+        if os.name == 'posix':
+            assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+        user = SessionStore(path=path).get(token)
+        assert user is not None
+        assert user.username == 'bob'
+        assert user.registerDate == datetime(2022, 1, 1)
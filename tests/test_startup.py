@@ -0,0 +1,51 @@
+"""
+Tests for the startup path: lazy imports, driver mode and the schema version check.
+"""
+
+# Standard library imports
+import subprocess
+import sys
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Third party imports
+import pytest
+from oracledb.exceptions import DatabaseError
+
+# Local imports
+from db import NewsDB
+from db_pool import init_oracle_mode
+import sqlite_db
+
+
+def test_main_import_is_lazy():
+    code = "import sys; sys.path.insert(0, 'src'); import main; print(sorted({'rich', 'generate_report', 'batch'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
+
+def test_thin_mode_by_default(monkeypatch):
+    monkeypatch.delenv('ORACLE_THICK_MODE', raising=False)
+    monkeypatch.delenv('ORACLE_CLIENT_LIB_DIR', raising=False)
+    assert init_oracle_mode() == 'thin'
+
+
+class TestVerify:
+
+    def test_verify_migrated(self, seeded_conn):
+        db = NewsDB(seeded_conn)
+        db.verify()
+        db.verify(full=True)
+
+    def test_verify_uncreated(self):
+        with sqlite_db.connect() as conn:
+            with pytest.raises(DatabaseError, match='--create'):
+                NewsDB(conn).verify()
+
+    def test_verify_outdated(self, seeded_conn):
+        with seeded_conn.cursor() as cursor:
+            cursor.execute("DELETE FROM SchemaMigrations WHERE version = (SELECT MAX(version) FROM SchemaMigrations)")
+        seeded_conn.commit()
+        with pytest.raises(DatabaseError, match='--migrate'):
+            NewsDB(seeded_conn).verify()
@@ -0,0 +1,84 @@
+"""
+Tests for the memoized tag and category summaries, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import io
+import sys
+
+import pytest
+from rich.console import Console
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from events import ArticleTagsChanged
+from generate_report import ReportGenerator
+from summary_cache import SummaryCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_and_follow_data_version():
+    clock = FakeClock()
+    cache = SummaryCache(max_age=60, clock=clock)
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+
+    assert cache.get('key', compute) == 1
+    assert cache.get('key', compute) == 1
+    cache.bump()
+    assert cache.get('key', compute) == 2
+    clock.now += 60
+    assert cache.get('key', compute) == 3
+
+
+def test_value_computed_during_a_change_is_not_kept():
+    cache = SummaryCache()
+    assert cache.get('key', lambda: cache.bump() or 'stale') == 'stale'
+    assert len(cache) == 0
+
+
+@pytest.mark.usefixtures('news_db')
+class TestSummaryViews:
+
+    def setup_method(self):
+        self.report_generator = ReportGenerator(self.db_interface)
+        self.report_generator.console = Console(file=io.StringIO(), width=100, color_system=None)
+        self.queries = []
+        fetch_rows = self.report_generator.fetch_rows
+        self.report_generator.fetch_rows = lambda query, **binds: self.queries.append(query) or fetch_rows(query, **binds)
+        self.db_interface.summaries.bump()
+
+    def test_repeated_summaries_skip_database_and_rendering(self, monkeypatch, capsys):
+        build_table = self.report_generator.build_table
+        tables = []
+        monkeypatch.setattr(self.report_generator, 'build_table', lambda rows: tables.append(rows) or build_table(rows))
+
+        self.report_generator.tag_details()
+        self.report_generator.tag_details()
+        assert len(self.queries) == 1 and len(tables) == 1
+        assert self.report_generator.console.file.getvalue().count('quantum computing') == 2
+        assert 'Summary of Article Tags:' in capsys.readouterr().out
+
+        # Other instances share the NewsDB's cache, and the rows are reused by report_rows
+        assert ReportGenerator(self.db_interface).report_rows('tag_summary')[0] == tables[0][0]
+        assert len(self.queries) == 1
+
+        self.db_interface.events.publish([ArticleTagsChanged(1)])
+        self.report_generator.tag_details()
+        assert len(self.queries) == 2 and len(tables) == 2
+
+    def test_summaries_cached_separately(self):
+        self.report_generator.tag_details()
+        self.report_generator.category_details()
+        self.report_generator.category_details()
+        assert len(self.queries) == 2
+        assert 'technology' in self.report_generator.console.file.getvalue()
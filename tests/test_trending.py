@@ -0,0 +1,93 @@
+"""
+Tests for trending scores. The database tests run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import sys
+
+import pytest
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from trending import TrendingScores
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTrendingScores:
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.trending = TrendingScores(half_life=3600, clock=self.clock)
+
+    def test_scores_decay(self):
+        self.trending.record_view(1)
+        assert self.trending.score(1) == pytest.approx(1.0)
+        self.clock.now += 3600
+        assert self.trending.score(1) == pytest.approx(0.5)
+        self.trending.record_comment(1)
+        assert self.trending.score(1) == pytest.approx(3.5)
+        assert self.trending.score(2) == 0.0
+
+    def test_recent_events_outrank_old_ones(self):
+        for _ in range(3):
+            self.trending.record_view(1)
+        self.clock.now += 2 * 3600  # the three views are now worth 0.75
+        self.trending.record_view(2)
+        self.trending.record_view(3, at=self.clock.now - 1800)
+
+        assert [articleID for articleID, _ in self.trending.top(3)] == [2, 1, 3]
+        assert self.trending.top(1)[0][1] == pytest.approx(1.0)
+
+    def test_top_skips_replaced_entries(self):
+        for i in range(200):
+            self.trending.record_view(i % 5, at=self.clock.now + i)
+        self.trending.forget(4)
+
+        top = self.trending.top(10)
+        assert [articleID for articleID, _ in top] == [3, 2, 1, 0]
+        assert top == self.trending.top(10)
+        assert len(self.trending._heap) <= 2 * len(self.trending) + 64
+
+    def test_long_running_process_does_not_overflow(self):
+        self.trending.record_view(1)
+        self.clock.now += 3600 * 5000
+        self.trending.record_view(2)
+        assert self.trending.top(2)[0] == (2, pytest.approx(1.0))
+
+
+@pytest.mark.usefixtures('news_db')
+class TestTrendingArticles:
+
+    def test_events_update_scores(self):
+        articles = self.db_interface.articles
+        articles.add_view(1, 0)
+        articles.add_comment(2, 0, "Trending comment")
+        trending = articles.get_trending(2)
+        assert [article.articleID for article, _ in trending] == [2, 1]
+
+    def test_warm_start(self):
+        conn = self.db_interface.conn
+        clock = FakeClock(dt.datetime(2022, 1, 1, 13).timestamp())
+        trending = TrendingScores(half_life=3600, clock=clock)
+        events = trending.warm_start(conn)
+
+        # Warmed once, on first use
+        lazy = TrendingScores(half_life=3600, clock=clock)
+        lazy.ensure_warm(conn)
+        lazy.ensure_warm(conn)
+        # Only the seed views at noon are recent enough; the comments from midnight are left out
+        assert events == 7
+        top = trending.top(3)
+        assert sorted(articleID for articleID, _ in top[:2]) == [0, 2]
+        assert [score for _, score in top] == [pytest.approx(1.5), pytest.approx(1.5), pytest.approx(0.5)]
+        assert lazy.top(3) == top
@@ -0,0 +1,95 @@
+"""
+Tests for the synthetic workload generator and replay, run against the SQLite stand-in database.
+"""
+
+# Standard library imports
+import datetime as dt
+import random
+import shutil
+import sys
+from collections import Counter
+
+if 'src' not in sys.path:
+    sys.path.insert(0,'src')
+
+# Local imports
+from db import NewsDB
+from workload import SYNTHETIC_PASSWORD, ReplayWorker, ZipfSampler, generate, replay
+import sqlite_db
+
+
+def test_zipf_is_skewed():
+    sample = ZipfSampler(100, s=1.1, rng=random.Random(1))
+    counts = Counter(sample() for _ in range(20_000))
+    assert set(counts) <= set(range(100))
+    assert counts[0] > counts[1] > counts[10] > counts[99]
+    # The top 10% of ranks get over half of the draws
+    assert sum(counts[k] for k in range(10)) > 10_000
+
+
+class TestWorkload:
+
+    def setup_method(self):
+        self.connections = []
+
+    def teardown_method(self):
+        for conn in self.connections:
+            conn.close()
+
+    def test_generate(self, seed_template):
+        conn = sqlite_db.connect_copy(seed_template)
+        self.connections.append(conn)
+        now = dt.datetime(2023, 4, 1)
+        counts = generate(conn, articles=50, users=20, categories=3, tags_per_category=4, views=2000, comments=100,
+                          now=now, output=False)
+        assert counts['Articles'] == 50 and counts['ArticleViews'] == 2000 and counts['Comments'] == 100
+
+        db = NewsDB(conn)
+        assert db.users.validate('user3', SYNTHETIC_PASSWORD) == 3
+        with conn.cursor() as cursor:
+            # Generated views never come before the article was published, or after now
+            cursor.execute("""SELECT COUNT(*) FROM ArticleViews V JOIN Articles A ON A.articleID = V.articleID
+                              WHERE A.articleID > 2 AND (V.viewedAt < A.publishDate OR V.viewedAt > :now)""", now=now)
+            assert cursor.fetchone()[0] == 0
+            cursor.execute("""SELECT COUNT(*) FROM ArticleCommentCounts C
+                              WHERE C.commentCount != (SELECT COUNT(*) FROM Comments WHERE articleID = C.articleID)""")
+            assert cursor.fetchone()[0] == 0
+            # The most viewed article gets far more than its share
+            cursor.execute("SELECT MAX(views) FROM (SELECT SUM(viewCount) AS views FROM ArticleViews GROUP BY articleID)")
+            assert cursor.fetchone()[0] > 2000 / 50 * 3
+
+        # Same seed, same data
+        again = sqlite_db.connect_copy(seed_template)
+        self.connections.append(again)
+        generate(again, articles=50, users=20, categories=3, tags_per_category=4, views=2000, comments=100,
+                 now=now, output=False)
+        query = "SELECT articleID, userID, viewedAt FROM ArticleViews ORDER BY articleID, userID, viewedAt"
+        with conn.cursor() as a, again.cursor() as b:
+            a.execute(query)
+            b.execute(query)
+            assert a.fetchall() == b.fetchall()
+
+    def test_replay(self, tmp_path, seed_template):
+        path = tmp_path / 'news.sqlite3'
+        shutil.copy(seed_template, path)
+        with sqlite_db.connect(path) as conn:
+            generate(conn, articles=20, users=10, views=200, comments=20, output=False)
+
+        results = replay(lambda: sqlite_db.connect(path), workers=2, duration=0.5)
+        assert results['requests'] > 0
+        assert results['errors'] == 0
+        assert set(results['endpoints']) <= {'get', 'get_all', 'add_view', 'add_comment', 'report'}
+        assert all(r['p50_ms'] <= r['p99_ms'] <= r['max_ms'] for r in results['endpoints'].values())
+
+    def test_replay_counts_failures(self, tmp_path, seed_template, monkeypatch):
+        """Operations that raise are counted as errors and the workers keep going."""
+        path = tmp_path / 'news.sqlite3'
+        shutil.copy(seed_template, path)
+
+        def broken(worker, db, operation):
+            raise KeyError(operation)
+
+        monkeypatch.setattr(ReplayWorker, 'call', broken)
+        results = replay(lambda: sqlite_db.connect(path), workers=2, duration=0.2)
+        assert results['requests'] > 2
+        assert results['errors'] == results['requests']